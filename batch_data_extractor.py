@@ -1,19 +1,50 @@
 import json
 import os
-import subprocess
-
-from file_utils import find_csv_files
-
-# Script specifici per l'estrazione
-ISHARES_SCRIPT = "ishares_data_extractor.py"
-XTRACKERS_SCRIPT = "xtrackers_data_extractor.py"
+import sys
+
+from extraction_engine import create_pool
+from holdings_dataset import DEFAULT_DATASET_DIR, HoldingsDataset
+from holdings_db import HoldingsDB
+from holdings_history import DEFAULT_DB_PATH as HISTORY_DEFAULT_DB
+from holdings_history import HoldingsHistory
+from holdings_index import DEFAULT_INDEX_PATH, HoldingsIndex
+from holdings_validation import print_report, validate_dataset
+from issuer_orchestrator import IssuerOrchestrator, print_summary
+from issuer_plugins import PLUGINS
+from refresh_scheduler import FreshnessScheduler
+from security_master import DEFAULT_DB_PATH as SECURITY_MASTER_DEFAULT_DB
+from security_master import SecurityMaster
+from work_journal import WorkJournal
 
 # Percorso del file con la lista ISIN
 ISIN_LIST_FILE = "isin_list.json"
 
-# Cartelle di input
-ISHARES_INPUT_FOLDER = os.path.join("input", "ishares")
-XTRACKERS_INPUT_FOLDER = os.path.join("input", "xtrackers")
+# Stato di freschezza dei fondi (data as-of dell'ultimo dato elaborato)
+REFRESH_STATE_DB = "refresh_state.db"
+
+# Journal per riprendere un'esecuzione interrotta
+WORK_JOURNAL_DB = "work_journal.db"
+JOURNAL_JOB = "batch_extract"
+
+# Dataset colonnare con le holdings normalizzate di tutti i fondi
+HOLDINGS_DATASET_DIR = DEFAULT_DATASET_DIR
+
+# Database normalizzato (fondi, titoli, fotografie, esposizioni)
+HOLDINGS_DB = "holdings.db"
+
+# Indice invertito titolo -> fondi, aggiornato man mano che i fondi vengono estratti
+HOLDINGS_INDEX_PATH = DEFAULT_INDEX_PATH
+
+# Storico delle holdings (keyframe periodici e variazioni giornaliere)
+HOLDINGS_HISTORY_DB = HISTORY_DEFAULT_DB
+
+# Anagrafica titoli: gli attributi (settore, paese, valuta) imparati dagli emittenti che li
+# pubblicano completano le holdings di quelli che non li hanno (Invesco)
+SECURITY_MASTER_DB = SECURITY_MASTER_DEFAULT_DB
+
+# Emittenti il cui parsing avviene nel pool di processi (extraction_engine.EXTRACTORS)
+POOL_ISSUERS = ("ishares", "xtrackers")
+
 
 def load_isin_list():
     """Carica la lista degli ISIN dal file JSON."""
@@ -23,50 +54,103 @@ def load_isin_list():
     with open(ISIN_LIST_FILE, "r") as f:
         return json.load(f)
 
-def process_files(input_folder, isin_list, script_name):
-    """Elabora i file presenti nella cartella di input usando lo script specificato."""
-    if not os.path.exists(input_folder):
-        print(f"❌ La cartella {input_folder} non esiste.")
-        return
-
-    print(f"🔍 Cercando file nella cartella: {input_folder}")
-    files_in_folder = {os.path.splitext(f)[0] for f in os.listdir(input_folder) if os.path.isfile(os.path.join(input_folder, f))}
-    files_to_process = set(isin_list).intersection(files_in_folder)
-
-    if not files_to_process:
-        print(f"⚠️ Nessun file da processare trovato in {input_folder}.")
-        return
-
-    print(f"✅ Trovati {len(files_to_process)} file da processare per {script_name}.")
-
-    for isin in files_to_process:
-        print(f"\n➡️  Processando {isin} con {script_name}...")
-        try:
-            subprocess.run(
-                ["python", script_name, isin],
-                check=True
-            )
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Errore durante l'elaborazione di {isin} con {script_name}: {e}")
-
-def main():
+def record_freshness(scheduler, results):
+    """Registra la data as-of dei fondi elaborati con successo."""
+    for issuer, issuer_results in results.items():
+        for result in issuer_results:
+            if result["status"] != "ok":
+                continue
+            as_of = result["holdings"]["as_of_date"].dropna()
+            scheduler.record(issuer, result["isin"], as_of.iloc[0].date() if len(as_of) else None)
+
+
+def main(force_all=False):
+    """
+    Elabora gli ISIN di isin_list.json. Di default solo i fondi per cui sono
+    attesi dati nuovi; con force_all=True tutti.
+    """
     try:
-        # Carica la lista degli ISIN
+        # Carica la lista degli ISIN (una chiave per emittente)
         isin_data = load_isin_list()
-        ishares_isin = isin_data.get("ishares", [])
-        xtrackers_isin = isin_data.get("xtrackers", [])
 
-        # Processa iShares
-        print("\n🧾 Elaborazione dei file iShares...")
-        process_files(ISHARES_INPUT_FOLDER, ishares_isin, ISHARES_SCRIPT)
-
-        # Processa Xtrackers
-        print("\n🧾 Elaborazione dei file Xtrackers...")
-        process_files(XTRACKERS_INPUT_FOLDER, xtrackers_isin, XTRACKERS_SCRIPT)
+        unsupported = [issuer for issuer in isin_data if issuer not in PLUGINS]
+        if unsupported:
+            print(f"⚠️ Emittenti senza plugin, ignorati: {unsupported}")
+
+        work = {issuer: isins for issuer, isins in isin_data.items() if issuer in PLUGINS}
+
+        scheduler = FreshnessScheduler(REFRESH_STATE_DB)
+        if not force_all:
+            planned = scheduler.plan(work)
+            skipped = sum(len(v) for v in work.values()) - sum(len(v) for v in planned.values())
+            print(f"🗓️ {skipped} fondi già aggiornati, saltati")
+            work = {issuer: isins for issuer, isins in planned.items() if isins}
+
+        # Un elemento del journal per ISIN, con l'emittente come fase
+        journal = WorkJournal(WORK_JOURNAL_DB)
+        run_id = journal.start_run(JOURNAL_JOB, [(isin, issuer) for issuer, isins in work.items() for isin in isins])
+        work = {}
+        for isin, issuer in journal.pending(run_id):
+            work.setdefault(issuer, []).append(isin)
+
+        dataset = HoldingsDataset(HOLDINGS_DATASET_DIR)
+        holdings_db = HoldingsDB(HOLDINGS_DB)
+        holdings_index = HoldingsIndex.load(HOLDINGS_INDEX_PATH)
+        security_master = SecurityMaster(SECURITY_MASTER_DB)
+        history = HoldingsHistory(HOLDINGS_HISTORY_DB, security_master)
+        # Fondi completati da un'esecuzione interrotta prima del salvataggio dell'indice
+        holdings_index.sync(dataset)
+
+        def on_result(result):
+            if result["status"] == "ok":
+                # Holdings vuote: dati non più recenti di quelli già elaborati, niente da scrivere
+                if not result["holdings"].empty:
+                    # Scrittura prima del completamento: un fondo completato è sempre nel dataset
+                    dataset.write(result["holdings"])
+                    holdings_db.replace_normalized(result["holdings"])
+                    holdings_index.add_holdings(result["holdings"])
+                    security_master.learn_attributes(result["holdings"])
+                    # Lo storico usa gli ID dell'anagrafica: salvati prima dello storico e del
+                    # completamento, così un fondo completato non ha mai ID non persistiti
+                    security_master.save()
+                    history.add_holdings(result["holdings"])
+                journal.complete(run_id, result["isin"], result["issuer"])
+            else:
+                journal.fail(run_id, result["isin"], result["issuer"], result["error"])
+
+        # Tutti gli emittenti in parallelo, ciascuno con i propri limiti; il parsing di
+        # iShares e Xtrackers gira in un pool di processi (pandas importato una volta per worker)
+        print("\n🧾 Elaborazione degli emittenti...")
+        pool_issuers = [issuer for issuer in POOL_ISSUERS if work.get(issuer)]
+        pool = create_pool(pool_issuers) if pool_issuers else None
+        try:
+            orchestrator = IssuerOrchestrator.from_names(
+                work, invesco={"security_master": security_master, "holdings_db": holdings_db},
+                **{issuer: {"pool": pool} for issuer in pool_issuers})
+            results = orchestrator.run(work,
+                                       on_start=lambda issuer, isin: journal.claim(run_id, isin, issuer),
+                                       on_result=on_result)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        record_freshness(scheduler, results)
+
+        print_summary(results, {name: plugin.client.stats for name, plugin in orchestrator.plugins.items()})
+        journal.finish_run(run_id)
+        journal.print_summary(run_id)
+        stats = dataset.stats()
+        print(f"📦 Dataset holdings: {stats['funds']} fondi in {HOLDINGS_DATASET_DIR}")
+        print(f"🗄️ Database holdings: {holdings_db.stats()}")
+        holdings_index.save(HOLDINGS_INDEX_PATH)
+        print(f"🔎 Indice titoli: {len(holdings_index)} titoli in {HOLDINGS_INDEX_PATH}")
+        print(f"📚 Storico holdings: {history.stats()}")
+        print(f"🪪 Anagrafica titoli: {len(security_master)} titoli in {SECURITY_MASTER_DB}")
+        # Validazione per ultima: un errore qui non impedisce il salvataggio di indice e anagrafica
+        print_report(validate_dataset(dataset))
 
     except Exception as e:
         print(f"❌ Errore generale: {e}")
 
 
 if __name__ == "__main__":
-    main()
+    main(force_all="--all" in sys.argv)
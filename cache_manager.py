@@ -8,7 +8,7 @@ import sqlite3
 import threading
 import time
 from pathlib import Path
-from typing import Any, Optional, Dict, Set, Tuple, Callable
+from typing import Any, Optional, Dict, Set, Tuple, Callable, Iterable
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 
@@ -57,6 +57,18 @@ class MemoryCache:
         with self._lock:
             self._cache[key] = CacheEntry(value)
 
+    def get_many_with_info(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Recupera più chiavi in una volta; restituisce solo quelle presenti."""
+        with self._lock:
+            return {key: self._cache[key].to_dict() for key in keys if key in self._cache}
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Scrive più valori con lo stesso timestamp."""
+        timestamp = time.time()
+        with self._lock:
+            for key, value in items.items():
+                self._cache[key] = CacheEntry(value, timestamp)
+
     def exists(self, key: str) -> bool:
         """Verifica se una chiave esiste nella cache."""
         with self._lock:
@@ -178,6 +190,42 @@ class PersistentCache:
                     VALUES (?, ?, ?)
                 """, (key, blob_data, timestamp))
 
+    def get_many_with_info(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Recupera più chiavi con poche query; restituisce solo quelle presenti."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        result = {}
+        with self._lock:
+            with self._get_connection() as conn:
+                # SQLite limita il numero di parametri per singola query
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT key, value, timestamp FROM cache WHERE key IN ({placeholders})", chunk
+                    )
+                    for key, value, timestamp in cursor.fetchall():
+                        result[key] = {
+                            'value': json.loads(value.decode('utf-8')),
+                            'timestamp': timestamp,
+                            'age_seconds': now - timestamp
+                        }
+        return result
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Scrive più valori in un'unica transazione."""
+        timestamp = time.time()
+        rows = [
+            (key, json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), timestamp)
+            for key, value in items.items()
+        ]
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO cache (key, value, timestamp) 
+                    VALUES (?, ?, ?)
+                """, rows)
+
     def exists(self, key: str) -> bool:
         """Verifica se una chiave esiste nella cache."""
         with self._lock:
@@ -310,6 +358,27 @@ class CacheManager:
         """
         self._cache.set(key, value)
 
+    def get_many_with_info(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Recupera più chiavi in una sola operazione.
+
+        Args:
+            keys: Chiavi da cercare
+
+        Returns:
+            Dict chiave -> {'value', 'timestamp', 'age_seconds'} solo per le chiavi presenti
+        """
+        return self._cache.get_many_with_info(keys)
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """
+        Scrive più valori in una sola operazione con timestamp automatico.
+
+        Args:
+            items: Dict chiave -> valore (serializzabile in JSON)
+        """
+        self._cache.set_many(items)
+
     def exists(self, key: str) -> bool:
         """
         Verifica se una chiave esiste nella cache.
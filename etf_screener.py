@@ -0,0 +1,342 @@
+"""
+Screener sugli ETF di etf_overview.csv (circa 3.500 fondi, 43 colonne).
+
+Il CSV viene caricato una volta in una tabella a colonne numpy tipizzate: le
+colonne testuali con pochi valori (strategia, domicilio, valuta, ...) diventano
+categorie (codici interi + elenco dei valori), quelle numeriche e le date
+restano array contigui. Su questa tabella vengono costruiti due tipi di indice:
+
+- bitmap per le colonne categoriche e booleane: una maschera per valore, i
+  filtri di uguaglianza si combinano con AND/OR bit a bit;
+- indici ordinati (argsort) per le colonne numeriche e le date: un filtro di
+  intervallo è una ricerca binaria, e l'ordinamento con top-N scorre l'ordine
+  già calcolato fermandosi ai primi N fondi che passano i filtri.
+
+La tabella compilata, con gli indici ordinati, viene salvata in un file .npz
+accanto ai dati elaborati: agli avvii successivi, se il CSV non è cambiato,
+il parsing del CSV viene saltato.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CSV_PATH = "etf_overview.csv"
+DEFAULT_CACHE_PATH = os.path.join("output", "etf_overview.npz")
+
+# Cambia quando cambia il formato del file di cache (le cache esistenti vengono ricompilate)
+CACHE_VERSION = 1
+
+# Identificativi: sempre testo (mantengono gli zeri iniziali) e cercabili con get()
+KEY_COLUMNS = ["isin", "ticker", "wkn", "valor"]
+DATE_COLUMNS = ["inception_date"]
+
+# Colonne testuali con al massimo questi valori distinti diventano categorie
+MAX_CATEGORIES = 256
+
+Filter = Any
+
+
+class ETFScreener:
+    """Tabella a colonne di etf_overview.csv con indici bitmap e ordinati."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, np.ndarray],
+                 orders: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Args:
+            columns: Colonna -> array (codici per le colonne categoriche)
+            categories: Colonna categorica -> valori delle categorie (il codice -1 indica il valore mancante)
+            orders: Indici ordinati già calcolati (es. letti dalla cache); quelli mancanti vengono costruiti
+        """
+        self.columns = columns
+        self.categories = categories
+        self.column_names: List[str] = list(columns)
+        self._size = len(next(iter(columns.values()))) if columns else 0
+
+        # Indici ordinati: posizioni delle righe per valore crescente, valori mancanti in coda
+        self._orders: Dict[str, np.ndarray] = {}
+        self._valid: Dict[str, int] = {}
+        for name in self.sortable_columns():
+            values = columns[name]
+            order = orders[name] if orders and name in orders else np.argsort(values, kind="stable")
+            self._orders[name] = order.astype(np.int32)
+            self._valid[name] = int(np.count_nonzero(~_missing(values)))
+
+        # Bitmap: colonna -> valore -> maschera delle righe
+        self._bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        for name, values in categories.items():
+            codes = columns[name]
+            self._bitmaps[name] = {value: codes == code for code, value in enumerate(values.tolist())}
+        for name in self.column_names:
+            if columns[name].dtype == np.bool_:
+                self._bitmaps[name] = {True: columns[name], False: ~columns[name]}
+
+        # Identificativo -> riga (primo fondo con quel valore)
+        self._keys: Dict[str, int] = {}
+        for name in reversed([c for c in KEY_COLUMNS if c in columns]):
+            self._keys.update({value.upper(): row for row, value in enumerate(columns[name].tolist()) if value})
+
+    def __len__(self) -> int:
+        return self._size
+
+    def sortable_columns(self) -> List[str]:
+        """Colonne numeriche e di date (filtrabili per intervallo e ordinabili)."""
+        return [name for name in self.column_names
+                if name not in self.categories and self.columns[name].dtype.kind in "iufM"]
+
+    # === COSTRUZIONE ===
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ETFScreener":
+        """Compila un DataFrame con le colonne di etf_overview.csv."""
+        columns: Dict[str, np.ndarray] = {}
+        categories: Dict[str, np.ndarray] = {}
+        for name in df.columns:
+            series = df[name]
+            if name in DATE_COLUMNS:
+                columns[name] = pd.to_datetime(series, errors="coerce").to_numpy(dtype="datetime64[D]")
+            elif series.dtype == bool:
+                columns[name] = series.to_numpy(dtype=np.bool_)
+            elif pd.api.types.is_integer_dtype(series):
+                columns[name] = pd.to_numeric(series, downcast="integer").to_numpy()
+            elif pd.api.types.is_float_dtype(series):
+                columns[name] = series.to_numpy(dtype=np.float64)
+            elif name not in KEY_COLUMNS and series.nunique() <= MAX_CATEGORIES:
+                categorical = pd.Categorical(series)
+                columns[name] = categorical.codes
+                categories[name] = categorical.categories.to_numpy(dtype=str)
+            else:
+                columns[name] = series.fillna("").astype(str).to_numpy(dtype=object)
+        return cls(columns, categories)
+
+    @classmethod
+    def from_csv(cls, csv_path: str = DEFAULT_CSV_PATH) -> "ETFScreener":
+        return cls.from_frame(pd.read_csv(csv_path, dtype={name: str for name in KEY_COLUMNS}))
+
+    @classmethod
+    def load(cls, csv_path: str = DEFAULT_CSV_PATH, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+             refresh: bool = False) -> "ETFScreener":
+        """
+        Carica lo screener dalla cache binaria, o dal CSV se la cache manca o non è aggiornata.
+
+        Args:
+            csv_path: CSV con la panoramica degli ETF
+            cache_path: File .npz della tabella compilata (None: nessuna cache)
+            refresh: Ricompila dal CSV anche se la cache è valida
+
+        Returns:
+            Screener pronto per le query
+        """
+        source = _source_stamp(csv_path)
+        if cache_path is not None and not refresh and os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                if int(data["version"][0]) == CACHE_VERSION and data["source"].tolist() == source:
+                    return cls._from_npz(data)
+
+        screener = cls.from_csv(csv_path)
+        if cache_path is not None:
+            screener.save(cache_path, source)
+        return screener
+
+    @classmethod
+    def _from_npz(cls, data) -> "ETFScreener":
+        columns, categories, orders = {}, {}, {}
+        for name in data["column_names"].tolist():
+            values = data[f"col:{name}"]
+            columns[name] = values.astype(object) if values.dtype.kind == "U" else values
+            if f"cat:{name}" in data.files:
+                categories[name] = data[f"cat:{name}"]
+            if f"order:{name}" in data.files:
+                orders[name] = data[f"order:{name}"]
+        return cls(columns, categories, orders)
+
+    def save(self, cache_path: str = DEFAULT_CACHE_PATH, source: Optional[List[int]] = None) -> None:
+        """Salva tabella e indici ordinati in un file .npz (scrittura atomica)."""
+        arrays = {"version": np.array([CACHE_VERSION]),
+                  "source": np.array(source or [0, 0], dtype=np.int64),
+                  "column_names": np.array(self.column_names, dtype=str)}
+        for name in self.column_names:
+            values = self.columns[name]
+            arrays[f"col:{name}"] = values.astype(str) if values.dtype == object else values
+        for name, values in self.categories.items():
+            arrays[f"cat:{name}"] = values
+        for name, order in self._orders.items():
+            arrays[f"order:{name}"] = order
+
+        directory = os.path.dirname(cache_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # === QUERY ===
+
+    def _range_mask(self, name: str, low, high) -> np.ndarray:
+        # Per numpy NaN e NaT seguono ogni altro valore: le ricerche restano entro i primi `valid`
+        values, order, valid = self.columns[name], self._orders[name], self._valid[name]
+        if values.dtype.kind == "M":
+            low = None if low is None else np.datetime64(str(low), "D")
+            high = None if high is None else np.datetime64(str(high), "D")
+        start = 0 if low is None else np.searchsorted(values, low, side="left", sorter=order)
+        end = valid if high is None else np.searchsorted(values, high, side="right", sorter=order)
+        mask = np.zeros(self._size, dtype=np.bool_)
+        mask[order[start:end]] = True
+        return mask
+
+    def _filter_mask(self, name: str, condition: Filter) -> np.ndarray:
+        if name not in self.columns:
+            raise KeyError(f"❌ Colonna '{name}' non presente in etf_overview")
+
+        if name in self._bitmaps:
+            bitmaps = self._bitmaps[name]
+            values = condition if isinstance(condition, (list, set, frozenset)) else [condition]
+            masks = [bitmaps[value] for value in values if value in bitmaps]
+            if not masks:
+                return np.zeros(self._size, dtype=np.bool_)
+            return np.logical_or.reduce(masks) if len(masks) > 1 else masks[0]
+
+        if name in self._orders:
+            if isinstance(condition, tuple):
+                return self._range_mask(name, *condition)
+            return self._range_mask(name, condition, condition)
+
+        # Testo libero: uguaglianza (o appartenenza a una lista)
+        values = condition if isinstance(condition, (list, set, frozenset)) else [condition]
+        return np.isin(self.columns[name], list(values))
+
+    def select(self, filters: Optional[Dict[str, Filter]] = None, sort_by: Optional[str] = None,
+               ascending: bool = True, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Righe dei fondi che soddisfano tutti i filtri, eventualmente ordinate e limitate.
+
+        Args:
+            filters: Colonna -> condizione:
+                - valore o lista di valori per le colonne categoriche, booleane e testuali;
+                - (min, max) per le colonne numeriche e le date, estremi inclusi, None = aperto;
+                - valore singolo per l'uguaglianza su colonne numeriche
+            sort_by: Colonna numerica o di date per l'ordinamento (valori mancanti in coda)
+            ascending: Ordinamento crescente
+            limit: Numero massimo di fondi (top-N)
+
+        Returns:
+            Array delle posizioni delle righe
+        """
+        mask = None
+        for name, condition in (filters or {}).items():
+            condition_mask = self._filter_mask(name, condition)
+            mask = condition_mask if mask is None else mask & condition_mask
+
+        if sort_by is None:
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self._size)
+            return rows[:limit] if limit is not None else rows
+
+        if sort_by not in self._orders:
+            raise KeyError(f"❌ Colonna '{sort_by}' non ordinabile")
+        order = self._orders[sort_by]
+        if not ascending:
+            valid = self._valid[sort_by]
+            order = np.concatenate([order[valid - 1::-1] if valid else order[:0], order[valid:]])
+        rows = order[mask[order]] if mask is not None else order
+        return rows[:limit] if limit is not None else rows
+
+    def query(self, filters: Optional[Dict[str, Filter]] = None, sort_by: Optional[str] = None,
+              ascending: bool = True, limit: Optional[int] = None,
+              columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Come select, restituendo un DataFrame con le colonne richieste (default: tutte)."""
+        return self.to_frame(self.select(filters, sort_by, ascending, limit), columns)
+
+    def get(self, identifier: str) -> Optional[Dict[str, Any]]:
+        """Dati di un fondo cercato per ISIN, ticker, WKN o valor (None se non presente)."""
+        row = self._keys.get(identifier.strip().upper())
+        if row is None:
+            return None
+        return self.to_frame(np.array([row])).iloc[0].to_dict()
+
+    def to_frame(self, rows: Optional[np.ndarray] = None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """DataFrame delle righe indicate (default: tutte), con le colonne categoriche come pd.Categorical."""
+        data = {}
+        for name in columns or self.column_names:
+            values = self.columns[name] if rows is None else self.columns[name][rows]
+            if name in self.categories:
+                values = pd.Categorical.from_codes(values, categories=self.categories[name])
+            elif values.dtype == object:
+                values = pd.array(np.where(values == "", None, values), dtype="string")
+            data[name] = values
+        return pd.DataFrame(data, index=rows)
+
+    def memory_usage(self) -> int:
+        """Byte occupati da colonne e indici (le stringhe contano solo i puntatori)."""
+        arrays = list(self.columns.values()) + list(self._orders.values())
+        arrays += [mask for bitmaps in self._bitmaps.values() for mask in bitmaps.values()]
+        return sum(array.nbytes for array in arrays)
+
+
+def _missing(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind == "M":
+        return np.isnat(values)
+    return np.zeros(len(values), dtype=np.bool_)
+
+
+def _source_stamp(csv_path: str) -> List[int]:
+    """Dimensione e data di modifica del CSV: se cambiano la cache va ricompilata."""
+    stat = os.stat(csv_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_filter(text: str) -> Tuple[str, Filter]:
+    """
+    Filtro da riga di comando: 'colonna=valore', 'colonna=v1,v2' oppure 'colonna=min:max' (estremi opzionali).
+    """
+    name, _, value = text.partition("=")
+    if ":" in value and (name in DATE_COLUMNS or all(_is_number(part) for part in value.split(":") if part)):
+        low, _, high = value.partition(":")
+        convert = str if name in DATE_COLUMNS else float
+        return name, (convert(low) if low else None, convert(high) if high else None)
+    values = [_parse_scalar(part) for part in value.split(",")]
+    return name, values if len(values) > 1 else values[0]
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _parse_scalar(text: str) -> Any:
+    if text in ("True", "False"):
+        return text == "True"
+    return float(text) if _is_number(text) else text
+
+
+if __name__ == "__main__":
+    # Esempio: python etf_screener.py currency=EUR ter=:0.2 sort=-size limit=10
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if arg.startswith(("sort=", "limit=")))
+    filters = dict(parse_filter(arg) for arg in sys.argv[1:] if not arg.startswith(("sort=", "limit=")))
+    sort = options.get("sort", "-size")
+
+    start = time.perf_counter()
+    screener = ETFScreener.load()
+    loaded = time.perf_counter()
+    result = screener.query(filters, sort_by=sort.lstrip("-"), ascending=not sort.startswith("-"),
+                            limit=int(options.get("limit", 20)),
+                            columns=["isin", "ticker", "name", "currency", "ter", "size", "last_year"])
+    elapsed = time.perf_counter()
+
+    print(f"📂 {len(screener)} ETF caricati in {(loaded - start) * 1000:.1f} ms "
+          f"({screener.memory_usage() / 1024:.0f} KB)")
+    print(f"🔎 Query in {(elapsed - loaded) * 1000:.2f} ms: {len(result)} risultati\n")
+    print(result.to_string(index=False))
@@ -0,0 +1,81 @@
+"""
+Motore di estrazione in-process per i file scaricati degli emittenti.
+
+Sostituisce il lancio di un interprete Python per ogni ISIN: un pool di
+processi (create_pool) importa pandas e gli estrattori una sola volta per
+worker e risultati ed errori di ogni ISIN tornano in memoria al processo
+principale. Il pool è condiviso dai plugin iShares e Xtrackers
+(issuer_plugins.py), che vi eseguono il parsing dei file (run_in_pool) mentre
+l'orchestratore gestisce i download.
+"""
+
+import importlib
+import os
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Nome estrattore -> (modulo, funzione)
+EXTRACTORS: Dict[str, Tuple[str, str]] = {
+    "ishares": ("ishares_data_extractor", "extract_ishares"),
+    "xtrackers": ("xtrackers_data_extractor", "extract_xtrackers"),
+}
+
+
+def get_extractor(name: str):
+    """Funzione di estrazione registrata con il nome indicato."""
+    if name not in EXTRACTORS:
+        raise KeyError(f"Nessun estrattore registrato per '{name}'")
+    module_name, function_name = EXTRACTORS[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _init_worker(names: List[str]) -> None:
+    """Importa pandas e gli estrattori una volta sola all'avvio del worker."""
+    for name in names:
+        get_extractor(name)
+
+
+def extract_one(name: str, isin: str, options: Optional[Dict] = None) -> Dict:
+    """
+    Esegue un estrattore su un ISIN catturando l'eventuale errore.
+
+    Returns:
+        Dict con extractor, isin, status ('ok'/'error'), error, traceback, seconds e result
+    """
+    start = time.perf_counter()
+    try:
+        result = get_extractor(name)(isin, verbose=False, **(options or {}))
+        return {"extractor": name, "isin": isin, "status": "ok", "error": None, "traceback": None,
+                "seconds": time.perf_counter() - start, "result": result}
+    except Exception as e:
+        return {"extractor": name, "isin": isin, "status": "error", "error": str(e),
+                "traceback": traceback.format_exc(), "seconds": time.perf_counter() - start, "result": None}
+
+
+def create_pool(names: Iterable[str], max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool di processi con pandas e gli estrattori indicati già importati nei worker.
+
+    Args:
+        names: Estrattori usati (chiavi di EXTRACTORS)
+        max_workers: Processi del pool (default: numero di core)
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                               initializer=_init_worker, initargs=(sorted(set(names)),))
+
+
+def run_in_pool(pool: Optional[Executor], name: str, isin: str, options: Optional[Dict] = None) -> Dict:
+    """
+    Esegue un estrattore su un ISIN nel pool indicato (nel processo corrente se None).
+
+    Returns:
+        Risultato dell'estrattore; in caso di errore nel worker solleva RuntimeError con il messaggio
+    """
+    if pool is None:
+        return get_extractor(name)(isin, verbose=False, **(options or {}))
+    result = pool.submit(extract_one, name, isin, options).result()
+    if result["status"] != "ok":
+        raise RuntimeError(result["error"])
+    return result["result"]
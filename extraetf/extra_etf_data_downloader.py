@@ -1,17 +1,37 @@
 import requests
 import json
+import sys
 import time
 import os
-from typing import List
+from typing import List, Optional
 
-def download_etf_data(isin_list: List[str], output_dir: str = "etf_data", delay: float = 1.0):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient
+from response_archive import ResponseArchive
+from work_journal import WorkJournal
+
+JOURNAL_JOB = "extraetf_download"
+JOURNAL_STAGE = "download"
+ARCHIVE_SOURCE = "extraetf"
+
+def download_etf_data(isin_list: List[str], output_dir: str = "etf_data", delay: float = 1.0,
+                      journal: Optional[WorkJournal] = None, client: Optional[HttpClient] = None,
+                      archive: Optional[ResponseArchive] = None, save_json: bool = False):
     """
     Scarica i dati degli ETF da ExtraETF per una lista di ISIN.
 
+    Se un'esecuzione precedente si è interrotta, riprende dagli ISIN non ancora scaricati.
+
     Args:
         isin_list: Lista degli ISIN da processare
         output_dir: Directory dove salvare i file JSON (default: "etf_data")
         delay: Pausa in secondi tra una richiesta e l'altra (default: 1.0)
+        journal: Journal delle elaborazioni (default: journal.db in output_dir)
+        client: Client HTTP (default: client con header e cookie di ExtraETF).
+            Per test offline: HttpClient(session=FixtureServer(...).session())
+        archive: Archivio compresso delle risposte (default: archive.db in output_dir)
+        save_json: Se True salva anche il file <ISIN>.json nella directory di output
     """
 
     # Crea la directory di output se non esiste
@@ -34,64 +54,89 @@ def download_etf_data(isin_list: List[str], output_dir: str = "etf_data", delay:
         'extraetf_locale': 'it'
     }
 
+    # Un'unica sessione per tutte le richieste, con cookie e header condivisi
+    client = client or HttpClient(headers=headers, cookies=cookies)
+    if client.session.cookies.get('extraetf_locale') is None:
+        client.session.cookies.update(cookies)
+
+    archive = archive or ResponseArchive(os.path.join(output_dir, "archive.db"))
+    journal = journal or WorkJournal(os.path.join(output_dir, "journal.db"))
+    run_id = journal.start_run(JOURNAL_JOB, [(isin, JOURNAL_STAGE) for isin in isin_list])
+    # Tutti gli elementi da elaborare dell'esecuzione, anche quelli di una lista precedente
+    # interrotta: solo così l'esecuzione può essere chiusa
+    todo = [isin for isin in dict.fromkeys(isin for isin, _ in journal.pending(run_id))]
+
     successful_downloads = 0
     failed_downloads = 0
 
-    print(f"Inizio download per {len(isin_list)} ISIN...")
-
-    for i, isin in enumerate(isin_list, 1):
+    requested = set(isin_list)
+    already_done = len(requested.difference(todo))
+    resumed = len(set(todo).difference(requested))
+    if already_done:
+        print(f"ISIN già scaricati in questa esecuzione: {already_done}")
+    if resumed:
+        print(f"ISIN ripresi da un'esecuzione interrotta: {resumed}")
+    print(f"Inizio download per {len(todo)} ISIN...")
+
+    for i, isin in enumerate(todo, 1):
+        journal.claim(run_id, isin, JOURNAL_STAGE)
         try:
             # Costruisce l'URL per la richiesta
             url = f"{base_url}?isin={isin}&extraetf_locale=it"
 
-            print(f"[{i}/{len(isin_list)}] Scaricando dati per ISIN: {isin}")
+            print(f"[{i}/{len(todo)}] Scaricando dati per ISIN: {isin}")
             print(f"URL: {url}")  # Debug: mostra l'URL completo
 
-            # Crea una sessione per mantenere i cookies
-            session = requests.Session()
-            session.headers.update(headers)
-            session.cookies.update(cookies)
-
-            # Effettua la richiesta HTTP
-            response = session.get(url, timeout=30)
-            response.raise_for_status()  # Solleva un'eccezione per status code di errore
+            # Effettua la richiesta HTTP (con retry sugli errori temporanei)
+            response = client.get(url, headers=headers, timeout=30)
 
             print(f"Status Code: {response.status_code}")  # Debug
 
             # Controlla se la risposta contiene dati JSON validi
-            json_data = response.json()
+            response.json()
 
-            # Salva il file JSON
-            filename = f"{isin}.json"
-            filepath = os.path.join(output_dir, filename)
+            # Archivia la risposta grezza (compressa, deduplicata per contenuto)
+            digest, is_new = archive.put(isin, ARCHIVE_SOURCE, response.content)
+            print(f"✓ Archiviato: {isin} ({'nuovo contenuto' if is_new else 'invariato'})")
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+            if save_json:
+                # Scrittura atomica: il file è completo oppure non viene toccato
+                filepath = os.path.join(output_dir, f"{isin}.json")
+                journal.write_output(run_id, isin, JOURNAL_STAGE, filepath, response.content)
+                print(f"✓ Salvato: {filepath}")
+            else:
+                journal.complete(run_id, isin, JOURNAL_STAGE, str(archive.db_path), digest)
 
-            print(f"✓ Salvato: {filepath}")
             successful_downloads += 1
 
         except requests.exceptions.RequestException as e:
             print(f"✗ Errore di rete per ISIN {isin}: {e}")
+            journal.fail(run_id, isin, JOURNAL_STAGE, str(e))
             failed_downloads += 1
 
         except json.JSONDecodeError as e:
             print(f"✗ Errore nel parsing JSON per ISIN {isin}: {e}")
+            journal.fail(run_id, isin, JOURNAL_STAGE, str(e))
             failed_downloads += 1
 
         except Exception as e:
             print(f"✗ Errore generico per ISIN {isin}: {e}")
+            journal.fail(run_id, isin, JOURNAL_STAGE, str(e))
             failed_downloads += 1
 
         # Pausa tra le richieste per essere rispettosi verso il server
-        if i < len(isin_list):  # Non aspettare dopo l'ultima richiesta
+        if i < len(todo):  # Non aspettare dopo l'ultima richiesta
             time.sleep(delay)
 
     # Riepilogo finale
     print(f"\n=== RIEPILOGO ===")
     print(f"Download completati con successo: {successful_downloads}")
     print(f"Download falliti: {failed_downloads}")
-    print(f"File salvati in: {os.path.abspath(output_dir)}")
+    print(f"Risposte archiviate in: {os.path.abspath(archive.db_path)}")
+
+    if not journal.finish_run(run_id):
+        print("⚠️ Alcuni ISIN verranno ritentati alla prossima esecuzione")
+    journal.print_summary(run_id)
 
 # Esempio di utilizzo
 if __name__ == "__main__":
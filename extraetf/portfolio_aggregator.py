@@ -2,26 +2,72 @@ import sys
 import json
 import os
 from collections import defaultdict
-from typing import Dict
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from exposure_engine import ASSET_CLASSES, BATCH_MAX_ENTRIES, UNKNOWN_CLASS, ExposureEngine
 from geo_utils import GeoUtils
+from holdings_db import HoldingsDB
+from holdings_index import HoldingsIndex
+from response_archive import ResponseArchive
+from security_master import SecurityMaster
+
+ARCHIVE_SOURCE = "extraetf"
 
 class PortfolioAggregator:
-    def __init__(self, data_dir: str = "./data"):
+    def __init__(self, data_dir: str = "./data", archive: Optional[ResponseArchive] = None,
+                 security_master: Optional[SecurityMaster] = None):
         """
         Inizializza l'aggregatore di portafoglio.
 
         Args:
             data_dir: Directory contenente i file JSON degli ETF
+            archive: Archivio delle risposte ExtraETF (default: archive.db in data_dir se presente)
+            security_master: Anagrafica titoli condivisa (default: una nuova, in memoria)
         """
         self.data_dir = data_dir
+        self.security_master = security_master or SecurityMaster()
+        # Esposizioni degli ETF caricati compilate in matrici sparse, ricompilate dopo ogni caricamento
+        self._engine: Optional[ExposureEngine] = None
+        self.archive = archive
+        if self.archive is None and os.path.exists(os.path.join(data_dir, "archive.db")):
+            self.archive = ResponseArchive(os.path.join(data_dir, "archive.db"))
         self.etf_data = {}
 
+    @staticmethod
+    def _extract_portfolio_data(data: Dict) -> Optional[Dict]:
+        """Estrae i dati del portfolio breakdown da una risposta ExtraETF (None se mancanti)."""
+        if 'results' not in data or len(data['results']) == 0:
+            return None
+
+        result = data['results'][0]
+
+        return {
+            "name": result.get('name'),
+            "asset_class_name": result.get('asset_class_name', 'Unknown'),
+            "crypto_currency_name": result.get('crypto_currency_name'),
+            "isin": result.get('isin', 'Unknown'),
+            "trading_symbol_base": result.get('trading_symbol_base', 'Unknown'),
+            "trading_symbol_localized": result.get('trading_symbol_localized', 'Unknown'),
+            "trading_symbol_xetra": result.get('trading_symbol_xetra', 'Unknown'),
+            "ter": result.get('ter', 0),
+            "currency": result.get('currency', 0),
+            "commodity_class_name": result.get('commodity_class_name'),
+            "commodity_type_name": result.get('commodity_type_name'),
+            "portfolio_breakdown": result.get('portfolio_breakdown', {}),
+            "fund_domicile": result.get('fund_domicile'),
+            "fund_domicile_code": result.get('fund_domicile_code'),
+        }
+
     def load_etf_data(self) -> None:
-        """Carica tutti i file JSON dalla directory data."""
+        """Carica l'ultima risposta di ogni ETF dall'archivio o, in sua assenza, i file JSON della directory data."""
+        if self.archive is not None:
+            self._load_from_archive()
+            return
+
         if not os.path.exists(self.data_dir):
             raise FileNotFoundError(f"Directory {self.data_dir} non trovata")
 
@@ -39,42 +85,56 @@ class PortfolioAggregator:
             try:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-
-                # Estrai i dati del portfolio breakdown
-                if 'results' in data and len(data['results']) > 0:
-
-                    result = data['results'][0]
-
-                    portfolio_data = {
-                        "asset_class_name": result.get('asset_class_name', 'Unknown'),
-                        "crypto_currency_name": result.get('crypto_currency_name'),
-                        "isin": result.get('isin', 'Unknown'),
-                        "trading_symbol_base": result.get('trading_symbol_base', 'Unknown'),
-                        "trading_symbol_localized": result.get('trading_symbol_localized', 'Unknown'),
-                        "trading_symbol_xetra": result.get('trading_symbol_xetra', 'Unknown'),
-                        "ter": result.get('ter', 0),
-                        "currency": result.get('currency', 0),
-                        "commodity_class_name": result.get('commodity_class_name'),
-                        "commodity_type_name": result.get('commodity_type_name'),
-                        "portfolio_breakdown": result.get('portfolio_breakdown', {}),
-                        "fund_domicile": result.get('fund_domicile'),
-                        "fund_domicile_code": result.get('fund_domicile_code'),
-                    }
-
-                    # print("PORTFOLIO DATA: " + str(portfolio_data))
-
-                    self.etf_data[isin] = portfolio_data
-                    print(f"✓ Caricato {isin}")
-                else:
-                    print(f"⚠ Dati mancanti per {isin}")
+                self._store(isin, data)
 
             except Exception as e:
                 print(f"✗ Errore nel caricamento di {filename}: {e}")
 
+    def _load_from_archive(self) -> None:
+        """Carica l'ultima versione di ogni ETF dall'archivio con una sola lettura."""
+        responses = self.archive.latest_many(ARCHIVE_SOURCE)
+        if not responses:
+            raise FileNotFoundError(f"Nessuna risposta {ARCHIVE_SOURCE} in {self.archive.db_path}")
+
+        print(f"Caricamento di {len(responses)} ETF dall'archivio...")
+
+        for isin, content in responses.items():
+            try:
+                self._store(isin, json.loads(content))
+            except Exception as e:
+                print(f"✗ Errore nel caricamento di {isin}: {e}")
+
+    def _store(self, isin: str, data: Dict) -> None:
+        portfolio_data = self._extract_portfolio_data(data)
+        if portfolio_data is not None:
+            self.etf_data[isin] = portfolio_data
+            self._engine = None
+            print(f"✓ Caricato {isin}")
+        else:
+            print(f"⚠ Dati mancanti per {isin}")
+
+    @property
+    def engine(self) -> ExposureEngine:
+        """Motore di aggregazione, compilato al primo uso sugli ETF caricati."""
+        if self._engine is None:
+            self._engine = ExposureEngine.compile(self.etf_data, self.security_master)
+        return self._engine
+
+    def holding_ids(self, isin: str):
+        """
+        ID (anagrafica titoli) e pesi delle holdings di un ETF caricato.
+
+        Returns:
+            Tupla (array int64 di ID, array float64 di pesi); le holdings senza nome né ISIN hanno ID -1
+        """
+        return self.engine.holding_ids(isin)
+
     def aggregate_portfolio(self, portfolio_weights: Dict[str, float]) -> Dict:
         """
         Aggrega i dati del portafoglio in base alle percentuali.
 
+        Ogni dimensione è un prodotto vettore-matrice sulle esposizioni compilate (vedi exposure_engine).
+
         Args:
             portfolio_weights: Dict con ISIN come chiave e percentuale come valore
             Esempio: {"IE00BZ56SW52": 30.0, "IE00B4L5Y983": 55.0, "IE00B3XXRP09": 15.0}
@@ -88,201 +148,54 @@ class PortfolioAggregator:
             print(f"⚠ Attenzione: le percentuali sommano a {total_weight}% invece di 100%")
 
         # Converti percentuali in decimali
-        weights = {isin: weight / 100.0 for isin, weight in portfolio_weights.items()}
-
-        # Inizializza le strutture per l'aggregazione
-        aggregated_data = {
-            'esposizione_settoriale': defaultdict(float),
-            'esposizione_geografica': defaultdict(float),
-            'esposizione_regioni': defaultdict(float),
-            'holdings': defaultdict(float),
-            'valute': defaultdict(float),
-            'marketcap_giant': 0.0,
-            'marketcap_large': 0.0,
-            'marketcap_medium': 0.0,
-            'marketcap_micro': 0.0,
-            'marketcap_small': 0.0,
-        }
-
-        weight_azioni = 0.0
-        weight_obbligazioni = 0.0
-        weight_commodities = 0.0
-        weight_monetario = 0.0
-        weight_crypto = 0.0
-        weight_sconosciuto = 0.0
+        isins = list(portfolio_weights)
+        weights = np.array([portfolio_weights[isin] for isin in isins], dtype=float) / 100.0
 
-        for isin, weight in weights.items():
-            if isin not in self.etf_data:
+        engine = self.engine
+        rows = engine.rows(isins)
+        for isin, row in zip(isins, rows.tolist()):
+            if row < 0:
                 print(f"⚠ Dati non trovati per ISIN {isin}")
-                weight_sconosciuto += weight
-                continue
-
-            etf_data = self.etf_data[isin]
-            print(f"Processando {isin} (peso: {weight * 100:.1f}%)")
-
-            asset_class_name = etf_data['asset_class_name']
-            if asset_class_name == "Azioni":
-                print(f"✓ l'ETF {isin} è di classe Azioni (classe: {asset_class_name})")
-                weight_azioni += weight
-            elif asset_class_name == "Obbligazioni":
-                print(f"✓ l'ETF {isin} è di classe Obbligazioni (classe: {asset_class_name})")
-                weight_obbligazioni += weight
-            elif asset_class_name == "Materie prime":
-                print(f"✓ l'ETF {isin} è di classe Materie prime (classe: {asset_class_name})")
-                weight_commodities += weight
-            elif asset_class_name == "Mercato monetario":
-                print(f"✓ l'ETF {isin} è di classe Mercato monetario (classe: {asset_class_name})")
-                weight_monetario += weight
-            elif asset_class_name == "Criptovalute":
-                print(f"✓ l'ETF {isin} è di classe Criptovalute (classe: {asset_class_name})")
-                weight_crypto += weight
-            else:
-                print(f"⚠ Attenzione: L'ETF {isin} è di classe SCONOSCIUTA: {asset_class_name}")
-                weight_sconosciuto += weight
+            elif engine.asset_classes[row] == UNKNOWN_CLASS:
+                print(f"⚠ Attenzione: L'ETF {isin} è di classe SCONOSCIUTA: {self.etf_data[isin]['asset_class_name']}")
 
+        class_weights = engine.asset_class_weights(rows, weights) * 100
         print("\n=== CALCOLO PERCENTUALI PORTAFOGLIO ===")
-        print(f"Azioni: {weight_azioni * 100:.2f}%")
-        print(f"Obbligazioni: {weight_obbligazioni * 100:.2f}%")
-        print(f"Materie prime: {weight_commodities * 100:.2f}%")
-        print(f"Mercato monetario: {weight_monetario * 100:.2f}%")
-        print(f"Criptovalute: {weight_crypto * 100:.2f}%")
-        print(f"Sconosciuto: {weight_sconosciuto * 100:.2f}%")
-        print(
-            f"Totale: {(weight_azioni + weight_obbligazioni + weight_commodities + weight_monetario + weight_crypto + weight_sconosciuto) * 100:.2f}%")
-
-        print("\n=== AGGREGAZIONE DATI ===")
-        for isin, weight in weights.items():
-            etf_data = self.etf_data[isin]
-
-            print(f"Processando {isin} (peso: {weight * 100:.1f}%)")
-            asset_class_name = etf_data['asset_class_name']
-            portfolio_breakdown = etf_data.get('portfolio_breakdown', {})
-            fund_domicile_code = etf_data.get("fund_domicile_code", "Unknown country code")
-
-            if asset_class_name == "Azioni" or asset_class_name == "Obbligazioni":
-                global_stock_exposure_list = portfolio_breakdown.get('global_stock_exposure_list', [])
-                global_bond_exposure_list = portfolio_breakdown.get('global_bond_exposure_list', [])
-                global_exposure_list = global_stock_exposure_list + global_bond_exposure_list
-
-                country_stocks_exposure_list = portfolio_breakdown.get('country_stocks_exposure_list', [])
-                country_bond_exposure_list = portfolio_breakdown.get('country_bond_exposure_list', [])
-                country_convertible_exposure_list = portfolio_breakdown.get('country_convertible_exposure_list', [])
-                country_exposure_list = country_stocks_exposure_list + country_bond_exposure_list + country_convertible_exposure_list
-
-                region_stock_exposure_list = portfolio_breakdown.get('region_stock_exposure_list', [])
-                region_bond_exposure_list = portfolio_breakdown.get('region_bond_exposure_list', [])
-                region_convertible_exposure_list = portfolio_breakdown.get('region_convertible_exposure_list', [])
-                region_exposure_list = region_stock_exposure_list + region_bond_exposure_list + region_convertible_exposure_list
-            elif asset_class_name == "Materie prime":
-                commodity_name = etf_data.get("commodity_type_name", "Unknown commodity")
-                global_exposure_list = [{"name": commodity_name, "value": 100.0}]
-
-                country_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-                region_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-            elif asset_class_name == "Mercato monetario":
-                currency_name = etf_data.get("currency", "Unknown currency")
-                global_exposure_list = [{"name": "Monetario " + currency_name, "value": 100.0}]
-
-                country_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-                region_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-            elif asset_class_name == "Criptovalute":
-                crypto_name = etf_data.get("crypto_currency_name", "Unknown cryptocurrency")
-                global_exposure_list = [{"name": crypto_name, "value": 100.0}]
-
-                country_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-                region_exposure_list = [{"name": fund_domicile_code, "value": 100.0}]
-            else:
-                print(f"⚠ Attenzione: L'ETF {isin} è di classe SCONOSCIUTA: {asset_class_name}")
-                global_exposure_list = [{"name": "Unknown sector", "value": 100.0}]
-                country_exposure_list = [{"name": "Unknown country", "value": 100.0}]
-                region_exposure_list = [{"name": "Unknown region", "value": 100.0}]
-
-            print(f"✓ global_exposure_list: {global_exposure_list}")
-            print(f"✓ country_exposure_list: {country_exposure_list}")
-            print(f"✓ region_exposure_list: {region_exposure_list}")
-
-            # 1. ESPOSIZIONE SETTORIALE
-
-            sector_data = global_exposure_list
-            for sector in sector_data:
-                sector_name = sector.get('name', 'Unknown')
-                sector_value = sector.get('value', 0)
-                aggregated_data['esposizione_settoriale'][sector_name] += sector_value * weight
-
-            # 2. ESPOSIZIONE GEOGRAFICA
-            country_data = country_exposure_list
-            for country in country_data:
-                country_name = country.get('code', 'Unknown')
-                if country_name == 'Unknown':
-                    country_name = country.get('name', 'Unknown')
-                    # print(country_name)
-                country_value = country.get('value', 0)
-                aggregated_data['esposizione_geografica'][country_name] += country_value * weight
-
-            # 3. ESPOSIZIONE REGIONI
-            region_data = region_exposure_list
-            for region in region_data:
-                region_name = region.get('name', 'Unknown A')
-                if region_name is None:
-                    region_name = "Unknown B"
-                else:
-                    if len(str(region_name)) == 2:
-                        country_code = str(region_name)
-                        print(country_code)
-                        region_name = GeoUtils.get_continent_name(country_code)
-                        if region_name is None:
-                            region_name = "Unknown C"
-
-                region_value = region.get('value', 0)
-                aggregated_data['esposizione_regioni'][region_name] += region_value * weight
-
-            # 4. HOLDINGS (singole azioni)
-            holdings_data = portfolio_breakdown.get('items', [])
-            for holding in holdings_data:
-                holding_name = holding.get('name', 'Unknown')
-                holding_isin = holding.get('isin', '')
-                holding_weight = holding.get('weight', 0)
-
-                # Usa ISIN + Nome per identificare univocamente
-                holding_key = f"{holding_name} ({holding_isin})" if holding_isin else holding_name
-                aggregated_data['holdings'][holding_key] += holding_weight * weight
-
-            # 5. VALUTE
-            currency_data = portfolio_breakdown.get('currency_allocations', [])
-            for currency in currency_data:
-                currency_name = currency.get('name', 'Sconosciuta')
-                currency_value = currency.get('value', 0)
-                aggregated_data['valute'][currency_name] += currency_value * weight
-
-            # 6. MARKETCAP
-            if asset_class_name == "Azioni":
-                print("Weight: " + str(weight))
-                marketcap_giant = portfolio_breakdown.get('marketcap_giant', 0.0)
-                marketcap_large = portfolio_breakdown.get('marketcap_large', 0.0)
-                marketcap_medium = portfolio_breakdown.get('marketcap_medium', 0.0)
-                marketcap_micro = portfolio_breakdown.get('marketcap_micro', 0.0)
-                marketcap_small = portfolio_breakdown.get('marketcap_small', 0.0)
-                aggregated_data['marketcap_giant'] += marketcap_giant * weight
-                aggregated_data['marketcap_large'] += marketcap_large * weight
-                aggregated_data['marketcap_medium'] += marketcap_medium * weight
-                aggregated_data['marketcap_micro'] += marketcap_micro * weight
-                aggregated_data['marketcap_small'] += marketcap_small * weight
-
-        if weight_azioni > 0:
-            aggregated_data['marketcap_giant'] = aggregated_data['marketcap_giant'] / weight_azioni
-            aggregated_data['marketcap_large'] = aggregated_data['marketcap_large'] / weight_azioni
-            aggregated_data['marketcap_medium'] = aggregated_data['marketcap_medium'] / weight_azioni
-            aggregated_data['marketcap_micro'] = aggregated_data['marketcap_micro'] / weight_azioni
-            aggregated_data['marketcap_small'] = aggregated_data['marketcap_small'] / weight_azioni
-
-        result = {}
-        for category, data in aggregated_data.items():
-            if isinstance(data, defaultdict):
-                sorted_data = sorted(data.items(), key=lambda x: x[1], reverse=True)
-                result[category] = sorted_data
-            else:
-                # Per marketcap mantieni il valore numerico
-                result[category] = data
+        for name, weight in zip(ASSET_CLASSES + ["Sconosciuto"], class_weights.tolist()):
+            print(f"{name}: {weight:.2f}%")
+        print(f"Totale: {class_weights.sum():.2f}%")
+
+        found = rows >= 0
+        return engine.aggregate(rows[found], weights[found])
+
+    def aggregate_portfolios(self, weights, isins: List[str], max_entries: int = BATCH_MAX_ENTRIES) -> Dict:
+        """
+        Aggrega molti portafogli in una sola chiamata, con risultati colonnari.
+
+        Args:
+            weights: Matrice portafogli × ETF delle percentuali (una riga per portafoglio)
+            isins: ISIN di ogni colonna di weights
+            max_entries: Voci espanse massime per blocco di portafogli (limita la memoria)
+
+        Returns:
+            Dict di array colonnari, vedi ExposureEngine.aggregate_many (pesi per classe in percentuale)
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != len(isins):
+            raise ValueError(f"{weights.shape[1]} colonne di pesi per {len(isins)} ISIN")
+
+        totals = weights.sum(axis=1)
+        wrong = np.flatnonzero(np.abs(totals - 100.0) > 0.01)
+        if len(wrong):
+            print(f"⚠ Attenzione: {len(wrong)} portafogli su {len(weights)} non sommano a 100% "
+                  f"(primo: riga {wrong[0]}, {totals[wrong[0]]:.2f}%)")
+
+        engine = self.engine
+        rows = engine.rows(isins)
+        for isin in np.asarray(isins, dtype=object)[rows < 0].tolist():
+            print(f"⚠ Dati non trovati per ISIN {isin}")
+        result = engine.aggregate_many(weights / 100.0, rows, max_entries=max_entries)
+        result['asset_classes'] *= 100
         return result
 
     def print_results(self, aggregated_data: Dict) -> None:
@@ -402,6 +315,75 @@ class PortfolioAggregator:
         df_marketcap.to_csv(filename, index=False, encoding='utf-8')
         print(f"✓ Salvato: {filename}")
 
+    @staticmethod
+    def _holdings_frame(etf_data: Dict) -> pd.DataFrame:
+        """Holdings di un ETF (lista items) con le colonne di holdings_schema."""
+        items = (etf_data.get('portfolio_breakdown') or {}).get('items') or []
+        return pd.DataFrame({
+            "name": [item.get('name') for item in items],
+            "isin": [item.get('isin') or None for item in items],
+            "sector": [item.get('stock_global_sector') for item in items],
+            "country": [item.get('country_name') for item in items],
+            "currency": [item.get('local_currency_code') for item in items],
+            "asset_class": [item.get('type') for item in items],
+            "weight": [item.get('weight') for item in items],
+        })
+
+    def add_to_index(self, index: HoldingsIndex) -> int:
+        """
+        Aggiunge le holdings degli ETF caricati all'indice invertito titolo -> fondi.
+
+        Args:
+            index: Indice delle holdings
+
+        Returns:
+            Numero di ETF aggiunti
+        """
+        for isin, etf_data in self.etf_data.items():
+            as_of = (etf_data.get('portfolio_breakdown') or {}).get('index_date_last_update')
+            index.add_fund(isin, self._holdings_frame(etf_data), as_of_date=as_of)
+        return len(self.etf_data)
+
+    def save_to_db(self, db: HoldingsDB) -> int:
+        """
+        Salva holdings ed esposizioni degli ETF caricati nel database normalizzato (sorgente 'extraetf').
+
+        Per ogni ETF la fotografia con la stessa data di aggiornamento viene sostituita.
+
+        Args:
+            db: Database delle holdings
+
+        Returns:
+            Numero di ETF salvati
+        """
+        for isin, etf_data in self.etf_data.items():
+            portfolio_breakdown = etf_data.get('portfolio_breakdown') or {}
+            holdings = self._holdings_frame(etf_data)
+
+            exposures = {"sector": defaultdict(float), "country": defaultdict(float), "currency": defaultdict(float)}
+            lists = {
+                "sector": ['global_stock_exposure_list', 'global_bond_exposure_list'],
+                "country": ['country_stocks_exposure_list', 'country_bond_exposure_list',
+                            'country_convertible_exposure_list'],
+                "currency": ['currency_allocations'],
+            }
+            for dimension, keys in lists.items():
+                for key in keys:
+                    for entry in portfolio_breakdown.get(key) or []:
+                        # Paesi e valute per codice ISO, come nell'aggregazione
+                        name = entry.get('name') if dimension == "sector" else entry.get('code') or entry.get('name')
+                        if name is not None:
+                            exposures[dimension][name] += entry.get('value') or 0.0
+
+            db.replace_snapshot(isin, ARCHIVE_SOURCE, holdings,
+                                as_of_date=portfolio_breakdown.get('index_date_last_update'),
+                                exposures={d: dict(v) for d, v in exposures.items() if v},
+                                fund={"name": etf_data.get('name'), "asset_class": etf_data.get('asset_class_name'),
+                                      "currency": etf_data.get('currency') or None,
+                                      "domicile": etf_data.get('fund_domicile_code')})
+        print(f"✓ Salvati {len(self.etf_data)} ETF in {db.db_path}")
+        return len(self.etf_data)
+
 
 def main():
     # print(get_continent_name("IT"))
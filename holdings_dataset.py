@@ -0,0 +1,208 @@
+"""
+Dataset colonnare unico delle holdings normalizzate (Parquet partizionato).
+
+Al posto di un CSV pulito e di tre JSON per ETF, le holdings di tutti i fondi
+vengono scritte in un solo dataset con lo schema di holdings_schema,
+partizionato per emittente e data di riferimento:
+
+    output/holdings/issuer=ishares/as_of_date=2025-08-20/IE00B4L5Y983.parquet
+
+Un file per fondo e partizione: riscrivere un fondo per la stessa data lo
+sostituisce senza duplicati. Le interrogazioni usano pyarrow.dataset: i filtri
+su emittente e data escludono intere cartelle, quelli sulle altre colonne
+sfruttano le statistiche dei row group, e vengono lette solo le colonne
+richieste.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from holdings_schema import HOLDINGS_COLUMNS, STRING_COLUMNS
+
+DEFAULT_DATASET_DIR = os.path.join("output", "holdings")
+
+PARTITION_COLUMNS = ["issuer", "as_of_date"]
+# Valore della partizione per i fondi senza data di riferimento (null in lettura)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+PARTITION_SCHEMA = pa.schema([("issuer", pa.string()), ("as_of_date", pa.date32())])
+FILE_SCHEMA = pa.schema([
+    (column, pa.float64() if column in ("weight", "market_value") else pa.string())
+    for column in HOLDINGS_COLUMNS if column not in PARTITION_COLUMNS
+])
+SCHEMA = pa.schema(list(FILE_SCHEMA) + list(PARTITION_SCHEMA))
+
+DateLike = Union[str, date, pd.Timestamp]
+
+
+def _partition_value(value) -> str:
+    if value is None or pd.isna(value):
+        return NULL_PARTITION
+    return pd.Timestamp(value).date().isoformat()
+
+
+class HoldingsDataset:
+    """Holdings normalizzate di tutti i fondi in un dataset Parquet partizionato."""
+
+    def __init__(self, root: str = DEFAULT_DATASET_DIR):
+        """
+        Args:
+            root: Cartella radice del dataset
+        """
+        self.root = root
+        self._partitioning = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+    def _fund_path(self, issuer: str, as_of: str, etf_isin: str) -> str:
+        return os.path.join(self.root, f"issuer={issuer}", f"as_of_date={as_of}", f"{etf_isin}.parquet")
+
+    def write(self, holdings: pd.DataFrame) -> List[str]:
+        """
+        Scrive le holdings normalizzate, un file per fondo e data (sostituisce quello esistente).
+
+        Args:
+            holdings: DataFrame con le colonne di HOLDINGS_COLUMNS (uno o più fondi)
+
+        Returns:
+            Percorsi dei file scritti
+        """
+        missing = [c for c in HOLDINGS_COLUMNS if c not in holdings.columns]
+        if missing:
+            raise ValueError(f"❌ Colonne mancanti nelle holdings: {missing}")
+
+        paths = []
+        keys = holdings["as_of_date"].map(_partition_value)
+        for (issuer, as_of, etf_isin), fund in holdings.groupby([holdings["issuer"], keys, holdings["etf_isin"]],
+                                                                sort=False, dropna=False):
+            table = pa.Table.from_pandas(fund[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False)
+            path = self._fund_path(issuer, as_of, etf_isin)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+            os.close(fd)
+            try:
+                pq.write_table(table, tmp_path, compression="zstd")
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            paths.append(path)
+        return paths
+
+    def dataset(self) -> Optional[ds.Dataset]:
+        """Dataset pyarrow (None se non è ancora stato scritto nulla)."""
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(self.root, format="parquet", schema=SCHEMA, partitioning=self._partitioning,
+                          exclude_invalid_files=False, ignore_prefixes=[".", "_"])
+
+    @staticmethod
+    def build_filter(issuers: Optional[Iterable[str]] = None, etf_isins: Optional[Iterable[str]] = None,
+                     isins: Optional[Iterable[str]] = None, start: Optional[DateLike] = None,
+                     end: Optional[DateLike] = None) -> Optional[ds.Expression]:
+        """Espressione di filtro: emittenti, ETF, titoli e intervallo di date (estremi inclusi)."""
+        conditions = []
+        for column, values in (("issuer", issuers), ("etf_isin", etf_isins), ("isin", isins)):
+            if values is not None:
+                conditions.append(ds.field(column).isin(list(values)))
+        if start is not None:
+            conditions.append(ds.field("as_of_date") >= pd.Timestamp(start).date())
+        if end is not None:
+            conditions.append(ds.field("as_of_date") <= pd.Timestamp(end).date())
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read(self, columns: Optional[Sequence[str]] = None, filter: Optional[ds.Expression] = None,
+             **criteria) -> pd.DataFrame:
+        """
+        Legge le holdings leggendo solo le colonne e le partizioni necessarie.
+
+        Args:
+            columns: Colonne da leggere (default: tutte, nell'ordine di HOLDINGS_COLUMNS)
+            filter: Espressione pyarrow.dataset aggiuntiva
+            **criteria: issuers, etf_isins, isins, start, end (vedi build_filter)
+
+        Returns:
+            DataFrame con le colonne richieste
+        """
+        columns = list(columns or HOLDINGS_COLUMNS)
+        dataset = self.dataset()
+        if dataset is None:
+            return pd.DataFrame({c: pd.Series(dtype=SCHEMA.field(c).type.to_pandas_dtype()) for c in columns})
+
+        expression = self.build_filter(**criteria)
+        if filter is not None:
+            expression = filter if expression is None else expression & filter
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        if "as_of_date" in df.columns:
+            df["as_of_date"] = pd.to_datetime(df["as_of_date"])
+        for column in STRING_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype("string")
+        return df
+
+    def funds(self) -> pd.DataFrame:
+        """Fondi presenti (issuer, etf_isin, as_of_date) dai soli nomi dei file, senza leggere i dati."""
+        dataset = self.dataset()
+        rows = []
+        for fragment in (dataset.get_fragments() if dataset is not None else []):
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            rows.append({"issuer": keys.get("issuer"), "etf_isin": os.path.basename(fragment.path)[:-len(".parquet")],
+                         "as_of_date": pd.Timestamp(keys["as_of_date"]) if keys.get("as_of_date") else pd.NaT})
+        return pd.DataFrame(rows, columns=["issuer", "etf_isin", "as_of_date"])
+
+    def latest_funds(self) -> pd.DataFrame:
+        """Ultima partizione di ciascun fondo: una data nota prevale sempre su quella mancante."""
+        funds = self.funds()
+        return funds.sort_values("as_of_date", na_position="first").groupby("etf_isin").tail(1)
+
+    def latest(self, columns: Optional[Sequence[str]] = None, **criteria) -> pd.DataFrame:
+        """Holdings dell'ultima data disponibile per ciascun fondo."""
+        latest = self.latest_funds()
+        if latest.empty:
+            return self.read(columns, **criteria)
+        frames = []
+        for as_of, group in latest.groupby(latest["as_of_date"].map(_partition_value)):
+            day = None if as_of == NULL_PARTITION else as_of
+            expression = ds.field("etf_isin").isin(group["etf_isin"].tolist())
+            expression &= (ds.field("as_of_date") == pd.Timestamp(day).date()) if day \
+                else ds.field("as_of_date").is_null()
+            frames.append(self.read(columns, filter=expression, **criteria))
+        return pd.concat(frames, ignore_index=True) if frames else self.read(columns, **criteria)
+
+    def exposures(self, by: str, **criteria) -> pd.DataFrame:
+        """
+        Esposizione per fondo (somma dei pesi) raggruppata per una colonna, es. 'sector' o 'country'.
+
+        Legge solo etf_isin, la colonna di raggruppamento e weight.
+
+        Returns:
+            DataFrame con indice etf_isin e una colonna per ogni valore di `by`
+        """
+        df = self.read(["etf_isin", by, "weight"], **criteria)
+        return df.pivot_table(index="etf_isin", columns=by, values="weight", aggfunc="sum", fill_value=0.0)
+
+    def stats(self) -> Dict:
+        """Numero di file, fondi, emittenti e dimensione su disco."""
+        funds = self.funds()
+        size = 0
+        for folder, _, files in os.walk(self.root):
+            size += sum(os.path.getsize(os.path.join(folder, f)) for f in files)
+        return {"files": len(funds), "funds": funds["etf_isin"].nunique(),
+                "issuers": sorted(funds["issuer"].dropna().unique()), "bytes": size}
+
+
+if __name__ == "__main__":
+    dataset = HoldingsDataset(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATASET_DIR)
+    stats = dataset.stats()
+    print(f"📦 {dataset.root}: {stats['funds']} fondi in {stats['files']} file "
+          f"({stats['bytes'] / 1024:.1f} KB), emittenti: {', '.join(stats['issuers']) or '-'}")
+    print(dataset.funds().sort_values(["issuer", "etf_isin"]).to_string(index=False))
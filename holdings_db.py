@@ -0,0 +1,369 @@
+"""
+Database SQLite normalizzato delle holdings (task 4 del README).
+
+Tabelle:
+    funds        - un record per ETF (ISIN, emittente, nome, asset class, valuta, domicilio)
+    securities   - un record per titolo sottostante (chiave: ISIN o, se assente, nome/ticker)
+    snapshots    - una fotografia del portafoglio di un fondo per sorgente e data di riferimento
+    holdings     - righe (snapshot, titolo, peso, controvalore)
+    sector_exposures / country_exposures / currency_exposures - esposizioni per snapshot
+
+Il caricamento usa executemany in un'unica transazione. replace_snapshot
+sostituisce la fotografia di un fondo (stessa sorgente e data) in modo
+atomico: i lettori vedono la versione precedente fino al commit.
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+# Dimensione -> tabella delle esposizioni
+EXPOSURE_TABLES: Dict[str, str] = {
+    "sector": "sector_exposures",
+    "country": "country_exposures",
+    "currency": "currency_exposures",
+}
+
+SECURITY_COLUMNS = ["isin", "ticker", "name", "sector", "country", "currency", "asset_class"]
+FUND_COLUMNS = ["issuer", "name", "asset_class", "currency", "domicile"]
+
+# Limite dei parametri per query IN (...)
+_CHUNK_SIZE = 500
+
+
+def security_key(isin, name, ticker=None) -> Optional[str]:
+    """Chiave univoca di un titolo: l'ISIN se presente, altrimenti nome e ticker."""
+    if isinstance(isin, str) and isin.strip() and isin.strip() != "-":
+        return isin.strip().upper()
+    if isinstance(name, str) and name.strip():
+        ticker = ticker.strip() if isinstance(ticker, str) else ""
+        return f"name:{name.strip().upper()}|{ticker.upper()}"
+    return None
+
+
+def _clean(value):
+    """Valore adatto a SQLite (NaN/NA -> NULL)."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value.item() if hasattr(value, "item") else value
+
+
+def _as_of(value) -> Optional[str]:
+    if value is None or pd.isna(value):
+        return None
+    return pd.Timestamp(value).date().isoformat()
+
+
+class HoldingsDB:
+    """Archivio normalizzato di fondi, titoli, fotografie del portafoglio ed esposizioni."""
+
+    def __init__(self, db_path: str = "holdings.db"):
+        """
+        Args:
+            db_path: Percorso del database SQLite
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS funds (
+                    fund_id INTEGER PRIMARY KEY,
+                    isin TEXT NOT NULL UNIQUE,
+                    issuer TEXT,
+                    name TEXT,
+                    asset_class TEXT,
+                    currency TEXT,
+                    domicile TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS securities (
+                    security_id INTEGER PRIMARY KEY,
+                    security_key TEXT NOT NULL UNIQUE,
+                    isin TEXT,
+                    ticker TEXT,
+                    name TEXT,
+                    sector TEXT,
+                    country TEXT,
+                    currency TEXT,
+                    asset_class TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_securities_isin ON securities(isin)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    snapshot_id INTEGER PRIMARY KEY,
+                    fund_id INTEGER NOT NULL REFERENCES funds(fund_id),
+                    source TEXT NOT NULL,
+                    as_of_date TEXT,
+                    loaded_at REAL NOT NULL,
+                    holdings_count INTEGER NOT NULL,
+                    weight_sum REAL
+                )
+            """)
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_snapshots_key
+                ON snapshots(fund_id, source, IFNULL(as_of_date, ''))
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS holdings (
+                    snapshot_id INTEGER NOT NULL REFERENCES snapshots(snapshot_id),
+                    security_id INTEGER NOT NULL REFERENCES securities(security_id),
+                    weight REAL,
+                    market_value REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_holdings_snapshot ON holdings(snapshot_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_holdings_security ON holdings(security_id, snapshot_id)")
+            for table in EXPOSURE_TABLES.values():
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        snapshot_id INTEGER NOT NULL REFERENCES snapshots(snapshot_id),
+                        name TEXT NOT NULL,
+                        weight REAL NOT NULL,
+                        PRIMARY KEY (snapshot_id, name)
+                    ) WITHOUT ROWID
+                """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # === SCRITTURA ===
+
+    @staticmethod
+    def _upsert_fund(conn: sqlite3.Connection, etf_isin: str, fund: Dict) -> int:
+        values = [_clean(fund.get(column)) for column in FUND_COLUMNS]
+        # I campi già noti non vengono cancellati da una sorgente che non li fornisce
+        conn.execute(f"""
+            INSERT INTO funds (isin, {", ".join(FUND_COLUMNS)}) VALUES (?, {", ".join("?" * len(FUND_COLUMNS))})
+            ON CONFLICT(isin) DO UPDATE SET
+            {", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in FUND_COLUMNS)}
+        """, [etf_isin] + values)
+        return conn.execute("SELECT fund_id FROM funds WHERE isin = ?", (etf_isin,)).fetchone()[0]
+
+    @staticmethod
+    def _upsert_securities(conn: sqlite3.Connection, rows: List[tuple]) -> Dict[str, int]:
+        """Inserisce o completa i titoli; ritorna security_key -> security_id."""
+        conn.executemany(f"""
+            INSERT INTO securities (security_key, {", ".join(SECURITY_COLUMNS)})
+            VALUES (?, {", ".join("?" * len(SECURITY_COLUMNS))})
+            ON CONFLICT(security_key) DO UPDATE SET
+            {", ".join(f"{c} = COALESCE({c}, excluded.{c})" for c in SECURITY_COLUMNS)}
+        """, rows)
+        keys = list(dict.fromkeys(row[0] for row in rows))
+        ids: Dict[str, int] = {}
+        for start in range(0, len(keys), _CHUNK_SIZE):
+            chunk = keys[start:start + _CHUNK_SIZE]
+            ids.update(conn.execute(
+                f"SELECT security_key, security_id FROM securities WHERE security_key IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall())
+        return ids
+
+    @staticmethod
+    def _delete_snapshots(conn: sqlite3.Connection, snapshot_ids: List[int]) -> None:
+        for snapshot_id in snapshot_ids:
+            conn.execute("DELETE FROM holdings WHERE snapshot_id = ?", (snapshot_id,))
+            for table in EXPOSURE_TABLES.values():
+                conn.execute(f"DELETE FROM {table} WHERE snapshot_id = ?", (snapshot_id,))
+            conn.execute("DELETE FROM snapshots WHERE snapshot_id = ?", (snapshot_id,))
+
+    @staticmethod
+    def derive_exposures(holdings: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+        """Esposizioni per settore, paese e valuta come somma dei pesi delle holdings."""
+        exposures = {}
+        for dimension in EXPOSURE_TABLES:
+            if dimension in holdings.columns and "weight" in holdings.columns:
+                grouped = holdings.dropna(subset=[dimension, "weight"]).groupby(dimension)["weight"].sum()
+                exposures[dimension] = {str(k): float(v) for k, v in grouped.items()}
+        return exposures
+
+    def replace_snapshot(self, etf_isin: str, source: str, holdings: pd.DataFrame,
+                         as_of_date=None, exposures: Optional[Dict[str, Dict[str, float]]] = None,
+                         fund: Optional[Dict] = None) -> int:
+        """
+        Carica la fotografia di un fondo sostituendo quella con stessa sorgente e data.
+
+        Args:
+            etf_isin: ISIN dell'ETF
+            source: Sorgente dei dati (es. 'ishares', 'xtrackers', 'extraetf')
+            holdings: Holdings con le colonne di holdings_schema (name, isin, ticker, sector,
+                country, currency, asset_class, weight, market_value; quelle assenti restano NULL)
+            as_of_date: Data di riferimento (None se non nota)
+            exposures: Dict dimensione ('sector', 'country', 'currency') -> {nome: peso};
+                le dimensioni mancanti vengono calcolate dalle holdings
+            fund: Anagrafica del fondo (issuer, name, asset_class, currency, domicile)
+
+        Returns:
+            ID della nuova fotografia
+        """
+        as_of = _as_of(as_of_date)
+        exposures = {**self.derive_exposures(holdings), **(exposures or {})}
+
+        frame = holdings.reindex(columns=SECURITY_COLUMNS + ["weight", "market_value"])
+        security_rows, holding_rows = [], []
+        for values in frame.itertuples(index=False, name=None):
+            record = dict(zip(frame.columns, values))
+            key = security_key(record["isin"], record["name"], record["ticker"])
+            if key is None:
+                continue
+            security_rows.append(tuple([key] + [_clean(record[c]) for c in SECURITY_COLUMNS]))
+            holding_rows.append((key, _clean(record["weight"]), _clean(record["market_value"])))
+        weight_sum = float(pd.to_numeric(frame["weight"], errors="coerce").sum())
+
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                fund_id = self._upsert_fund(conn, etf_isin, fund or {})
+                security_ids = self._upsert_securities(conn, security_rows) if security_rows else {}
+
+                old = [row[0] for row in conn.execute(
+                    "SELECT snapshot_id FROM snapshots WHERE fund_id = ? AND source = ? AND as_of_date IS ?",
+                    (fund_id, source, as_of))]
+                self._delete_snapshots(conn, old)
+
+                cursor = conn.execute("""
+                    INSERT INTO snapshots (fund_id, source, as_of_date, loaded_at, holdings_count, weight_sum)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (fund_id, source, as_of, time.time(), len(holding_rows), weight_sum))
+                snapshot_id = cursor.lastrowid
+
+                conn.executemany("INSERT INTO holdings (snapshot_id, security_id, weight, market_value) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 [(snapshot_id, security_ids[key], weight, value)
+                                  for key, weight, value in holding_rows])
+                for dimension, values in exposures.items():
+                    conn.executemany(f"INSERT INTO {EXPOSURE_TABLES[dimension]} (snapshot_id, name, weight) "
+                                     f"VALUES (?, ?, ?)",
+                                     [(snapshot_id, name, float(weight)) for name, weight in values.items()
+                                      if name is not None and _clean(weight) is not None])
+        return snapshot_id
+
+    def replace_normalized(self, holdings: pd.DataFrame, source: Optional[str] = None,
+                           fund: Optional[Dict] = None) -> List[int]:
+        """
+        Carica holdings normalizzate (holdings_schema), una fotografia per fondo.
+
+        La sorgente predefinita è l'emittente indicato nelle holdings.
+        """
+        snapshot_ids = []
+        for etf_isin, group in holdings.groupby("etf_isin", sort=False):
+            issuer = group["issuer"].dropna().iloc[0] if group["issuer"].notna().any() else None
+            as_of = group["as_of_date"].dropna().iloc[0] if group["as_of_date"].notna().any() else None
+            snapshot_ids.append(self.replace_snapshot(str(etf_isin), source or issuer, group, as_of_date=as_of,
+                                                      fund={"issuer": issuer, **(fund or {})}))
+        return snapshot_ids
+
+    # === LETTURA ===
+
+    def _read(self, query: str, params: Iterable = ()) -> pd.DataFrame:
+        with self._lock:
+            with self._get_connection() as conn:
+                return pd.read_sql_query(query, conn, params=list(params))
+
+    def _latest_snapshot_id(self, etf_isin: str, source: Optional[str] = None,
+                            as_of_date=None) -> Optional[int]:
+        query = """
+            SELECT s.snapshot_id FROM snapshots s JOIN funds f ON f.fund_id = s.fund_id
+            WHERE f.isin = ?
+        """
+        params: List = [etf_isin]
+        if source is not None:
+            query += " AND s.source = ?"
+            params.append(source)
+        if as_of_date is not None:
+            query += " AND s.as_of_date = ?"
+            params.append(_as_of(as_of_date))
+        query += " ORDER BY IFNULL(s.as_of_date, '') DESC, s.loaded_at DESC LIMIT 1"
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def fund_holdings(self, etf_isin: str, source: Optional[str] = None, as_of_date=None) -> pd.DataFrame:
+        """Holdings dell'ultima fotografia di un fondo (o di quella della data indicata)."""
+        snapshot_id = self._latest_snapshot_id(etf_isin, source, as_of_date)
+        return self._read(f"""
+            SELECT {", ".join(f"sec.{c}" for c in SECURITY_COLUMNS)}, h.weight, h.market_value
+            FROM holdings h JOIN securities sec ON sec.security_id = h.security_id
+            WHERE h.snapshot_id = ?
+            ORDER BY h.weight DESC
+        """, [snapshot_id if snapshot_id is not None else -1])
+
+    def fund_exposures(self, etf_isin: str, dimension: str, source: Optional[str] = None,
+                       as_of_date=None) -> pd.Series:
+        """Esposizione ('sector', 'country' o 'currency') dell'ultima fotografia di un fondo."""
+        if dimension not in EXPOSURE_TABLES:
+            raise ValueError(f"Dimensione non valida: {dimension} (ammesse: {sorted(EXPOSURE_TABLES)})")
+        snapshot_id = self._latest_snapshot_id(etf_isin, source, as_of_date)
+        df = self._read(f"SELECT name, weight FROM {EXPOSURE_TABLES[dimension]} WHERE snapshot_id = ? "
+                        f"ORDER BY weight DESC", [snapshot_id if snapshot_id is not None else -1])
+        return df.set_index("name")["weight"]
+
+    def security_funds(self, isin: str) -> pd.DataFrame:
+        """Fondi che detengono un titolo, dall'ultima fotografia di ogni fondo e sorgente."""
+        return self._read("""
+            SELECT f.isin AS etf_isin, s.source, s.as_of_date, h.weight, h.market_value
+            FROM securities sec
+            JOIN holdings h ON h.security_id = sec.security_id
+            JOIN snapshots s ON s.snapshot_id = h.snapshot_id
+            JOIN funds f ON f.fund_id = s.fund_id
+            WHERE sec.isin = ?
+              AND s.snapshot_id = (
+                  SELECT s2.snapshot_id FROM snapshots s2
+                  WHERE s2.fund_id = s.fund_id AND s2.source = s.source
+                  ORDER BY IFNULL(s2.as_of_date, '') DESC, s2.loaded_at DESC LIMIT 1)
+            ORDER BY h.weight DESC
+        """, [isin.strip().upper()])
+
+    def snapshots(self, etf_isin: Optional[str] = None) -> pd.DataFrame:
+        """Elenco delle fotografie (di tutti i fondi o di uno)."""
+        query = """
+            SELECT s.snapshot_id, f.isin AS etf_isin, f.issuer, s.source, s.as_of_date, s.loaded_at,
+                   s.holdings_count, s.weight_sum
+            FROM snapshots s JOIN funds f ON f.fund_id = s.fund_id
+        """
+        params = []
+        if etf_isin is not None:
+            query += " WHERE f.isin = ?"
+            params.append(etf_isin)
+        return self._read(query + " ORDER BY f.isin, s.source, s.as_of_date", params)
+
+    def stats(self) -> Dict[str, int]:
+        """Numero di record per tabella."""
+        tables = ["funds", "securities", "snapshots", "holdings"] + list(EXPOSURE_TABLES.values())
+        with self._lock:
+            with self._get_connection() as conn:
+                return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+
+if __name__ == "__main__":
+    db = HoldingsDB(sys.argv[1] if len(sys.argv) > 1 else "holdings.db")
+    print(f"🗄️ {db.db_path}: {db.stats()}")
+    print(db.snapshots().to_string(index=False))
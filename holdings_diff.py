@@ -0,0 +1,241 @@
+"""
+Variazioni delle holdings di un fondo tra due date di pubblicazione.
+
+Le due fotografie vengono ridotte a coppie (ID titolo, peso) ordinate per ID
+dell'anagrafica titoli (security_master.py), così lo stesso titolo si
+riconosce anche se un emittente cambia nome o ticker. Le fotografie sono
+pubblicate in ordine di peso, quindi questo ordinamento costa O(n log n) per
+fotografia. Il confronto è poi un merge delle due sequenze ordinate:
+l'ordinamento stabile di numpy (timsort) riconosce le due sequenze già
+ordinate e le fonde in tempo lineare, e ogni ID compare una volta (aggiunto o
+rimosso) o due (presente in entrambe le date).
+
+Il risultato per fondo contiene i titoli aggiunti, quelli rimossi e quelli il
+cui peso è cambiato oltre una soglia. Su tutto il dataset i fondi vengono
+confrontati a gruppi (stessa coppia di date, una sola lettura) e le differenze
+restituite in streaming, un fondo alla volta.
+"""
+
+import os
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from security_master import UNRESOLVED, SecurityMaster
+
+DEFAULT_CHANGES_PATH = os.path.join("output", "holdings_changes.csv")
+
+# Variazione minima di peso (punti percentuali) per riportare un titolo come ribilanciato
+DEFAULT_WEIGHT_THRESHOLD = 0.1
+
+ADDED = "added"
+REMOVED = "removed"
+REWEIGHTED = "reweighted"
+
+DIFF_COLUMNS = ["etf_isin", "as_of_old", "as_of_new", "security_id", "isin", "name", "change",
+                "weight_old", "weight_new", "delta"]
+
+# Colonne lette dal dataset: identificativi per l'anagrafica e peso
+SNAPSHOT_COLUMNS = ["etf_isin", "as_of_date", "isin", "ticker", "name", "weight"]
+
+
+def sorted_snapshot(ids: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ID univoci ordinati, peso totale per ID e riga della prima occorrenza.
+
+    Le righe senza ID o senza peso vengono scartate; più righe dello stesso titolo si sommano.
+    Le fotografie arrivano in ordine di peso, non di ID: l'ordinamento costa O(n log n).
+    """
+    rows = np.flatnonzero((ids != UNRESOLVED) & ~np.isnan(weights))
+    # Stabile: a parità di ID resta la prima riga della fotografia
+    rows = rows[np.argsort(ids[rows], kind="stable")]
+    sorted_ids = ids[rows]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if len(rows) else rows
+    return sorted_ids[starts], np.add.reduceat(weights[rows], starts) if len(rows) else weights[:0], rows[starts]
+
+
+def merge_sorted(old_ids: np.ndarray, new_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fonde due sequenze di ID ordinate e senza ripetizioni.
+
+    Returns:
+        (ID di entrambe in ordine, posizione in old_ids, posizione in new_ids), -1 dove l'ID manca
+    """
+    ids = np.concatenate([old_ids, new_ids])
+    # Due sequenze ordinate concatenate: timsort le riconosce e le fonde in tempo lineare
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    first = np.r_[True, ids[1:] != ids[:-1]] if len(ids) else np.zeros(0, dtype=bool)
+    group = np.cumsum(first) - 1
+
+    merged_ids = ids[first]
+    old_pos = np.full(len(merged_ids), -1, dtype=np.int64)
+    new_pos = np.full(len(merged_ids), -1, dtype=np.int64)
+    from_old = order < len(old_ids)
+    old_pos[group[from_old]] = order[from_old]
+    new_pos[group[~from_old]] = order[~from_old] - len(old_ids)
+    return merged_ids, old_pos, new_pos
+
+
+def diff_arrays(old_ids: np.ndarray, old_weights: np.ndarray, new_ids: np.ndarray, new_weights: np.ndarray,
+                threshold: float = DEFAULT_WEIGHT_THRESHOLD) -> pd.DataFrame:
+    """
+    Variazioni tra due fotografie già risolte in ID (una riga per holding, anche ripetute).
+
+    Returns:
+        DataFrame con security_id, change, weight_old, weight_new, delta, old_row e new_row
+        (riga della fotografia da cui prendere i dati descrittivi, -1 se assente), in ordine di ID
+    """
+    old_ids, old_totals, old_rows = sorted_snapshot(np.asarray(old_ids), np.asarray(old_weights, dtype=np.float64))
+    new_ids, new_totals, new_rows = sorted_snapshot(np.asarray(new_ids), np.asarray(new_weights, dtype=np.float64))
+    ids, old_pos, new_pos = merge_sorted(old_ids, new_ids)
+
+    added, removed = old_pos < 0, new_pos < 0
+    # Con indice -1 si legge l'ultimo elemento (o quello aggiunto in coda), poi sostituito
+    weight_old = np.where(added, np.nan, np.r_[old_totals, np.nan][old_pos])
+    weight_new = np.where(removed, np.nan, np.r_[new_totals, np.nan][new_pos])
+    delta = np.nan_to_num(weight_new) - np.nan_to_num(weight_old)
+    keep = added | removed | (np.abs(delta) > threshold)
+
+    return pd.DataFrame({
+        "security_id": ids[keep],
+        "change": np.select([added[keep], removed[keep]], [ADDED, REMOVED], REWEIGHTED),
+        "weight_old": weight_old[keep],
+        "weight_new": weight_new[keep],
+        "delta": delta[keep],
+        "old_row": np.r_[old_rows, -1][old_pos[keep]],
+        "new_row": np.r_[new_rows, -1][new_pos[keep]],
+    })
+
+
+def diff_snapshots(old: pd.DataFrame, new: pd.DataFrame, security_master: Optional[SecurityMaster] = None,
+                   threshold: float = DEFAULT_WEIGHT_THRESHOLD) -> pd.DataFrame:
+    """
+    Titoli aggiunti, rimossi e ribilanciati tra due fotografie dello stesso fondo.
+
+    Args:
+        old: Holdings normalizzate (holdings_schema) della data precedente
+        new: Holdings normalizzate della data successiva
+        security_master: Anagrafica per gli ID dei titoli (default: una nuova in memoria)
+        threshold: Variazione minima di peso (punti percentuali) per i titoli presenti in entrambe
+
+    Returns:
+        DataFrame con le colonne di DIFF_COLUMNS, in ordine di ID del titolo
+    """
+    master = security_master or SecurityMaster()
+    old, new = old.reset_index(drop=True), new.reset_index(drop=True)
+    both = pd.concat([old, new], ignore_index=True)
+    # Una fotografia per chiamata: ticker e nome condivisi si valutano all'interno di ciascuna
+    ids = np.concatenate([master.resolve_frame(old), master.resolve_frame(new)])
+    weights = pd.to_numeric(both["weight"], errors="coerce").to_numpy(dtype=np.float64)
+    changes = diff_arrays(ids[:len(old)], weights[:len(old)], ids[len(old):], weights[len(old):], threshold)
+    return _describe(changes, old, new)
+
+
+def _describe(changes: pd.DataFrame, old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Aggiunge fondo, date, ISIN e nome (dalla nuova fotografia, o dalla vecchia per i titoli rimossi)."""
+    from_new = changes["new_row"].to_numpy() >= 0
+    rows_new = np.where(from_new, changes["new_row"], 0)
+    rows_old = np.where(from_new, 0, changes["old_row"])
+    out = changes.drop(columns=["old_row", "new_row"])
+    for column in ("isin", "name"):
+        values_new = new[column].astype("string").to_numpy()[rows_new] if len(new) else None
+        values_old = old[column].astype("string").to_numpy()[rows_old] if len(old) else None
+        out[column] = pd.array(np.where(from_new, values_new, values_old) if len(out) else [], dtype="string")
+    out["etf_isin"] = (new if len(new) else old)["etf_isin"].iloc[0] if len(old) or len(new) else None
+    out["as_of_old"] = pd.to_datetime(old["as_of_date"]).iloc[0] if len(old) else pd.NaT
+    out["as_of_new"] = pd.to_datetime(new["as_of_date"]).iloc[0] if len(new) else pd.NaT
+    return out[DIFF_COLUMNS]
+
+
+def snapshot_pairs(dataset, consecutive: bool = False, etf_isins: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Coppie di date da confrontare per ogni fondo del dataset (holdings_dataset.HoldingsDataset).
+
+    Args:
+        dataset: Dataset delle holdings
+        consecutive: Tutte le coppie di date consecutive (default: solo le ultime due)
+        etf_isins: Limita ai fondi indicati
+
+    Returns:
+        DataFrame con etf_isin, as_of_old e as_of_new
+    """
+    funds = dataset.funds().dropna(subset=["as_of_date"]).drop_duplicates(["etf_isin", "as_of_date"])
+    if etf_isins is not None:
+        funds = funds[funds["etf_isin"].isin(etf_isins)]
+    funds = funds.sort_values(["etf_isin", "as_of_date"])
+    funds["as_of_old"] = funds.groupby("etf_isin")["as_of_date"].shift()
+    pairs = funds.dropna(subset=["as_of_old"]).rename(columns={"as_of_date": "as_of_new"})
+    if not consecutive:
+        pairs = pairs.groupby("etf_isin").tail(1)
+    return pairs[["etf_isin", "as_of_old", "as_of_new"]].reset_index(drop=True)
+
+
+def iter_dataset_diffs(dataset, security_master: Optional[SecurityMaster] = None,
+                       threshold: float = DEFAULT_WEIGHT_THRESHOLD, consecutive: bool = False,
+                       etf_isins: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Variazioni di tutti i fondi del dataset, un fondo (e una coppia di date) alla volta.
+
+    I fondi con la stessa coppia di date vengono letti insieme e risolti in ID con una sola
+    chiamata all'anagrafica; in memoria resta un gruppo di fotografie alla volta.
+
+    Yields:
+        DataFrame con le colonne di DIFF_COLUMNS per ciascun fondo
+    """
+    master = security_master or SecurityMaster()
+    pairs = snapshot_pairs(dataset, consecutive, etf_isins)
+    for (as_of_old, as_of_new), group in pairs.groupby(["as_of_old", "as_of_new"], sort=True):
+        expression = ds.field("as_of_date").isin([as_of_old.date(), as_of_new.date()])
+        holdings = dataset.read(SNAPSHOT_COLUMNS, filter=expression, etf_isins=group["etf_isin"].tolist())
+        holdings = holdings.sort_values(["etf_isin", "as_of_date"], kind="stable", ignore_index=True)
+        ids = master.resolve_frame(holdings)
+        weights = pd.to_numeric(holdings["weight"], errors="coerce").to_numpy(dtype=np.float64)
+
+        # Righe contigue per (fondo, data): confini con un solo passaggio
+        is_new = (holdings["as_of_date"] == as_of_new).to_numpy()
+        for etf_isin, rows in holdings.groupby("etf_isin", sort=False).indices.items():
+            old_rows, new_rows = rows[~is_new[rows]], rows[is_new[rows]]
+            changes = diff_arrays(ids[old_rows], weights[old_rows], ids[new_rows], weights[new_rows], threshold)
+            yield _describe(changes, holdings.iloc[old_rows], holdings.iloc[new_rows])
+
+
+def write_changes(diffs: Iterator[pd.DataFrame], path: str = DEFAULT_CHANGES_PATH) -> int:
+    """
+    Scrive le variazioni in un CSV man mano che arrivano.
+
+    Returns:
+        Numero di righe scritte
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rows = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        pd.DataFrame(columns=DIFF_COLUMNS).to_csv(f, index=False)
+        for changes in diffs:
+            changes.to_csv(f, index=False, header=False)
+            rows += len(changes)
+    return rows
+
+
+if __name__ == "__main__":
+    from holdings_dataset import DEFAULT_DATASET_DIR, HoldingsDataset
+    from security_master import DEFAULT_DB_PATH
+
+    weight_threshold = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WEIGHT_THRESHOLD
+    master = SecurityMaster(DEFAULT_DB_PATH) if os.path.exists(DEFAULT_DB_PATH) else SecurityMaster()
+
+    def report(diffs: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for changes in diffs:
+            if len(changes):
+                counts = changes["change"].value_counts()
+                print(f"🔄 {changes['etf_isin'].iloc[0]} ({changes['as_of_old'].iloc[0]:%Y-%m-%d} -> "
+                      f"{changes['as_of_new'].iloc[0]:%Y-%m-%d}): ➕ {counts.get(ADDED, 0)} "
+                      f"➖ {counts.get(REMOVED, 0)} ⚖️ {counts.get(REWEIGHTED, 0)}")
+            yield changes
+
+    written = write_changes(report(iter_dataset_diffs(HoldingsDataset(DEFAULT_DATASET_DIR), master,
+                                                      weight_threshold)))
+    print(f"✅ {written} variazioni salvate in {DEFAULT_CHANGES_PATH}")
@@ -0,0 +1,331 @@
+"""
+Storico delle holdings con codifica delta: fotografie complete periodiche e variazioni.
+
+Una copia completa delle holdings per fondo e per giorno cresce in fretta (un
+ETF obbligazionario da 4.000 titoli supera il milione di righe l'anno), ma
+da un giorno all'altro cambiano pochi titoli. Per ogni fondo lo storico
+conserva:
+
+- fotografie complete (keyframe) ogni KEYFRAME_INTERVAL date, o quando le
+  variazioni sarebbero più grandi di KEYFRAME_RATIO della fotografia;
+- per le altre date solo le variazioni rispetto alla data precedente: ID dei
+  titoli aggiunti o con peso cambiato e nuovo peso (NaN = titolo rimosso).
+
+Ogni record è una coppia di array ordinati per ID dell'anagrafica titoli
+(security_master.py), salvati come blob. La fotografia di una data si
+ricostruisce dall'ultimo keyframe applicando al più KEYFRAME_INTERVAL - 1
+variazioni, ciascuna con un merge lineare (holdings_diff.merge_sorted); la
+serie storica di un titolo è una ricerca binaria per record.
+
+Gli ID si riferiscono all'anagrafica usata per scrivere lo storico, che va
+salvata insieme ad esso.
+"""
+
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from holdings_diff import merge_sorted, sorted_snapshot
+from security_master import SecurityMaster
+
+DEFAULT_DB_PATH = "holdings_history.db"
+
+# Al più KEYFRAME_INTERVAL - 1 variazioni da applicare per ricostruire una data
+KEYFRAME_INTERVAL = 30
+
+# Variazioni più grandi di questa quota della fotografia: conviene un keyframe
+KEYFRAME_RATIO = 0.5
+
+KEYFRAME = "key"
+DELTA = "delta"
+
+ID_DTYPE = np.dtype("<i4")
+WEIGHT_DTYPE = np.dtype("<f8")
+
+DateLike = Union[str, date, pd.Timestamp]
+State = Tuple[np.ndarray, np.ndarray]
+
+
+def _day(value: DateLike) -> str:
+    return pd.Timestamp(value).date().isoformat()
+
+
+def _decode(ids: bytes, weights: bytes) -> State:
+    return np.frombuffer(ids, dtype=ID_DTYPE).astype(np.int64), np.frombuffer(weights, dtype=WEIGHT_DTYPE)
+
+
+def apply_delta(state: State, delta: State) -> State:
+    """Applica a una fotografia (ID ordinati, pesi) le variazioni (ID ordinati, nuovi pesi; NaN = rimosso)."""
+    ids, weights = state
+    delta_ids, delta_weights = delta
+    merged, pos, delta_pos = merge_sorted(ids, delta_ids)
+    values = np.where(delta_pos >= 0, np.r_[delta_weights, np.nan][delta_pos], np.r_[weights, np.nan][pos])
+    held = ~np.isnan(values)
+    return merged[held], values[held]
+
+
+def encode_delta(previous: State, current: State, tolerance: float = 0.0) -> State:
+    """
+    Variazioni da `previous` a `current`: titoli aggiunti, rimossi (NaN) e con peso cambiato oltre la tolleranza.
+    """
+    merged, old_pos, new_pos = merge_sorted(previous[0], current[0])
+    old = np.r_[previous[1], np.nan][old_pos]
+    new = np.r_[current[1], np.nan][new_pos]
+    changed = (old_pos < 0) | (new_pos < 0) | (np.abs(new - old) > tolerance)
+    return merged[changed], np.where(new_pos[changed] < 0, np.nan, new[changed])
+
+
+class HoldingsHistory:
+    """Storico delle holdings per fondo: keyframe periodici e variazioni tra date successive."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, security_master: Optional[SecurityMaster] = None,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, tolerance: float = 0.0):
+        """
+        Args:
+            db_path: Database SQLite dello storico
+            security_master: Anagrafica per gli ID dei titoli (default: una nuova in memoria)
+            keyframe_interval: Date tra due fotografie complete
+            tolerance: Variazione di peso (punti percentuali) sotto cui il peso non viene aggiornato;
+                0 = storico esatto. Il confronto è con il peso ricostruito, quindi l'errore resta entro
+                la tolleranza senza accumularsi
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.security_master = security_master or SecurityMaster()
+        self.keyframe_interval = keyframe_interval
+        self.tolerance = tolerance
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history_snapshots (
+                    etf_isin TEXT NOT NULL,
+                    as_of_date TEXT NOT NULL,
+                    kind TEXT NOT NULL CHECK (kind IN ('key', 'delta')),
+                    holdings_count INTEGER NOT NULL,
+                    entries INTEGER NOT NULL,
+                    security_ids BLOB NOT NULL,
+                    weights BLOB NOT NULL,
+                    PRIMARY KEY (etf_isin, as_of_date)
+                ) WITHOUT ROWID
+            """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # === SCRITTURA ===
+
+    def _chain(self, conn, etf_isin: str, end: Optional[str] = None,
+               start: Optional[str] = None) -> List[Tuple[str, str, bytes, bytes]]:
+        """
+        Record da leggere fino a `end` (incluso), a partire dall'ultimo keyframe non successivo a
+        `start` (o a `end`; senza date, l'ultimo keyframe). Con `start` precedente a ogni keyframe
+        si parte dal primo record del fondo, che è sempre un keyframe.
+        """
+        anchor = start if start is not None else end
+        query = "SELECT MAX(as_of_date) FROM history_snapshots WHERE etf_isin = ? AND kind = 'key'"
+        key_date = conn.execute(query + (" AND as_of_date <= ?" if anchor is not None else ""),
+                                (etf_isin, anchor) if anchor is not None else (etf_isin,)).fetchone()[0]
+        if key_date is None and start is not None:
+            key_date = conn.execute("SELECT MIN(as_of_date) FROM history_snapshots WHERE etf_isin = ?",
+                                    (etf_isin,)).fetchone()[0]
+        if key_date is None:
+            return []
+        return conn.execute(
+            "SELECT as_of_date, kind, security_ids, weights FROM history_snapshots "
+            "WHERE etf_isin = ? AND as_of_date >= ?" + (" AND as_of_date <= ?" if end is not None else "")
+            + " ORDER BY as_of_date", (etf_isin, key_date, end) if end is not None else (etf_isin, key_date)).fetchall()
+
+    @staticmethod
+    def _replay(chain) -> List[Tuple[str, State]]:
+        """Fotografie ricostruite di tutte le date della catena."""
+        states, state = [], None
+        for as_of, kind, ids, weights in chain:
+            record = _decode(ids, weights)
+            state = record if kind == KEYFRAME else apply_delta(state, record)
+            states.append((as_of, state))
+        return states
+
+    def _encode(self, conn, etf_isin: str, states: List[Tuple[str, State]],
+                previous: Optional[State], deltas_since_key: int) -> None:
+        rows = []
+        for as_of, state in states:
+            kind, record = KEYFRAME, state
+            if previous is not None and deltas_since_key + 1 < self.keyframe_interval:
+                delta = encode_delta(previous, state, self.tolerance)
+                if len(delta[0]) <= KEYFRAME_RATIO * len(state[0]):
+                    kind, record = DELTA, delta
+                    # Con tolleranza la fotografia memorizzata è quella ricostruita, non quella ricevuta
+                    state = apply_delta(previous, delta)
+            deltas_since_key = deltas_since_key + 1 if kind == DELTA else 0
+            rows.append((etf_isin, as_of, kind, len(state[0]), len(record[0]),
+                         record[0].astype(ID_DTYPE).tobytes(), record[1].astype(WEIGHT_DTYPE).tobytes()))
+            previous = state
+        conn.executemany("INSERT OR REPLACE INTO history_snapshots (etf_isin, as_of_date, kind, holdings_count, "
+                         "entries, security_ids, weights) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def add_state(self, etf_isin: str, as_of_date: DateLike, security_ids: np.ndarray, weights: np.ndarray) -> str:
+        """
+        Aggiunge (o sostituisce) la fotografia di un fondo già risolta in ID.
+
+        Una data precedente all'ultima viene inserita ricodificando le date successive.
+
+        Returns:
+            Tipo di record scritto per la data ('key' o 'delta')
+        """
+        as_of = _day(as_of_date)
+        ids, totals, _ = sorted_snapshot(np.asarray(security_ids, dtype=np.int64), np.asarray(weights, dtype=np.float64))
+        with self._lock, self._get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            last = conn.execute("SELECT MAX(as_of_date) FROM history_snapshots WHERE etf_isin = ?",
+                                (etf_isin,)).fetchone()[0]
+            if last is None or as_of > last:
+                # Caso normale: nuova data in coda
+                chain = self._chain(conn, etf_isin)
+                previous = self._replay(chain)[-1][1] if chain else None
+                self._encode(conn, etf_isin, [(as_of, (ids, totals))], previous,
+                             sum(1 for row in chain if row[1] == DELTA))
+            else:
+                # Data già presente o intermedia: si ricostruiscono e ricodificano le date dal keyframe precedente
+                states = dict(self._replay(self._chain(conn, etf_isin, start=as_of)))
+                states[as_of] = (ids, totals)
+                conn.execute("DELETE FROM history_snapshots WHERE etf_isin = ? AND as_of_date >= ?",
+                             (etf_isin, min(states)))
+                self._encode(conn, etf_isin, sorted(states.items()), None, 0)
+            return conn.execute("SELECT kind FROM history_snapshots WHERE etf_isin = ? AND as_of_date = ?",
+                                (etf_isin, as_of)).fetchone()[0]
+
+    def add_holdings(self, holdings: pd.DataFrame) -> int:
+        """
+        Aggiunge le holdings normalizzate (holdings_schema) di uno o più fondi e date.
+
+        Le righe senza data di riferimento vengono ignorate (con un avviso per fondo).
+
+        Returns:
+            Numero di fotografie aggiunte
+        """
+        undated = holdings["as_of_date"].isna()
+        if undated.any():
+            skipped = sorted(holdings.loc[undated, "etf_isin"].astype(str).unique())
+            print(f"⚠️ Storico: holdings senza data di riferimento ignorate per {skipped}")
+        holdings = holdings[~undated].reset_index(drop=True)
+        if holdings.empty:
+            return 0
+        ids = self.security_master.resolve_frame(holdings)
+        weights = pd.to_numeric(holdings["weight"], errors="coerce").to_numpy(dtype=np.float64)
+        count = 0
+        for (etf_isin, as_of), rows in holdings.groupby(["etf_isin", "as_of_date"], sort=True).indices.items():
+            self.add_state(str(etf_isin), as_of, ids[rows], weights[rows])
+            count += 1
+        return count
+
+    # === LETTURA ===
+
+    def dates(self, etf_isin: str) -> List[str]:
+        with self._get_connection() as conn:
+            return [row[0] for row in conn.execute("SELECT as_of_date FROM history_snapshots WHERE etf_isin = ? "
+                                                   "ORDER BY as_of_date", (etf_isin,))]
+
+    def state(self, etf_isin: str, as_of_date: Optional[DateLike] = None) -> Optional[Tuple[str, State]]:
+        """Data e fotografia (ID, pesi) in vigore a `as_of_date` (default: l'ultima); None se non presente."""
+        with self._get_connection() as conn:
+            chain = self._chain(conn, etf_isin, end=_day(as_of_date) if as_of_date is not None else None)
+        return self._replay(chain)[-1] if chain else None
+
+    def snapshot(self, etf_isin: str, as_of_date: Optional[DateLike] = None) -> pd.DataFrame:
+        """
+        Holdings ricostruite alla data indicata (l'ultima pubblicata non successiva).
+
+        Returns:
+            DataFrame con as_of_date, security_id, isin, name e weight
+        """
+        found = self.state(etf_isin, as_of_date)
+        if found is None:
+            return pd.DataFrame(columns=["as_of_date", "security_id", "isin", "name", "weight"])
+        as_of, (ids, weights) = found
+        records = [self.security_master.info(int(i)) for i in ids]
+        return pd.DataFrame({"as_of_date": pd.Timestamp(as_of), "security_id": ids,
+                             "isin": [r["isin"] for r in records], "name": [r["name"] for r in records],
+                             "weight": weights})
+
+    def series(self, etf_isin: str, security: Union[int, str], start: Optional[DateLike] = None,
+               end: Optional[DateLike] = None) -> pd.Series:
+        """
+        Peso di un titolo nel fondo per ogni data pubblicata nell'intervallo.
+
+        Args:
+            etf_isin: ISIN dell'ETF
+            security: ID dell'anagrafica, ISIN, ticker o nome del titolo
+            start: Prima data (inclusa)
+            end: Ultima data (inclusa)
+
+        Returns:
+            Serie indicizzata per data (NaN nelle date in cui il titolo non era detenuto)
+        """
+        security_id = security if isinstance(security, (int, np.integer)) else next(
+            (i for kind in ("isin", "ticker", "name")
+             if (i := self.security_master.lookup(kind, security)) is not None), None)
+        # Senza data iniziale si parte dal primo record del fondo
+        start_day = _day(start) if start is not None else ""
+        with self._get_connection() as conn:
+            chain = self._chain(conn, etf_isin, end=_day(end) if end is not None else None, start=start_day)
+
+        values: Dict[str, float] = {}
+        weight = np.nan
+        for as_of, kind, ids, weights in chain:
+            record_ids, record_weights = _decode(ids, weights)
+            pos = np.searchsorted(record_ids, security_id) if security_id is not None else len(record_ids)
+            if pos < len(record_ids) and record_ids[pos] == security_id:
+                weight = record_weights[pos]
+            elif kind == KEYFRAME:
+                weight = np.nan
+            if as_of >= start_day:
+                values[as_of] = weight
+        series = pd.Series(values, dtype=np.float64, name=security)
+        series.index = pd.to_datetime(series.index)
+        return series.rename_axis("as_of_date")
+
+    def stats(self) -> Dict:
+        """Fondi, date, keyframe, variazioni e righe memorizzate rispetto alle fotografie complete."""
+        with self._get_connection() as conn:
+            row = conn.execute("""
+                SELECT COUNT(DISTINCT etf_isin), COUNT(*), SUM(kind = 'key'), SUM(kind = 'delta'),
+                       COALESCE(SUM(entries), 0), COALESCE(SUM(holdings_count), 0)
+                FROM history_snapshots
+            """).fetchone()
+        return {"funds": row[0], "snapshots": row[1], "keyframes": row[2] or 0, "deltas": row[3] or 0,
+                "stored_rows": row[4], "full_rows": row[5]}
+
+
+if __name__ == "__main__":
+    from security_master import DEFAULT_DB_PATH as SECURITY_MASTER_DB
+
+    history = HoldingsHistory(security_master=SecurityMaster(SECURITY_MASTER_DB))
+    if len(sys.argv) < 2:
+        print(f"📚 Storico: {history.stats()}")
+    elif len(sys.argv) == 2:
+        print(f"📅 Date: {', '.join(history.dates(sys.argv[1]))}")
+        print(history.snapshot(sys.argv[1]).sort_values("weight", ascending=False).head(20).to_string(index=False))
+    else:
+        print(history.series(sys.argv[1], sys.argv[2], *sys.argv[3:5]).to_string())
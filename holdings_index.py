@@ -0,0 +1,310 @@
+"""
+Indice invertito delle holdings: titolo -> fondi che lo detengono, con peso e data.
+
+Per ogni titolo (ISIN, o ticker/nome se l'ISIN manca) l'indice conserva la
+lista dei fondi che lo detengono ordinata per peso decrescente. Le liste sono
+memorizzate in forma compatta come array ordinati (chiavi, offset, fondo, peso)
+e salvate in un file .npz; la ricerca di un titolo costa un accesso a
+dizionario e una slice.
+
+I fondi si aggiungono uno alla volta durante l'estrazione (add_fund): le nuove
+righe restano in coda e vengono fuse con la parte ordinata alla prima ricerca
+o al salvataggio.
+"""
+
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_INDEX_PATH = os.path.join("output", "holdings_index.npz")
+
+# Cambia quando cambia il formato del file (gli indici esistenti vanno ricostruiti)
+INDEX_VERSION = 1
+
+# Colonne usate per la chiave del titolo, in ordine di priorità, con il prefisso della chiave
+KEY_COLUMNS = [("isin", ""), ("ticker", "ticker:"), ("name", "name:")]
+
+Posting = Tuple[str, float, Optional[str]]
+
+
+def posting_keys(holdings: pd.DataFrame) -> pd.Series:
+    """Chiave del titolo per ogni riga: ISIN, altrimenti 'ticker:<TICKER>', altrimenti 'name:<NOME>'."""
+    keys = pd.Series(None, index=holdings.index, dtype=object)
+    for column, prefix in KEY_COLUMNS:
+        if column not in holdings.columns:
+            continue
+        values = holdings[column].astype("string").str.strip().str.upper()
+        valid = (values.notna() & (values != "") & (values != "-") & keys.isna()).fillna(False)
+        keys[valid] = prefix + values[valid].astype(object)
+    return keys
+
+
+class HoldingsIndex:
+    """Indice invertito titolo -> (fondo, peso, data di riferimento)."""
+
+    def __init__(self):
+        # Fondi: id denso -> ISIN e data di riferimento
+        self.funds: List[str] = []
+        self.as_of: List[Optional[str]] = []
+        self._fund_ids: Dict[str, int] = {}
+
+        # Parte ordinata: le righe di keys[i] sono post_*[offsets[i]:offsets[i + 1]]
+        self._keys = np.array([], dtype=str)
+        self._slots: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_fund = np.array([], dtype=np.int32)
+        self._post_weight = np.array([], dtype=np.float64)
+
+        # Righe aggiunte dopo l'ultima compattazione e fondi le cui righe ordinate sono superate
+        self._pending: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._stale: Set[int] = set()
+
+    def __len__(self) -> int:
+        """Numero di titoli indicizzati."""
+        self.compact()
+        return len(self._keys)
+
+    # === COSTRUZIONE ===
+
+    def add_fund(self, etf_isin: str, holdings: pd.DataFrame, as_of_date=None) -> int:
+        """
+        Aggiunge o sostituisce le holdings di un fondo.
+
+        Args:
+            etf_isin: ISIN dell'ETF
+            holdings: Holdings con colonna weight e almeno una tra isin, ticker e name
+            as_of_date: Data di riferimento delle holdings
+
+        Returns:
+            Numero di titoli del fondo indicizzati
+        """
+        fund_id = self._fund_ids.get(etf_isin)
+        if fund_id is None:
+            fund_id = len(self.funds)
+            self._fund_ids[etf_isin] = fund_id
+            self.funds.append(etf_isin)
+            self.as_of.append(None)
+        self.as_of[fund_id] = None if as_of_date is None or pd.isna(as_of_date) \
+            else pd.Timestamp(as_of_date).date().isoformat()
+        self._stale.add(fund_id)
+
+        keys = posting_keys(holdings)
+        weights = pd.to_numeric(holdings["weight"], errors="coerce")
+        valid = keys.notna() & weights.notna()
+        # Un titolo presente su più righe (es. più linee di cassa) diventa una sola voce
+        grouped = weights[valid].groupby(keys[valid]).sum()
+        self._pending[fund_id] = (grouped.index.to_numpy(dtype=str), grouped.to_numpy(dtype=np.float64))
+        return len(grouped)
+
+    def add_holdings(self, holdings: pd.DataFrame) -> int:
+        """
+        Aggiunge holdings normalizzate (holdings_schema) di uno o più fondi.
+
+        Returns:
+            Numero di fondi aggiunti
+        """
+        count = 0
+        for etf_isin, group in holdings.groupby("etf_isin", sort=False):
+            as_of = group["as_of_date"].dropna() if "as_of_date" in group.columns else pd.Series(dtype=object)
+            self.add_fund(str(etf_isin), group, as_of.iloc[0] if len(as_of) else None)
+            count += 1
+        return count
+
+    def remove_fund(self, etf_isin: str) -> bool:
+        """Toglie un fondo dall'indice (False se non era presente)."""
+        fund_id = self._fund_ids.get(etf_isin)
+        if fund_id is None:
+            return False
+        self._stale.add(fund_id)
+        self._pending[fund_id] = (np.array([], dtype=str), np.array([], dtype=np.float64))
+        return True
+
+    def compact(self) -> None:
+        """
+        Fonde le righe in coda con la parte ordinata (ordine: chiave, peso decrescente).
+
+        Le chiavi nuove vengono inserite nell'elenco ordinato con una ricerca binaria e si
+        riordinano solo le righe in coda insieme alle righe esistenti dei titoli che toccano;
+        le righe degli altri titoli vengono copiate senza riordinarle.
+        """
+        if not self._pending and not self._stale:
+            return
+
+        old_keys = self._keys
+        slots = np.repeat(np.arange(len(old_keys)), np.diff(self._offsets))
+        funds, weights = self._post_fund, self._post_weight
+        if self._stale:
+            keep = ~np.isin(funds, np.fromiter(self._stale, dtype=np.int32))
+            slots, funds, weights = slots[keep], funds[keep], weights[keep]
+
+        pending = list(self._pending.items())
+        new_keys = np.concatenate([np.array([], dtype=str)] + [keys for _, (keys, _) in pending]).astype(str)
+        new_funds = np.concatenate([np.array([], dtype=np.int32)] + [np.full(len(keys), fund_id, dtype=np.int32)
+                                                                      for fund_id, (keys, _) in pending])
+        new_weights = np.concatenate([np.array([], dtype=np.float64)] + [w for _, (_, w) in pending])
+
+        # Chiavi nuove inserite al loro posto nell'elenco ordinato, con lo spostamento delle slot esistenti
+        unique = np.unique(new_keys)
+        positions = np.searchsorted(old_keys, unique)
+        exists = positions < len(old_keys)
+        exists[exists] = old_keys[positions[exists]] == unique[exists]
+        inserted = positions[~exists]
+        keys = np.insert(old_keys.astype(np.result_type(old_keys, unique)), inserted, unique[~exists])
+        shift = np.cumsum(np.bincount(inserted, minlength=len(old_keys) + 1))[:len(old_keys)]
+        slots = (np.arange(len(old_keys)) + shift)[slots]
+        new_slots = np.searchsorted(keys, new_keys)
+
+        # Si riordinano solo le righe dei titoli con righe in coda (a parità di peso prima le esistenti)
+        touched = np.zeros(len(keys), dtype=bool)
+        touched[new_slots] = True
+        moved = touched[slots]
+        block_slots = np.concatenate([slots[moved], new_slots])
+        block_funds = np.concatenate([funds[moved], new_funds])
+        block_weights = np.concatenate([weights[moved], new_weights])
+        order = np.lexsort((-block_weights, block_slots))
+
+        counts = np.bincount(slots, minlength=len(keys)) + np.bincount(new_slots, minlength=len(keys))
+        in_block = np.repeat(touched, counts)
+        post_fund = np.empty(len(in_block), dtype=np.int32)
+        post_weight = np.empty(len(in_block), dtype=np.float64)
+        post_fund[~in_block], post_weight[~in_block] = funds[~moved], weights[~moved]
+        post_fund[in_block], post_weight[in_block] = block_funds[order], block_weights[order]
+
+        # I titoli rimasti senza fondi escono dall'indice
+        held = counts > 0
+        self._keys = keys[held]
+        self._offsets = np.concatenate([[0], np.cumsum(counts[held])]).astype(np.int64)
+        self._post_fund = post_fund
+        self._post_weight = post_weight
+        self._slots = {key: i for i, key in enumerate(self._keys.tolist())}
+        self._pending.clear()
+        self._stale.clear()
+
+    # === RICERCA ===
+
+    def _candidate_keys(self, identifier: str) -> List[str]:
+        value = identifier.strip().upper()
+        if value.startswith(("TICKER:", "NAME:")):
+            prefix, _, rest = value.partition(":")
+            return [f"{prefix.lower()}:{rest}"]
+        return [prefix + value for _, prefix in KEY_COLUMNS]
+
+    def postings(self, *identifiers: str) -> List[Posting]:
+        """
+        Fondi che detengono il titolo, per peso decrescente.
+
+        Args:
+            *identifiers: ISIN, ticker o nome del titolo (anche più d'uno, es. ISIN e ticker);
+                'ticker:XXX' o 'name:XXX' limitano la ricerca a quel tipo di chiave
+
+        Returns:
+            Lista di (etf_isin, peso, data di riferimento); un fondo compare una sola volta
+        """
+        self.compact()
+        slots = {self._slots[key] for identifier in identifiers
+                 for key in self._candidate_keys(identifier) if key in self._slots}
+        best: Dict[int, float] = {}
+        for slot in slots:
+            start, end = self._offsets[slot], self._offsets[slot + 1]
+            for fund_id, weight in zip(self._post_fund[start:end].tolist(), self._post_weight[start:end].tolist()):
+                if weight > best.get(fund_id, float("-inf")):
+                    best[fund_id] = weight
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        return [(self.funds[fund_id], weight, self.as_of[fund_id]) for fund_id, weight in ranked]
+
+    def lookup(self, *identifiers: str) -> pd.DataFrame:
+        """Come postings, in un DataFrame con colonne etf_isin, weight e as_of_date."""
+        return pd.DataFrame(self.postings(*identifiers), columns=["etf_isin", "weight", "as_of_date"])
+
+    # === PERSISTENZA ===
+
+    def save(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        """Salva l'indice compattato (scrittura atomica)."""
+        self.compact()
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, version=np.array([INDEX_VERSION]), keys=self._keys,
+                                    offsets=self._offsets, post_fund=self._post_fund,
+                                    post_weight=self._post_weight, funds=np.array(self.funds, dtype=str),
+                                    as_of=np.array([a or "" for a in self.as_of], dtype=str))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> "HoldingsIndex":
+        """Carica un indice salvato (indice vuoto se il file non esiste o ha un'altra versione)."""
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as data:
+            if int(data["version"][0]) != INDEX_VERSION:
+                print(f"⚠️ Indice {path} con versione diversa da {INDEX_VERSION}: va ricostruito")
+                return index
+            index._keys = data["keys"]
+            index._offsets = data["offsets"]
+            index._post_fund = data["post_fund"]
+            index._post_weight = data["post_weight"]
+            index.funds = data["funds"].tolist()
+            index.as_of = [a or None for a in data["as_of"].tolist()]
+        index._fund_ids = {isin: i for i, isin in enumerate(index.funds)}
+        index._slots = {key: i for i, key in enumerate(index._keys.tolist())}
+        return index
+
+    def sync(self, dataset) -> int:
+        """
+        Aggiunge i fondi del dataset (holdings_dataset.HoldingsDataset) assenti o con data diversa.
+
+        Utile dopo un'esecuzione interrotta: i fondi scritti nel dataset ma non ancora salvati
+        nell'indice vengono recuperati leggendo solo le loro righe.
+
+        Returns:
+            Numero di fondi aggiunti
+        """
+        latest = dataset.latest_funds()
+        if latest.empty:
+            return 0
+        indexed = {isin: self.as_of[i] for isin, i in self._fund_ids.items()}
+        as_of = latest["as_of_date"].map(lambda d: None if pd.isna(d) else d.date().isoformat())
+        missing = [isin for isin, day in zip(latest["etf_isin"], as_of)
+                   if isin not in indexed or indexed[isin] != day]
+        if not missing:
+            return 0
+        return self.add_holdings(dataset.latest(["etf_isin", "as_of_date", "isin", "ticker", "name", "weight"],
+                                                etf_isins=missing))
+
+    @classmethod
+    def from_dataset(cls, dataset) -> "HoldingsIndex":
+        """Costruisce l'indice dall'ultima data di ogni fondo del dataset (holdings_dataset.HoldingsDataset)."""
+        index = cls()
+        index.sync(dataset)
+        index.compact()
+        return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("❌ Specificare 'build' oppure ISIN/ticker/nome del titolo da cercare")
+
+    if sys.argv[1] == "build":
+        from holdings_dataset import HoldingsDataset
+
+        holdings_index = HoldingsIndex.from_dataset(HoldingsDataset())
+        holdings_index.save()
+        print(f"✅ Indice salvato in {DEFAULT_INDEX_PATH}: {len(holdings_index)} titoli, "
+              f"{len(holdings_index.funds)} fondi")
+    else:
+        holdings_index = HoldingsIndex.load()
+        result = holdings_index.lookup(*sys.argv[1:])
+        if result.empty:
+            print(f"⚠️ Nessun fondo contiene {', '.join(sys.argv[1:])}")
+        else:
+            print(result.to_string(index=False))
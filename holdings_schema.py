@@ -0,0 +1,72 @@
+"""
+Schema normalizzato delle holdings, comune a tutti gli emittenti.
+
+Ogni emittente espone colonne con nomi, lingue e scale diverse: qui vengono
+riportate a un unico formato (pesi in percentuale, 0-100).
+"""
+
+from typing import Dict, Optional
+
+import pandas as pd
+
+from numeric_parser import parse_numeric
+
+# Colonne dello schema normalizzato, nell'ordine in cui vengono salvate
+HOLDINGS_COLUMNS = [
+    "etf_isin",
+    "issuer",
+    "as_of_date",
+    "name",
+    "isin",
+    "ticker",
+    "sector",
+    "country",
+    "currency",
+    "asset_class",
+    "weight",
+    "market_value",
+]
+
+STRING_COLUMNS = [c for c in HOLDINGS_COLUMNS if c not in ("weight", "market_value", "as_of_date")]
+
+
+def empty_holdings() -> pd.DataFrame:
+    """DataFrame vuoto con lo schema normalizzato."""
+    return normalize_holdings(pd.DataFrame(), {}, etf_isin="", issuer="")
+
+
+def normalize_holdings(df: pd.DataFrame, column_map: Dict[str, str], etf_isin: str, issuer: str,
+                       as_of_date: Optional[str] = None, weight_scale: float = 1.0,
+                       locale: str = "en") -> pd.DataFrame:
+    """
+    Rinomina e tipizza le colonne di un emittente secondo HOLDINGS_COLUMNS.
+
+    Args:
+        df: DataFrame con le colonne originali dell'emittente
+        column_map: Mappa colonna normalizzata -> colonna originale
+        etf_isin: ISIN dell'ETF
+        issuer: Nome dell'emittente (es. 'ishares')
+        as_of_date: Data di riferimento dei dati (YYYY-MM-DD) se nota
+        weight_scale: Fattore per portare i pesi in percentuale (es. 100 per pesi frazionari)
+        locale: Convenzione dei numeri testuali ('en', 'it', ...); le colonne già numeriche restano invariate
+
+    Returns:
+        DataFrame con esattamente le colonne di HOLDINGS_COLUMNS
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in HOLDINGS_COLUMNS:
+        source = column_map.get(column)
+        out[column] = df[source] if source in df.columns else None
+
+    out["etf_isin"] = etf_isin
+    out["issuer"] = issuer
+    if as_of_date is not None or out["as_of_date"].isna().all():
+        out["as_of_date"] = as_of_date
+
+    out["weight"] = parse_numeric(out["weight"], locale=locale) * weight_scale
+    out["market_value"] = parse_numeric(out["market_value"], locale=locale)
+    out["as_of_date"] = pd.to_datetime(out["as_of_date"], errors="coerce")
+    for column in STRING_COLUMNS:
+        out[column] = out[column].astype("string")
+
+    return out.reset_index(drop=True)
@@ -0,0 +1,255 @@
+"""
+Validazione dei dati raccolti (componente 3 del progetto).
+
+Le regole vengono applicate all'intero insieme di holdings normalizzate
+(holdings_schema) in un solo passaggio vettoriale: ogni riga riceve il codice
+del proprio fondo (ETF + data di riferimento) e le metriche per fondo si
+ottengono con np.bincount sui codici, senza cicli sui fondi. Il risultato è un
+report con una riga per fondo: metriche, regole violate e stato complessivo.
+
+Regole:
+- weight_sum: somma dei pesi lontana da 100% oltre la tolleranza (per le
+  sorgenti con le sole holdings principali, es. extraETF, solo oltre 100%)
+- nan_weights / negative_weights: pesi mancanti o negativi
+- duplicate_securities: stesso titolo su più righe, riconosciuto dall'ISIN o,
+  in sua assenza, da ticker e nome insieme; le righe obbligazionarie e di
+  liquidità senza ISIN non sono confrontate, perché il ticker dell'emittente
+  è condiviso da titoli diversi
+- unknown_sector / unknown_country: quota di peso con settore o paese
+  mancante, generico o fuori dall'elenco dei valori ammessi
+- missing_as_of / stale_as_of: data di riferimento assente o più vecchia di
+  STALE_CADENCES volte la cadenza di pubblicazione dell'emittente
+"""
+
+import os
+import sys
+from datetime import date
+from typing import Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from refresh_scheduler import DEFAULT_CADENCE_DAYS, ISSUER_CADENCE_DAYS
+
+DEFAULT_REPORT_PATH = os.path.join("output", "validation_report.csv")
+
+# Colonne lette dal dataset per la validazione
+VALIDATION_COLUMNS = ["etf_isin", "issuer", "as_of_date", "name", "isin", "ticker", "asset_class", "sector",
+                      "country", "weight"]
+
+# Classi di attivo il cui ticker è quello dell'emittente (obbligazioni, liquidità, derivati): senza ISIN
+# ticker e nome non distinguono titoli diversi
+ISSUER_TICKER_CLASSES = {"fixed income", "money market", "cash", "cash collateral and margins", "fx", "futures"}
+
+# Scarto massimo (punti percentuali) della somma dei pesi da 100%
+WEIGHT_SUM_TOLERANCE = 1.0
+
+# Sorgenti che pubblicano solo le holdings principali: la somma dei pesi può essere inferiore a 100%
+PARTIAL_HOLDINGS_SOURCES = {"extraetf"}
+
+# Quota massima di peso con settore o paese sconosciuto
+UNKNOWN_WEIGHT_TOLERANCE = 0.05
+
+# Dato vecchio: più di STALE_CADENCES volte la cadenza di pubblicazione dell'emittente (refresh_scheduler)
+STALE_CADENCES = 5
+
+# Valori che indicano un attributo non classificato
+UNKNOWN_VALUES = {"", "-", "--", "n/a", "na", "n.a.", "none", "null", "unknown", "other", "altro", "non classificato"}
+
+ERROR = "error"
+WARNING = "warning"
+
+
+class Rule(NamedTuple):
+    """Regola di validazione: la colonna `metric` del report indica se il fondo la viola."""
+    name: str
+    severity: str
+    metric: str
+    description: str
+
+
+RULES: List[Rule] = [
+    Rule("weight_sum", ERROR, "weight_sum_off", "Somma dei pesi fuori tolleranza"),
+    Rule("nan_weights", ERROR, "nan_weights", "Pesi mancanti o non numerici"),
+    Rule("negative_weights", WARNING, "negative_weights", "Pesi negativi"),
+    Rule("duplicate_securities", WARNING, "duplicate_rows", "Titoli presenti su più righe"),
+    Rule("unknown_sector", WARNING, "unknown_sector_off", "Settore sconosciuto oltre la tolleranza"),
+    Rule("unknown_country", WARNING, "unknown_country_off", "Paese sconosciuto oltre la tolleranza"),
+    Rule("missing_as_of", ERROR, "missing_as_of", "Data di riferimento assente"),
+    Rule("stale_as_of", WARNING, "stale_as_of", "Dato più vecchio della cadenza attesa"),
+]
+
+
+def _unknown_mask(values: pd.Series, known: Optional[Iterable[str]] = None) -> np.ndarray:
+    """True per i valori mancanti, generici (UNKNOWN_VALUES) o non presenti in `known`."""
+    codes, uniques = pd.factorize(values)
+    allowed = {value.strip().lower() for value in known} if known is not None else None
+    # Controllo sui soli valori distinti, poi esteso alle righe tramite i codici
+    bad = np.array([value.strip().lower() in UNKNOWN_VALUES
+                    or (allowed is not None and value.strip().lower() not in allowed)
+                    for value in uniques.astype(str)], dtype=bool)
+    # Il codice -1 (valore mancante) punta all'ultimo elemento, sempre sconosciuto
+    return np.append(bad, True)[codes]
+
+
+def _duplicate_keys(holdings: pd.DataFrame) -> pd.Series:
+    """Chiave del titolo per il controllo dei duplicati: ISIN, altrimenti ticker|nome (NA se non identificabile)."""
+    def clean(column):
+        if column not in holdings.columns:
+            return pd.Series(pd.NA, index=holdings.index, dtype="string")
+        values = holdings[column].astype("string").str.strip().str.upper()
+        return values.mask(values == "")
+
+    isin, ticker, name = clean("isin"), clean("ticker"), clean("name")
+    asset_class = clean("asset_class").str.lower()
+    identifiable = ticker.notna() & name.notna() & ~asset_class.isin(list(ISSUER_TICKER_CLASSES)).fillna(False)
+    by_ticker = ("ticker:" + ticker + "|" + name).where(identifiable)
+    return isin.fillna(by_ticker)
+
+
+def _share(codes: np.ndarray, mask: np.ndarray, weights: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    values = np.bincount(codes, weights=weights * mask, minlength=len(totals))
+    return np.divide(values, totals, out=np.zeros(len(totals)), where=totals > 0)
+
+
+def validate_holdings(holdings: pd.DataFrame, today: Optional[date] = None,
+                      known_sectors: Optional[Iterable[str]] = None,
+                      known_countries: Optional[Iterable[str]] = None,
+                      weight_tolerance: float = WEIGHT_SUM_TOLERANCE,
+                      unknown_tolerance: float = UNKNOWN_WEIGHT_TOLERANCE) -> pd.DataFrame:
+    """
+    Applica le regole di validazione a tutti i fondi in un passaggio.
+
+    Args:
+        holdings: Holdings normalizzate (holdings_schema) di uno o più fondi
+        today: Data di confronto per i dati vecchi (default: oggi)
+        known_sectors: Settori ammessi (default: qualsiasi valore non generico)
+        known_countries: Paesi ammessi (default: qualsiasi valore non generico)
+        weight_tolerance: Scarto massimo della somma dei pesi da 100 (punti percentuali)
+        unknown_tolerance: Quota massima di peso con settore o paese sconosciuto
+
+    Returns:
+        DataFrame con una riga per fondo (etf_isin, issuer, as_of_date): metriche, colonne
+        booleane delle regole, errors, warnings, issues (regole violate separate da ';') e
+        status ('ok', 'warning' o 'error')
+    """
+    today = pd.Timestamp(today or date.today()).normalize()
+    as_of = pd.to_datetime(holdings["as_of_date"], errors="coerce")
+
+    # Codice del fondo per riga: stesso ETF con date diverse = fondi distinti
+    etf_codes = pd.factorize(holdings["etf_isin"], sort=True)[0].astype(np.int64)
+    date_codes, dates = pd.factorize(as_of, sort=True)
+    pairs = (etf_codes + 1) * (len(dates) + 1) + (date_codes + 1)
+    _, first_rows, codes = np.unique(pairs, return_index=True, return_inverse=True)
+    n_funds = len(first_rows)
+
+    report = pd.DataFrame({
+        "etf_isin": holdings["etf_isin"].iloc[first_rows].astype("string").to_numpy(),
+        "issuer": holdings["issuer"].iloc[first_rows].astype("string").to_numpy(),
+        "as_of_date": as_of.iloc[first_rows].to_numpy(),
+        "holdings": np.bincount(codes, minlength=n_funds),
+    })
+
+    weight = pd.to_numeric(holdings["weight"], errors="coerce").to_numpy(dtype=np.float64)
+    nan = np.isnan(weight)
+    weight = np.where(nan, 0.0, weight)
+    absolute = np.abs(weight)
+    totals = np.bincount(codes, weights=absolute, minlength=n_funds)
+
+    report["weight_sum"] = np.bincount(codes, weights=weight, minlength=n_funds)
+    report["nan_weights"] = np.bincount(codes, weights=nan, minlength=n_funds).astype(np.int64)
+    report["negative_weights"] = np.bincount(codes, weights=weight < 0, minlength=n_funds).astype(np.int64)
+
+    # Duplicati: coppie (fondo, chiave del titolo) presenti più di una volta
+    keys = _duplicate_keys(holdings)
+    key_codes = pd.factorize(keys)[0]
+    pairs = pd.Series(codes.astype(np.int64) * (key_codes.max(initial=-1) + 2) + key_codes)
+    duplicated = pairs.duplicated(keep=False).to_numpy() & (key_codes >= 0)
+    report["duplicate_rows"] = np.bincount(codes, weights=duplicated, minlength=n_funds).astype(np.int64)
+
+    report["unknown_sector_weight"] = _share(codes, _unknown_mask(holdings["sector"], known_sectors),
+                                             absolute, totals)
+    report["unknown_country_weight"] = _share(codes, _unknown_mask(holdings["country"], known_countries),
+                                              absolute, totals)
+
+    cadence = report["issuer"].map(lambda issuer: ISSUER_CADENCE_DAYS.get(issuer, DEFAULT_CADENCE_DAYS))
+    report["age_days"] = (today - report["as_of_date"]).dt.days
+
+    # Regole
+    partial = report["issuer"].isin(list(PARTIAL_HOLDINGS_SOURCES)).to_numpy(dtype=bool)
+    excess = report["weight_sum"] - 100
+    report["weight_sum_off"] = np.where(partial, excess > weight_tolerance, excess.abs() > weight_tolerance)
+    report["unknown_sector_off"] = report["unknown_sector_weight"] > unknown_tolerance
+    report["unknown_country_off"] = report["unknown_country_weight"] > unknown_tolerance
+    report["missing_as_of"] = report["as_of_date"].isna()
+    report["stale_as_of"] = (report["age_days"] > cadence * STALE_CADENCES).fillna(False).astype(bool)
+
+    failed = {rule.name: report[rule.metric].to_numpy() > 0 for rule in RULES}
+    report["errors"] = sum(failed[rule.name].astype(np.int64) for rule in RULES if rule.severity == ERROR)
+    report["warnings"] = sum(failed[rule.name].astype(np.int64) for rule in RULES if rule.severity == WARNING)
+    names = np.array([rule.name for rule in RULES])
+    matrix = np.column_stack([failed[rule.name] for rule in RULES])
+    report["issues"] = [";".join(names[row]) for row in matrix]
+    report["status"] = np.select([report["errors"] > 0, report["warnings"] > 0], [ERROR, WARNING], "ok")
+    return report
+
+
+def report_issues(report: pd.DataFrame) -> pd.DataFrame:
+    """
+    Report in forma lunga: una riga per regola violata.
+
+    Returns:
+        DataFrame con etf_isin, issuer, as_of_date, rule, severity e description
+    """
+    frames = []
+    for rule in RULES:
+        failed = report[report[rule.metric] > 0]
+        frames.append(pd.DataFrame({"etf_isin": failed["etf_isin"], "issuer": failed["issuer"],
+                                    "as_of_date": failed["as_of_date"], "rule": rule.name,
+                                    "severity": rule.severity, "description": rule.description}))
+    return pd.concat(frames, ignore_index=True).sort_values(["etf_isin", "rule"], ignore_index=True)
+
+
+def validate_dataset(dataset, latest: bool = True, **criteria) -> pd.DataFrame:
+    """
+    Valida le holdings di un dataset (holdings_dataset.HoldingsDataset) leggendo solo le colonne necessarie.
+
+    Args:
+        dataset: Dataset delle holdings
+        latest: Solo l'ultima data di ogni fondo (False: tutte le date)
+        **criteria: Filtri del dataset (issuers, etf_isins, start, end) e opzioni di validate_holdings
+    """
+    options = {key: criteria.pop(key) for key in list(criteria)
+               if key in ("today", "known_sectors", "known_countries", "weight_tolerance", "unknown_tolerance")}
+    holdings = dataset.latest(VALIDATION_COLUMNS, **criteria) if latest \
+        else dataset.read(VALIDATION_COLUMNS, **criteria)
+    return validate_holdings(holdings, **options)
+
+
+def print_report(report: pd.DataFrame, limit: int = 20) -> None:
+    counts = report["status"].value_counts()
+    print(f"🔍 Validati {len(report)} fondi: ✅ {counts.get('ok', 0)} ok, "
+          f"⚠️ {counts.get(WARNING, 0)} con avvisi, ❌ {counts.get(ERROR, 0)} con errori")
+    for rule in RULES:
+        failed = int((report[rule.metric] > 0).sum())
+        if failed:
+            print(f"   {'❌' if rule.severity == ERROR else '⚠️'} {rule.description}: {failed} fondi")
+
+    problems = report[report["status"] != "ok"].sort_values(["errors", "warnings"], ascending=False)
+    if not problems.empty:
+        columns = ["etf_isin", "issuer", "as_of_date", "holdings", "weight_sum", "status", "issues"]
+        print(f"\n{problems[columns].head(limit).to_string(index=False)}")
+
+
+if __name__ == "__main__":
+    from holdings_dataset import DEFAULT_DATASET_DIR, HoldingsDataset
+
+    holdings_dataset = HoldingsDataset(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATASET_DIR)
+    validation_report = validate_dataset(holdings_dataset)
+    if validation_report.empty:
+        print("⚠️ Nessuna holding da validare")
+    else:
+        print_report(validation_report)
+        os.makedirs(os.path.dirname(DEFAULT_REPORT_PATH), exist_ok=True)
+        validation_report.to_csv(DEFAULT_REPORT_PATH, index=False)
+        print(f"\n✅ Report salvato in {DEFAULT_REPORT_PATH}")
@@ -0,0 +1,144 @@
+"""
+Client HTTP condiviso dai downloader degli emittenti.
+
+Ogni emittente usa la propria istanza con limiti di frequenza dedicati,
+così un sito lento o restrittivo non rallenta gli altri.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import requests
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/115 Safari/537.36"
+)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Token bucket thread-safe: al massimo `rate` richieste al secondo con burst `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate deve essere positivo")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Attende finché è disponibile un token. Restituisce i secondi attesi."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HttpClient:
+    """Sessione requests con header di default, rate limit e retry con backoff."""
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None,
+                 cookies: Optional[Dict[str, str]] = None,
+                 requests_per_second: Optional[float] = None,
+                 burst: int = 1,
+                 max_retries: int = 3,
+                 backoff_seconds: float = 1.0,
+                 timeout: float = 30,
+                 retry_status_codes: Iterable[int] = RETRY_STATUS_CODES,
+                 session: Optional[requests.Session] = None):
+        """
+        Args:
+            headers: Header aggiunti a ogni richiesta
+            cookies: Cookie della sessione
+            requests_per_second: Limite di frequenza (None = nessun limite)
+            burst: Numero di richieste consecutive ammesse senza attesa
+            max_retries: Numero massimo di nuovi tentativi
+            backoff_seconds: Attesa base tra i tentativi (raddoppia ad ogni tentativo)
+            timeout: Timeout di default in secondi
+            retry_status_codes: Status HTTP per cui ritentare
+            session: Sessione da riutilizzare (default: nuova sessione)
+        """
+        self.session = session or requests.Session()
+        self.session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+        if headers:
+            self.session.headers.update(headers)
+        if cookies:
+            self.session.cookies.update(cookies)
+
+        self.rate_limiter = RateLimiter(requests_per_second, burst) if requests_per_second else None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.retry_status_codes = set(retry_status_codes)
+
+        self.stats = {"requests": 0, "retries": 0, "throttled_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def headers(self):
+        """Header della sessione (compatibile con l'interfaccia di requests.Session)."""
+        return self.session.headers
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int) -> float:
+        """Rispetta Retry-After se presente, altrimenti backoff esponenziale."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.backoff_seconds * (2 ** attempt)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Esegue una richiesta rispettando rate limit e retry.
+
+        Solleva requests.exceptions.RequestException se tutti i tentativi falliscono.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self._count("throttled_seconds", self.rate_limiter.acquire())
+
+            response = None
+            try:
+                self._count("requests")
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code not in self.retry_status_codes:
+                    response.raise_for_status()
+                    return response
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+
+            self._count("retries")
+            time.sleep(self._retry_delay(response, attempt))
+
+        raise requests.exceptions.RetryError(f"Tentativi esauriti per {url}")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
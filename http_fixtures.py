@@ -0,0 +1,357 @@
+"""
+Registrazione e riproduzione delle risposte HTTP per test e benchmark offline.
+
+- FixtureStore: archivio su disco delle risposte, indicizzate per metodo, URL e corpo
+- FixtureSession: sessione requests da passare a HttpClient che registra le
+  risposte reali (mode='record') o le riproduce dall'archivio (mode='replay')
+- FixtureServer: server locale che riproduce le risposte registrate con
+  latenza, errori e throttling (429) configurabili, per i test di carico
+
+Esempio di test di carico del downloader ExtraETF:
+
+    store = FixtureStore("fixtures/extraetf")
+    with FixtureServer(store, latency=0.05, error_rate=0.01, throttle_rate=0.02) as server:
+        client = HttpClient(session=server.session())
+        download_etf_data(isins, output_dir="/tmp/etf", delay=0, client=client)
+
+Se un ISIN non è stato registrato, il server adatta la risposta registrata per
+un altro ISIN con la stessa richiesta (stesso URL a parte l'ISIN), così
+bastano poche registrazioni per simulare migliaia di fondi.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+ISIN_PATTERN = re.compile(r"[A-Z]{2}[A-Z0-9]{9}[0-9]")
+
+# Header della risposta conservati nelle fixture (il contenuto è salvato già decompresso)
+STORED_HEADERS = ("Content-Type", "Content-Disposition", "Retry-After")
+
+# Header con cui RedirectSession comunica al server l'host originale della richiesta
+ORIGIN_HEADER = "X-Fixture-Origin"
+
+
+def canonical_url(url: str) -> str:
+    """URL con i parametri della query ordinati, per confrontare richieste equivalenti."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def _as_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+class FixtureStore:
+    """Archivio delle risposte registrate: <chiave>.json (metadati) + <chiave>.bin (contenuto)."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._templates: Optional[Dict[Tuple[str, str, str], Dict]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(method: str, url: str, body: bytes = b"") -> str:
+        """Chiave della richiesta: hash di metodo, URL canonico e corpo."""
+        sha = hashlib.sha256()
+        sha.update(method.upper().encode("utf-8") + b"\n")
+        sha.update(canonical_url(url).encode("utf-8") + b"\n")
+        sha.update(_as_bytes(body))
+        return sha.hexdigest()[:24]
+
+    def save(self, method: str, url: str, body: bytes, status: int,
+             headers: Dict[str, str], content: bytes) -> str:
+        """Salva una risposta e restituisce la sua chiave."""
+        key = self.request_key(method, url, body)
+        meta = {
+            "method": method.upper(),
+            "url": canonical_url(url),
+            "request_body": _as_bytes(body).decode("utf-8", errors="replace"),
+            "status": status,
+            "headers": {name: headers[name] for name in STORED_HEADERS if name in headers},
+        }
+        (self.root / f"{key}.bin").write_bytes(content)
+        (self.root / f"{key}.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        with self._lock:
+            self._templates = None
+        return key
+
+    def load(self, method: str, url: str, body: bytes = b"") -> Optional[Dict]:
+        """
+        Recupera una risposta registrata.
+
+        Returns:
+            Dict con status, headers e content, oppure None se non registrata
+        """
+        return self._load_key(self.request_key(method, url, body))
+
+    def _load_key(self, key: str) -> Optional[Dict]:
+        meta_path = self.root / f"{key}.json"
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        meta["content"] = (self.root / f"{key}.bin").read_bytes()
+        return meta
+
+    def entries(self) -> List[Dict]:
+        """Metadati di tutte le risposte registrate."""
+        return [json.loads(path.read_text(encoding="utf-8")) for path in sorted(self.root.glob("*.json"))]
+
+    def __len__(self) -> int:
+        return len(list(self.root.glob("*.json")))
+
+    @staticmethod
+    def _template(method: str, url: str, body: str) -> Tuple[str, str, str]:
+        return (method.upper(), ISIN_PATTERN.sub("{ISIN}", canonical_url(url)), ISIN_PATTERN.sub("{ISIN}", body))
+
+    def load_for_isin(self, method: str, url: str, body: bytes = b"") -> Optional[Dict]:
+        """
+        Recupera una risposta registrata per un altro ISIN con la stessa richiesta,
+        sostituendo nel contenuto l'ISIN registrato con quello richiesto.
+        """
+        text_body = _as_bytes(body).decode("utf-8", errors="replace")
+        requested = set(ISIN_PATTERN.findall(canonical_url(url) + text_body))
+        if len(requested) != 1:
+            return None
+
+        with self._lock:
+            if self._templates is None:
+                self._templates = {}
+                for path in sorted(self.root.glob("*.json")):
+                    meta = json.loads(path.read_text(encoding="utf-8"))
+                    recorded = set(ISIN_PATTERN.findall(meta["url"] + meta["request_body"]))
+                    if len(recorded) == 1:
+                        template = self._template(meta["method"], meta["url"], meta["request_body"])
+                        self._templates.setdefault(template, {"key": path.stem, "isin": recorded.pop()})
+            match = self._templates.get(self._template(method, url, text_body))
+
+        if match is None:
+            return None
+        entry = self._load_key(match["key"])
+        entry["content"] = entry["content"].replace(match["isin"].encode("ascii"), requested.pop().encode("ascii"))
+        return entry
+
+
+def build_response(entry: Dict, request: requests.PreparedRequest) -> requests.Response:
+    """Costruisce un oggetto requests.Response da una risposta registrata."""
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response._content = entry["content"]
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class FixtureSession(requests.Session):
+    """Sessione che registra le risposte reali o le riproduce dall'archivio."""
+
+    def __init__(self, store: FixtureStore, mode: str = "replay"):
+        """
+        Args:
+            store: Archivio delle risposte
+            mode: 'record' (rete + salvataggio) o 'replay' (solo archivio, nessun accesso alla rete)
+        """
+        super().__init__()
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modalità non valida: {mode}")
+        self.store = store
+        self.mode = mode
+
+    def request(self, method, url, params=None, data=None, headers=None, cookies=None,
+                files=None, auth=None, timeout=None, allow_redirects=True, proxies=None,
+                hooks=None, stream=None, verify=None, cert=None, json=None):
+        prepared = requests.Request(method, url, params=params, data=data, json=json).prepare()
+        body = _as_bytes(prepared.body)
+
+        if self.mode == "replay":
+            entry = self.store.load(method, prepared.url, body)
+            if entry is None:
+                raise requests.exceptions.ConnectionError(f"Nessuna fixture per {method} {prepared.url}")
+            return build_response(entry, prepared)
+
+        response = super().request(method, url, params=params, data=data, headers=headers, cookies=cookies,
+                                   files=files, auth=auth, timeout=timeout, allow_redirects=allow_redirects,
+                                   proxies=proxies, hooks=hooks, stream=stream, verify=verify, cert=cert,
+                                   json=json)
+        self.store.save(method, prepared.url, body, response.status_code, response.headers, response.content)
+        return response
+
+
+class RedirectSession(requests.Session):
+    """Sessione che invia tutte le richieste a un FixtureServer mantenendo path e query."""
+
+    def __init__(self, server_url: str):
+        super().__init__()
+        self.server_url = server_url.rstrip("/")
+
+    def request(self, method, url, headers=None, **kwargs):
+        parts = urlsplit(url)
+        target = f"{self.server_url}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+        headers = {**(headers or {}), ORIGIN_HEADER: f"{parts.scheme}://{parts.netloc}"}
+        return super().request(method, target, headers=headers, **kwargs)
+
+
+class FixtureServer:
+    """Server HTTP locale che riproduce le risposte di un FixtureStore."""
+
+    def __init__(self, store: FixtureStore, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 isin_fallback: bool = True, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            store: Archivio delle risposte
+            latency: Ritardo fisso per risposta in secondi
+            jitter: Ritardo aggiuntivo casuale massimo in secondi
+            error_rate: Frazione di richieste che ricevono 500
+            throttle_rate: Frazione di richieste che ricevono 429 con Retry-After
+            retry_after: Valore dell'header Retry-After delle risposte 429
+            isin_fallback: Adatta le risposte registrate per altri ISIN (vedi FixtureStore.load_for_isin)
+            seed: Seme per rendere riproducibili errori e latenze
+            host: Indirizzo di ascolto
+            port: Porta di ascolto (0 = porta libera qualsiasi)
+        """
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.isin_fallback = isin_fallback
+        self.stats = {"requests": 0, "replayed": 0, "adapted": 0, "errors": 0, "throttled": 0, "not_found": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def session(self) -> RedirectSession:
+        """Sessione da passare a HttpClient per inviare le richieste a questo server."""
+        return RedirectSession(self.url)
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def respond(self, method: str, url: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """Calcola la risposta a una richiesta: (status, header, contenuto)."""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.throttle_rate:
+            self._count("throttled")
+            return 429, {"Retry-After": str(self.retry_after)}, b""
+        if roll < self.throttle_rate + self.error_rate:
+            self._count("errors")
+            return 500, {}, b""
+
+        entry = self.store.load(method, url, body)
+        if entry is not None:
+            self._count("replayed")
+        elif self.isin_fallback:
+            entry = self.store.load_for_isin(method, url, body)
+            if entry is not None:
+                self._count("adapted")
+        if entry is None:
+            self._count("not_found")
+            return 404, {"Content-Type": "text/plain"}, f"Nessuna fixture per {method} {url}".encode("utf-8")
+        return entry["status"], entry["headers"], entry["content"]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Header e corpo sono scritti separatamente: senza TCP_NODELAY ogni risposta attende l'ACK ritardato
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                origin = self.headers.get(ORIGIN_HEADER) or server.url
+                status, headers, content = server.respond(self.command, f"{origin}{self.path}", body)
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server locale che riproduce le risposte HTTP registrate")
+    parser.add_argument("fixtures_dir", help="Cartella del FixtureStore")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Ritardo fisso in secondi")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Ritardo casuale aggiuntivo in secondi")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Frazione di risposte 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Frazione di risposte 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures_dir)
+    server = FixtureServer(store, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate, retry_after=args.retry_after, port=args.port)
+    print(f"🎞️  {len(store)} risposte registrate servite su {server.url} (Ctrl+C per terminare)")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"Statistiche: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Estrazione delle holdings Invesco (formato di invesco_list.json / API dng-api).
+
+Il JSON contiene effectiveDate e la lista holdings con name, isin, cusip e
+weight (percentuale). Il documento viene letto in streaming: effectiveDate
+precede le holdings, quindi se la data non è più recente dell'ultima già
+elaborata la lettura si ferma prima della lista. Le holdings finiscono nello
+schema normalizzato; settore, paese e valuta, assenti nel file, vengono
+completati con un join per ID sull'anagrafica titoli (security_master.py).
+"""
+
+import os
+import sys
+import traceback
+from datetime import date
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from holdings_db import HoldingsDB
+from holdings_schema import normalize_holdings
+from json_stream import Source, iter_items
+from refresh_scheduler import parse_as_of_date
+from security_master import ATTRIBUTE_COLUMNS, DEFAULT_DB_PATH, SecurityMaster
+
+AS_OF_PREFIX = "effectiveDate"
+HOLDINGS_PREFIX = "holdings.item"
+INVESCO_FIELDS = ["name", "isin", "cusip", "weight"]
+
+# Colonne normalizzate (holdings_schema) -> colonne Invesco
+INVESCO_COLUMN_MAP = {"name": "name", "isin": "isin", "weight": "weight"}
+
+BREAKDOWN_COLUMNS = ["sector", "country", "currency"]
+UNCLASSIFIED = "Non classificato"
+
+
+def _log(verbose: bool, *args) -> None:
+    if verbose:
+        print(*args)
+
+
+def latest_as_of(db: HoldingsDB, etf_isin: str) -> Optional[date]:
+    """Data dell'ultima fotografia 'invesco' del fondo in db (None se non ce ne sono)."""
+    snapshots = db.snapshots(etf_isin)
+    dates = snapshots.loc[snapshots["source"] == "invesco", "as_of_date"].dropna()
+    return parse_as_of_date(dates.max()) if len(dates) else None
+
+
+def read_invesco_holdings(source: Source, known_as_of: Optional[date] = None) -> Dict:
+    """
+    Legge in streaming data di riferimento e holdings Invesco.
+
+    Args:
+        source: Percorso del JSON, contenuto (bytes) o file aperto (es. response.raw)
+        known_as_of: Data dell'ultimo dato già elaborato: se effectiveDate non è più
+            recente, le holdings non vengono lette
+
+    Returns:
+        Dict con as_of_date (date o None), skipped (bool) e holdings (DataFrame con INVESCO_FIELDS,
+        vuoto se skipped)
+    """
+    columns: Dict[str, List] = {field: [] for field in INVESCO_FIELDS}
+    as_of = None
+    items = iter_items(source, [AS_OF_PREFIX, HOLDINGS_PREFIX])
+    try:
+        for prefix, value in items:
+            if prefix == AS_OF_PREFIX:
+                as_of = parse_as_of_date(value)
+                if known_as_of is not None and as_of is not None and as_of <= known_as_of:
+                    return {"as_of_date": as_of, "skipped": True,
+                            "holdings": pd.DataFrame(columns=INVESCO_FIELDS)}
+            else:
+                for field in INVESCO_FIELDS:
+                    columns[field].append(value.get(field))
+    finally:
+        # Interrompe la lettura e chiude il file anche quando si esce in anticipo
+        items.close()
+
+    holdings = pd.DataFrame(columns, columns=INVESCO_FIELDS)
+    holdings["weight"] = pd.to_numeric(holdings["weight"], errors="coerce").astype("float64")
+    if known_as_of is not None and as_of is not None and as_of <= known_as_of:
+        # effectiveDate dopo le holdings: stessa decisione, a lettura completata
+        return {"as_of_date": as_of, "skipped": True, "holdings": holdings.iloc[:0]}
+    return {"as_of_date": as_of, "skipped": False, "holdings": holdings}
+
+
+def normalize_invesco_holdings(holdings: pd.DataFrame, etf_isin: str, as_of_date: Optional[date] = None,
+                               security_master: Optional[SecurityMaster] = None) -> pd.DataFrame:
+    """
+    Porta le holdings Invesco nello schema di holdings_schema.
+
+    Con un'anagrafica titoli, ISIN, CUSIP e nome vengono risolti in ID e gli
+    attributi mancanti (settore, paese, valuta, asset class) presi dall'anagrafica.
+    """
+    out = normalize_holdings(holdings, INVESCO_COLUMN_MAP, etf_isin=etf_isin, issuer="invesco",
+                             as_of_date=str(as_of_date) if as_of_date is not None else None)
+    if security_master is not None and len(holdings):
+        ids = security_master.resolve_frame(holdings.reset_index(drop=True),
+                                            {"isin": "isin", "cusip": "cusip", "name": "name"})
+        attributes = security_master.attributes(ids)
+        for column in ATTRIBUTE_COLUMNS:
+            out[column] = out[column].fillna(attributes[column].astype("string"))
+    return out
+
+
+def invesco_breakdowns(holdings: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Ripartizione dei pesi per settore, paese e valuta (UNCLASSIFIED per i titoli senza attributo)."""
+    return {
+        column: holdings.groupby(holdings[column].fillna(UNCLASSIFIED))["weight"].sum().sort_values(ascending=False)
+        for column in BREAKDOWN_COLUMNS
+    }
+
+
+def extract_invesco(etf_isin: str, source: Source = "invesco_list.json", verbose: bool = True,
+                    known_as_of: Optional[date] = None, security_master: Optional[SecurityMaster] = None,
+                    db_path: Optional[str] = None) -> Dict:
+    """
+    Estrae e normalizza le holdings Invesco di un ETF.
+
+    Args:
+        etf_isin: ISIN dell'ETF
+        source: JSON delle holdings (percorso, bytes o file aperto)
+        verbose: Stampa l'analisi a video
+        known_as_of: Data già elaborata; default: ultima fotografia 'invesco' in db_path
+        security_master: Anagrafica per completare gli attributi (default: DEFAULT_DB_PATH se esiste)
+        db_path: Database normalizzato (holdings_db.py) in cui sostituire la fotografia del fondo
+
+    Returns:
+        Dict con isin, status ('ok' o 'skipped'), as_of_date, holdings (normalizzate),
+        breakdowns (settore, paese, valuta), coverage (quota di peso con almeno un attributo noto)
+        e snapshot_id (None se non salvata)
+    """
+    db = HoldingsDB(db_path) if db_path is not None else None
+    if known_as_of is None and db is not None:
+        known_as_of = latest_as_of(db, etf_isin)
+    if security_master is None and os.path.exists(DEFAULT_DB_PATH):
+        security_master = SecurityMaster(DEFAULT_DB_PATH)
+
+    raw = read_invesco_holdings(source, known_as_of)
+    if raw["skipped"]:
+        _log(verbose, f"⏭️ {etf_isin}: dati al {raw['as_of_date']} già elaborati")
+        return {"isin": etf_isin, "status": "skipped", "as_of_date": raw["as_of_date"], "holdings": None,
+                "breakdowns": {}, "coverage": None, "snapshot_id": None}
+
+    holdings = normalize_invesco_holdings(raw["holdings"], etf_isin, raw["as_of_date"], security_master)
+    breakdowns = invesco_breakdowns(holdings)
+    total = holdings["weight"].sum()
+    known = holdings[BREAKDOWN_COLUMNS].notna().any(axis=1)
+    coverage = float(holdings.loc[known, "weight"].sum() / total) if total else 0.0
+
+    _log(verbose, f"📅 Holdings al {raw['as_of_date']}: {len(holdings)} titoli, peso totale {total:.2f}%")
+    _log(verbose, f"🔗 Attributi dall'anagrafica titoli per il {coverage:.1%} del peso")
+    for column, title in (("sector", "🏢 SETTORI"), ("country", "🌍 PAESI"), ("currency", "💱 VALUTE")):
+        _log(verbose, f"\n{title}:")
+        for i, (name, perc) in enumerate(breakdowns[column].head(10).items(), 1):
+            _log(verbose, f"{i:2d}. {name:30s}: {perc:6.2f}%")
+
+    snapshot_id = None
+    if db is not None:
+        snapshot_id = db.replace_snapshot(etf_isin, "invesco", holdings, as_of_date=raw["as_of_date"],
+                                          fund={"issuer": "invesco"})
+        _log(verbose, f"✅ {db_path}      - snapshot {snapshot_id} ({len(holdings)} holdings)")
+
+    return {"isin": etf_isin, "status": "ok", "as_of_date": raw["as_of_date"], "holdings": holdings,
+            "breakdowns": breakdowns, "coverage": coverage, "snapshot_id": snapshot_id}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("❌ You have to specify the ISIN of the ETF (and optionally the JSON file) as arguments")
+
+    try:
+        extract_invesco(sys.argv[1], *sys.argv[2:3])
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+        traceback.print_exc()
@@ -0,0 +1,175 @@
+"""
+Rilevamento del formato e lettura in un solo passaggio dei CSV holdings iShares.
+
+I CSV iShares hanno un preambolo variabile ('Fund Holdings as of,"20/Aug/2025"'
+nell'export inglese, 'Al,"22/08/2025"' in quello italiano, seguiti da una riga
+vuota), poi l'intestazione e le righe. Numeri e separatori dipendono dalla
+lingua: "6,476,595,712.60" in inglese, "6.476.595.712,60" in italiano.
+
+detect_ishares_format legge solo i primi KB del file e ricava preambolo, data
+di riferimento, delimitatore, separatori decimale e migliaia, riga di
+intestazione e colonne numeriche; read_ishares_csv legge poi il file una sola
+volta con dtype espliciti.
+"""
+
+import csv
+import importlib.util
+import os
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from numeric_parser import ENGLISH_NUMBER, ITALIAN_NUMBER, parse_numeric
+from refresh_scheduler import parse_as_of_date
+
+SAMPLE_BYTES = 32 * 1024
+DELIMITERS = (",", ";", "\t", "|")
+NA_VALUES = ["-", "", "\xa0"]
+
+# Il motore pyarrow conviene solo su file grandi (l'avvio dei thread ha un costo fisso)
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+FAST_ENGINE_MIN_BYTES = 8 * 1024 * 1024
+
+# Quota minima di valori numerici perché una colonna sia considerata numerica
+NUMERIC_COLUMN_RATIO = 0.9
+
+
+class CsvFormat(NamedTuple):
+    """Formato rilevato di un CSV holdings."""
+    encoding: str
+    delimiter: str
+    decimal: str
+    thousands: str
+    header_row: int
+    header_offset: int
+    as_of_date: Optional[date]
+    columns: List[str]
+    numeric_columns: List[str]
+
+
+def _split(line: str, delimiter: str) -> List[str]:
+    return next(csv.reader([line], delimiter=delimiter, quotechar='"'), [])
+
+
+def _find_header(lines: List[str], delimiter: str) -> Tuple[Optional[int], int]:
+    """Prima riga con almeno 3 campi seguita da righe con lo stesso numero di campi."""
+    counts = [len(_split(line, delimiter)) for line in lines]
+    for i, count in enumerate(counts):
+        following = counts[i + 1:i + 4]
+        if count >= 3 and following and all(c == count for c in following):
+            return i, count
+    return None, 0
+
+
+def detect_ishares_format(path: str, sample_bytes: int = SAMPLE_BYTES) -> CsvFormat:
+    """
+    Rileva il formato di un CSV iShares leggendone solo l'inizio.
+
+    Raises:
+        ValueError: Se non viene trovata una riga di intestazione
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+        complete = len(sample) < sample_bytes or not f.read(1)
+
+    encoding = "utf-8-sig" if sample.startswith(b"\xef\xbb\xbf") else "utf-8"
+    bom = 3 if encoding == "utf-8-sig" else 0
+    text = sample[bom:].decode("utf-8", errors="ignore")
+    raw_lines = text.splitlines(keepends=True)
+    if not complete and raw_lines:
+        raw_lines = raw_lines[:-1]  # l'ultima riga del campione può essere troncata
+    lines = [line.rstrip("\r\n") for line in raw_lines]
+
+    best = None
+    for delimiter in DELIMITERS:
+        header_row, count = _find_header(lines, delimiter)
+        if header_row is not None and (best is None or count > best[2]):
+            best = (delimiter, header_row, count)
+    if best is None:
+        raise ValueError(f"❌ Intestazione non trovata in {path}")
+    delimiter, header_row, _ = best
+
+    as_of = None
+    for line in lines[:header_row]:
+        fields = _split(line, delimiter)
+        if len(fields) > 1:
+            as_of = as_of or parse_as_of_date(fields[1])
+
+    columns = [c.strip() for c in _split(lines[header_row], delimiter)]
+    rows = [_split(line, delimiter) for line in lines[header_row + 1:]]
+    rows = [row for row in rows if len(row) == len(columns)]
+
+    english = italian = 0
+    for row in rows:
+        for value in row:
+            english += bool(ENGLISH_NUMBER.match(value))
+            italian += bool(ITALIAN_NUMBER.match(value))
+    decimal, thousands = (",", ".") if italian > english else (".", ",")
+    number = ITALIAN_NUMBER if decimal == "," else ENGLISH_NUMBER
+
+    numeric_columns = []
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows if row[i].strip() not in NA_VALUES]
+        if values and sum(bool(number.match(v)) for v in values) >= NUMERIC_COLUMN_RATIO * len(values):
+            numeric_columns.append(column)
+
+    header_offset = bom + sum(len(line.encode("utf-8")) for line in raw_lines[:header_row])
+    return CsvFormat(encoding, delimiter, decimal, thousands, header_row, header_offset,
+                     as_of, columns, numeric_columns)
+
+
+def _choose_engine(path: str, engine: Optional[str]) -> str:
+    if engine:
+        return engine
+    if PYARROW_AVAILABLE and os.path.getsize(path) >= FAST_ENGINE_MIN_BYTES:
+        return "pyarrow"
+    return "c"
+
+
+def read_ishares_csv(path: str, fmt: Optional[CsvFormat] = None,
+                     engine: Optional[str] = None) -> Tuple[pd.DataFrame, CsvFormat]:
+    """
+    Legge un CSV iShares in un solo passaggio.
+
+    Args:
+        path: Percorso del CSV
+        fmt: Formato già rilevato (default: detect_ishares_format)
+        engine: 'c', 'pyarrow' o None (pyarrow sui file grandi se installato)
+
+    Returns:
+        (DataFrame con colonne numeriche float64 e testuali str, formato rilevato)
+    """
+    fmt = fmt or detect_ishares_format(path)
+    engine = _choose_engine(path, engine)
+    numeric = set(fmt.numeric_columns)
+
+    with open(path, "rb") as f:
+        f.seek(fmt.header_offset)
+        if engine == "pyarrow":
+            # pyarrow non supporta il separatore delle migliaia: numeri convertiti dopo la lettura
+            df = pd.read_csv(f, sep=fmt.delimiter, engine="pyarrow", dtype=str, on_bad_lines="skip",
+                             na_values=NA_VALUES, keep_default_na=False)
+            df.columns = df.columns.str.strip()
+            for column in numeric & set(df.columns):
+                df[column] = parse_numeric(df[column], decimal=fmt.decimal, thousands=fmt.thousands)
+            return df.dropna(how="all").reset_index(drop=True), fmt
+
+        raw_columns = _split(f.readline().decode("utf-8").rstrip("\r\n"), fmt.delimiter)
+        dtypes: Dict[str, str] = {c: ("float64" if c.strip() in numeric else "str") for c in raw_columns}
+        options = dict(sep=fmt.delimiter, quotechar='"', encoding="utf-8", decimal=fmt.decimal,
+                       thousands=fmt.thousands, na_values=NA_VALUES, keep_default_na=False)
+        f.seek(fmt.header_offset)
+        try:
+            df = pd.read_csv(f, dtype=dtypes, **options)
+        except ValueError:
+            # Valore inatteso in una colonna numerica: rilettura come testo e conversione tollerante
+            f.seek(fmt.header_offset)
+            df = pd.read_csv(f, dtype=str, **options)
+            for column in raw_columns:
+                if column.strip() in numeric:
+                    df[column] = parse_numeric(df[column], decimal=fmt.decimal, thousands=fmt.thousands)
+
+    df.columns = df.columns.str.strip()
+    # Le righe finali di note (es. un solo spazio non separabile) risultano tutte vuote
+    return df.dropna(how="all").reset_index(drop=True), fmt
@@ -3,67 +3,107 @@ import os
 import sys
 import traceback
 from datetime import datetime
+from typing import Dict, Optional
 
 import pandas as pd
 
 from file_utils import create_output_folder
-
-if len(sys.argv) < 2:
-    raise ValueError("❌ You have to specify the name of the CSV file as argument")
-
-etf_isin_prefix = sys.argv[1]
-
-print("Reading the csv...")
+from holdings_db import HoldingsDB
+from holdings_schema import normalize_holdings
+from ishares_csv_reader import read_ishares_csv
 
 date_and_time_format = "%Y-%m-%d %H:%M:%S"
-etf_8_encoding = "utf-8-sig"
 csv_extension = ".csv"
 json_extension = ".json"
 # country = "_it"
 country = ""
 
-# input_csv_file_name_prefix = "etf_data"
-# input_csv_file_name_prefix = "EIMI_holdings"
-# input_csv_file_name_and_country_prefix = input_csv_file_name_prefix + country
-# input_csv_file_name = input_csv_file_name_and_country_prefix + csv_extension
-input_folder = create_output_folder("input", "")
-print(f"Input folder: {input_folder}")
-input_csv_file_name = os.path.join(input_folder, etf_isin_prefix + csv_extension)
-print(f"Input csv file name: {input_csv_file_name}")
-
-output_folder = create_output_folder("output", etf_isin_prefix)
-print(f"Output folder: {output_folder}")
-output_clean_csv_file_name = os.path.join(output_folder, etf_isin_prefix + "_clean" + csv_extension)
-print(f"Output clean CSV file: {output_clean_csv_file_name}")
-output_json_file_sectors = os.path.join(output_folder, "sectors" + json_extension)
-print(f"Output json file sectors: {output_json_file_sectors}")
-output_json_file_countries = os.path.join(output_folder, "countries" + json_extension)
-print(f"Output json file countries: {output_json_file_countries}")
-output_json_file_summary = os.path.join(output_folder, "summary" + json_extension)
-print(f"Output json file summary: {output_json_file_summary}")
-
-try:
-    df = pd.read_csv(input_csv_file_name, skiprows=2, encoding=etf_8_encoding)
-
-    print(f"✅ Successfully read {input_csv_file_name}!")
-    print(f"Dimensions: {df.shape}")
-    print(f"Columns: {list(df.columns)}")
-
-    if len(df.columns) == 1:
-        print("⚠️  Just 1 column found, trying with other separators...")
-
-        df = pd.read_csv(input_csv_file_name, skiprows=1, encoding=etf_8_encoding, sep=';')
-        if len(df.columns) == 1:
-            df = pd.read_csv(input_csv_file_name, skiprows=1, encoding=etf_8_encoding, sep=',', quotechar='"')
-
-    print(f"Final dimensions: {df.shape}")
-    print(f"Final columns: {list(df.columns)}")
-
-    # Removing extra spaces from column names
-    df.columns = df.columns.str.strip()
-
-    print("\nFirst 3 rows:")
-    print(df.head(3).to_string())
+# Colonne normalizzate (holdings_schema) -> colonne del CSV (export inglese e italiano)
+ISHARES_COLUMN_MAPS = [
+    {"name": "Name", "ticker": "Ticker", "sector": "Sector", "country": "Location",
+     "currency": "Market Currency", "asset_class": "Asset Class",
+     "weight": "Weight (%)", "market_value": "Market Value"},
+    {"name": "Nome", "ticker": "Ticker dell'emittente", "sector": "Settore",
+     "country": "Area Geografica", "currency": "Valuta di mercato", "asset_class": "Asset Class",
+     "weight": "Ponderazione (%)", "market_value": "Valore di mercato"},
+]
+
+
+def _log(verbose: bool, *args) -> None:
+    if verbose:
+        print(*args)
+
+
+def normalize_ishares_holdings(holdings: pd.DataFrame, etf_isin: str, as_of_date=None) -> pd.DataFrame:
+    """Porta le holdings di un CSV iShares (inglese o italiano) nello schema di holdings_schema."""
+    column_map = max(ISHARES_COLUMN_MAPS, key=lambda m: len(set(m.values()) & set(holdings.columns)))
+    return normalize_holdings(holdings, column_map, etf_isin=etf_isin, issuer="ishares",
+                              as_of_date=as_of_date.isoformat() if as_of_date else None)
+
+
+def extract_ishares(etf_isin_prefix: str, input_base: str = "input", output_base: str = "output",
+                    verbose: bool = True, engine: Optional[str] = None, write_files: bool = True,
+                    db_path: Optional[str] = None) -> Dict:
+    """
+    Pulisce il CSV iShares di un ETF ed esporta settori, aree geografiche e riepilogo.
+
+    Args:
+        etf_isin_prefix: ISIN dell'ETF (nome del file CSV in input_base)
+        input_base: Cartella dei CSV scaricati
+        output_base: Cartella di output (una sottocartella per ISIN)
+        verbose: Stampa l'analisi a video
+        engine: Motore di lettura del CSV ('c', 'pyarrow' o None per la scelta automatica)
+        write_files: Scrive CSV pulito e JSON per ETF in output_base (False se le holdings
+            vanno nel dataset colonnare, vedi holdings_dataset.py)
+        db_path: Database normalizzato (holdings_db.py) in cui sostituire la fotografia del fondo
+
+    Returns:
+        Dict con isin, as_of_date, clean_csv (percorso o None), summary, holdings (DataFrame delle
+        righe valide) e snapshot_id (None se db_path non è indicato)
+
+    Raises:
+        ValueError: Se mancano le colonne necessarie o non ci sono pesi validi
+    """
+    _log(verbose, "Reading the csv...")
+
+    # input_csv_file_name_prefix = "etf_data"
+    # input_csv_file_name_prefix = "EIMI_holdings"
+    # input_csv_file_name_and_country_prefix = input_csv_file_name_prefix + country
+    # input_csv_file_name = input_csv_file_name_and_country_prefix + csv_extension
+    input_folder = create_output_folder(input_base, "") if verbose else input_base
+    _log(verbose, f"Input folder: {input_folder}")
+    input_csv_file_name = os.path.join(input_folder, etf_isin_prefix + csv_extension)
+    _log(verbose, f"Input csv file name: {input_csv_file_name}")
+
+    if verbose and write_files:
+        output_folder = create_output_folder(output_base, etf_isin_prefix)
+    else:
+        output_folder = os.path.join(output_base, etf_isin_prefix)
+        if write_files:
+            os.makedirs(output_folder, exist_ok=True)
+    _log(verbose, f"Output folder: {output_folder}")
+    output_clean_csv_file_name = os.path.join(output_folder, etf_isin_prefix + "_clean" + csv_extension)
+    _log(verbose, f"Output clean CSV file: {output_clean_csv_file_name}")
+    output_json_file_sectors = os.path.join(output_folder, "sectors" + json_extension)
+    _log(verbose, f"Output json file sectors: {output_json_file_sectors}")
+    output_json_file_countries = os.path.join(output_folder, "countries" + json_extension)
+    _log(verbose, f"Output json file countries: {output_json_file_countries}")
+    output_json_file_summary = os.path.join(output_folder, "summary" + json_extension)
+    _log(verbose, f"Output json file summary: {output_json_file_summary}")
+
+    # Format detection on the first KB, then a single parse with explicit dtypes
+    df, csv_format = read_ishares_csv(input_csv_file_name, engine=engine)
+
+    _log(verbose, f"✅ Successfully read {input_csv_file_name}!")
+    _log(verbose, f"As of: {csv_format.as_of_date} | Separator: '{csv_format.delimiter}' | "
+                  f"Decimal: '{csv_format.decimal}' | Thousands: '{csv_format.thousands}'")
+    _log(verbose, f"Dimensions: {df.shape}")
+    _log(verbose, f"Columns: {list(df.columns)}")
+    _log(verbose, f"Numeric columns: {csv_format.numeric_columns}")
+
+    if verbose:
+        print("\nFirst 3 rows:")
+        print(df.head(3).to_string())
 
     weight_col = None
     sector_col = None
@@ -72,85 +112,77 @@ try:
     for col in df.columns:
         if 'weight' in col.lower() or 'ponderazione' in col.lower() and '%' in col:
             weight_col = col
-            print(f"✅ Weight colum: '{col}'")
+            _log(verbose, f"✅ Weight colum: '{col}'")
         elif 'sector' in col.lower() or 'settore' in col.lower():
             sector_col = col
-            print(f"✅ Sector column: '{col}'")
+            _log(verbose, f"✅ Sector column: '{col}'")
         elif 'location' in col.lower() or 'area' in col.lower():
             location_col = col
-            print(f"✅ Location column: '{col}'")
+            _log(verbose, f"✅ Location column: '{col}'")
 
     if not all([weight_col, sector_col, location_col]):
-        print("❌ Not all the columns were found")
-        print("Available columns:")
+        _log(verbose, "❌ Not all the columns were found")
+        _log(verbose, "Available columns:")
         for i, col in enumerate(df.columns):
-            print(f"  {i}: '{col}'")
-        exit()
-
-    print(f"\nColumn analysis '{weight_col}':")
-    print(f"Unique values (first 10): {df[weight_col].unique()[:10]}")
-    print(f"Null values: {df[weight_col].isna().sum()}")
-    print(f"Empty values: {(df[weight_col] == '').sum()}")
+            _log(verbose, f"  {i}: '{col}'")
+        raise ValueError(f"❌ Not all the columns were found in {input_csv_file_name}")
 
-    print("\nCleaning the weight column...")
-    df[weight_col] = df[weight_col].astype(str)
-    df[weight_col] = df[weight_col].str.strip()
-    df[weight_col] = df[weight_col].str.replace(',', '.')  # Italian decimals -> english
-    df[weight_col] = df[weight_col].str.replace('%', '')  # Remove % if present
+    _log(verbose, f"\nColumn analysis '{weight_col}':")
+    _log(verbose, f"Unique values (first 10): {df[weight_col].unique()[:10]}")
+    _log(verbose, f"Null values: {df[weight_col].isna().sum()}")
 
-    # Filter only the rows with valid numeric values
-    numeric_pattern = r'^[0-9]+\.?[0-9]*$'
-    valid_mask = df[weight_col].str.match(numeric_pattern, na=False)
+    # The weight column is already numeric: only non-negative weights are kept
+    valid_mask = df[weight_col].notna() & (df[weight_col] >= 0)
 
-    print(f"Rows with valid weight: {valid_mask.sum()}/{len(df)}")
+    _log(verbose, f"Rows with valid weight: {valid_mask.sum()}/{len(df)}")
 
     invalid_values = df[~valid_mask][weight_col].unique()[:10]
-    print(f"Invalid values (examples): {invalid_values}")
+    _log(verbose, f"Invalid values (examples): {invalid_values}")
 
     if valid_mask.sum() == 0:
-        print("❌ No valid values found!")
-        print("First 5 errors in the weight column:")
+        _log(verbose, "❌ No valid values found!")
+        _log(verbose, "First 5 errors in the weight column:")
         for i in range(min(5, len(df))):
-            print(f"  Row {i}: '{df[weight_col].iloc[i]}'")
-        exit()
+            _log(verbose, f"  Row {i}: '{df[weight_col].iloc[i]}'")
+        raise ValueError(f"❌ No valid weights found in {input_csv_file_name}")
 
     # Create DataFrame with only valid rows
-    df_valid = df[valid_mask].copy()
-    df_valid[weight_col] = df_valid[weight_col].astype(float)
+    df_valid = df[valid_mask].reset_index(drop=True)
 
-    print(f"\n{'=' * 60}")
-    print("📊 DATA ANALYSIS")
-    print(f"Valid rows: {len(df_valid)}")
-    print(f"Weight sum: {df_valid[weight_col].sum():.2f}%")
+    _log(verbose, f"\n{'=' * 60}")
+    _log(verbose, "📊 DATA ANALYSIS")
+    _log(verbose, f"Valid rows: {len(df_valid)}")
+    _log(verbose, f"Weight sum: {df_valid[weight_col].sum():.2f}%")
 
-    print("\n🏢 TOP 15 SECTORS:")
+    _log(verbose, "\n🏢 TOP 15 SECTORS:")
     sectors = df_valid.groupby(sector_col)[weight_col].sum().sort_values(ascending=False)
     sectors = sectors[sectors > 0]
 
     for i, (sector, perc) in enumerate(sectors.head(15).items(), 1):
-        print(f"{i:2d}. {sector:25s}: {perc:6.2f}%")
+        _log(verbose, f"{i:2d}. {sector:25s}: {perc:6.2f}%")
 
-    print("\n🌍 TOP 15 LOCATIONS:")
+    _log(verbose, "\n🌍 TOP 15 LOCATIONS:")
     locations = df_valid.groupby(location_col)[weight_col].sum().sort_values(ascending=False)
     locations = locations[locations > 0]
 
     for i, (location, perc) in enumerate(locations.head(15).items(), 1):
-        print(f"{i:2d}. {location:25s}: {perc:6.2f}%")
+        _log(verbose, f"{i:2d}. {location:25s}: {perc:6.2f}%")
 
-    print("\n📈 STATS:")
-    print(f"Total number of sectors: {len(sectors)}")
-    print(f"Total number of locations: {len(locations)}")
-    print(f"Top 6 sectors percentage: {sectors.head(6).sum():.2f}%")
-    print(f"Top 6 locations percentage: {locations.head(6).sum():.2f}%")
+    _log(verbose, "\n📈 STATS:")
+    _log(verbose, f"Total number of sectors: {len(sectors)}")
+    _log(verbose, f"Total number of locations: {len(locations)}")
+    _log(verbose, f"Top 6 sectors percentage: {sectors.head(6).sum():.2f}%")
+    _log(verbose, f"Top 6 locations percentage: {locations.head(6).sum():.2f}%")
 
-    print("\n💾 FILES EXPORT:")
-    sectors.to_json(output_json_file_sectors, orient="index", indent=2)
-    locations.to_json(output_json_file_countries, orient="index", indent=2)
-    df_valid.to_csv(output_clean_csv_file_name, index=False)
+    if write_files:
+        _log(verbose, "\n💾 FILES EXPORT:")
+        sectors.to_json(output_json_file_sectors, orient="index", indent=2)
+        locations.to_json(output_json_file_countries, orient="index", indent=2)
+        df_valid.to_csv(output_clean_csv_file_name, index=False)
 
-    print(f"✅ {output_json_file_sectors}        - {len(sectors)} sectors")
-    print(f"✅ {output_json_file_countries}         - {len(locations)} locations ")
-    print(f"✅ {output_clean_csv_file_name}     - {len(df_valid)} clean rows")
+        _log(verbose, f"✅ {output_json_file_sectors}        - {len(sectors)} sectors")
+        _log(verbose, f"✅ {output_json_file_countries}         - {len(locations)} locations ")
+        _log(verbose, f"✅ {output_clean_csv_file_name}     - {len(df_valid)} clean rows")
 
     current_date = datetime.now().strftime(date_and_time_format)
 
@@ -166,12 +198,32 @@ try:
         "top_10_locations": dict(locations.head(10))
     }
 
-    with open(output_json_file_summary, "w") as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    if write_files:
+        with open(output_json_file_summary, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        _log(verbose, f"✅ {output_json_file_summary}      - Analysis summary")
+
+    snapshot_id = None
+    if db_path is not None:
+        normalized = normalize_ishares_holdings(df_valid, etf_isin_prefix, csv_format.as_of_date)
+        snapshot_id = HoldingsDB(db_path).replace_snapshot(etf_isin_prefix, "ishares", normalized,
+                                                           as_of_date=csv_format.as_of_date,
+                                                           fund={"issuer": "ishares"})
+        _log(verbose, f"✅ {db_path}      - snapshot {snapshot_id} ({len(normalized)} holdings)")
+
+    return {"isin": etf_isin_prefix, "as_of_date": csv_format.as_of_date,
+            "clean_csv": output_clean_csv_file_name if write_files else None,
+            "summary": summary, "holdings": df_valid, "snapshot_id": snapshot_id}
+
 
-    print(f"✅ {output_json_file_summary}      - Analysis summary")
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("❌ You have to specify the name of the CSV file as argument")
 
-except Exception as e:
-    print(f"❌ Error: {e}")
+    try:
+        extract_ishares(sys.argv[1])
+    except Exception as e:
+        print(f"❌ Error: {e}")
 
-    traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
@@ -0,0 +1,117 @@
+"""
+Orchestratore multi-emittente.
+
+Ogni emittente ha il proprio pool di thread (dimensionato da plugin.max_workers)
+e il proprio client HTTP con rate limit: gli emittenti procedono in parallelo
+e uno lento non blocca gli altri.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from holdings_schema import empty_holdings
+from issuer_plugins import IssuerPlugin, get_plugin
+
+
+class IssuerOrchestrator:
+    """Esegue i plugin di più emittenti in parallelo."""
+
+    def __init__(self, plugins: Dict[str, IssuerPlugin]):
+        """
+        Args:
+            plugins: Dict nome emittente -> istanza del plugin
+        """
+        self.plugins = plugins
+
+    @classmethod
+    def from_names(cls, names: Iterable[str], **plugin_kwargs) -> "IssuerOrchestrator":
+        """Crea l'orchestratore istanziando i plugin registrati con i nomi indicati."""
+        return cls({name: get_plugin(name, **plugin_kwargs.get(name, {})) for name in names})
+
+    @staticmethod
+    def _process(plugin: IssuerPlugin, isin: str, on_start: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Elabora un singolo ISIN catturando l'eventuale errore."""
+        start = time.perf_counter()
+        try:
+            if on_start:
+                on_start(plugin.name, isin)
+            holdings = plugin.process(isin)
+            return {"issuer": plugin.name, "isin": isin, "status": "ok", "error": None,
+                    "rows": len(holdings), "seconds": time.perf_counter() - start, "holdings": holdings}
+        except Exception as e:
+            return {"issuer": plugin.name, "isin": isin, "status": "error", "error": str(e),
+                    "rows": 0, "seconds": time.perf_counter() - start, "holdings": None}
+
+    def run(self, work: Dict[str, List[str]],
+            on_start: Optional[Callable[[str, str], None]] = None,
+            on_result: Optional[Callable[[Dict], None]] = None) -> Dict[str, List[Dict]]:
+        """
+        Elabora gli ISIN di tutti gli emittenti in parallelo.
+
+        Args:
+            work: Dict nome emittente -> lista di ISIN
+            on_start: Callback (issuer, isin) chiamata prima di elaborare un ISIN
+            on_result: Callback chiamata con ogni risultato appena disponibile
+
+        Returns:
+            Dict nome emittente -> lista dei risultati per ISIN
+            (chiavi: issuer, isin, status, error, rows, seconds, holdings)
+        """
+        unknown = [issuer for issuer in work if issuer not in self.plugins]
+        if unknown:
+            raise KeyError(f"Emittenti senza plugin: {unknown}")
+
+        executors = {
+            issuer: ThreadPoolExecutor(max_workers=self.plugins[issuer].max_workers,
+                                       thread_name_prefix=issuer)
+            for issuer in work
+        }
+        futures: Dict[Future, str] = {}
+        results: Dict[str, List[Dict]] = {issuer: [] for issuer in work}
+
+        try:
+            for issuer, isins in work.items():
+                plugin = self.plugins[issuer]
+                print(f"🧾 {issuer}: {len(isins)} ISIN (max {plugin.max_workers} in parallelo)")
+                for isin in dict.fromkeys(isins):
+                    futures[executors[issuer].submit(self._process, plugin, isin, on_start)] = issuer
+
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]].append(result)
+                if on_result:
+                    on_result(result)
+                if result["status"] == "ok":
+                    print(f"✅ [{result['issuer']}] {result['isin']}: {result['rows']} holdings "
+                          f"({result['seconds']:.2f}s)")
+                else:
+                    print(f"❌ [{result['issuer']}] {result['isin']}: {result['error']}")
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+
+        return results
+
+
+def combine_holdings(results: Dict[str, List[Dict]]) -> pd.DataFrame:
+    """Concatena le holdings normalizzate di tutti i risultati riusciti."""
+    frames = [r["holdings"] for issuer_results in results.values() for r in issuer_results
+              if r["status"] == "ok" and r["holdings"] is not None and not r["holdings"].empty]
+    return pd.concat(frames, ignore_index=True) if frames else empty_holdings()
+
+
+def print_summary(results: Dict[str, List[Dict]], client_stats: Optional[Dict[str, Dict]] = None) -> None:
+    """Stampa un riepilogo per emittente."""
+    print("\n=== RIEPILOGO ===")
+    for issuer, issuer_results in results.items():
+        ok = [r for r in issuer_results if r["status"] == "ok"]
+        failed = [r for r in issuer_results if r["status"] != "ok"]
+        elapsed = sum(r["seconds"] for r in issuer_results)
+        print(f"{issuer}: {len(ok)} completati, {len(failed)} falliti ({elapsed:.2f}s cumulati)")
+        for r in failed:
+            print(f"  - {r['isin']}: {r['error']}")
+        if client_stats and issuer in client_stats:
+            print(f"  HTTP: {client_stats[issuer]}")
@@ -0,0 +1,281 @@
+"""
+Plugin per emittente: ogni emittente implementa download, parsing e normalizzazione.
+
+Per aggiungere un nuovo emittente basta definire una sottoclasse di IssuerPlugin
+e registrarla con il decoratore @register_plugin. L'orchestratore
+(issuer_orchestrator.py) usa i limiti di concorrenza e frequenza dichiarati
+da ciascun plugin.
+"""
+
+import os
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Type
+
+import pandas as pd
+import requests
+
+from extraction_engine import run_in_pool
+from holdings_db import HoldingsDB
+from holdings_schema import empty_holdings, normalize_holdings
+from http_client import HttpClient
+from invesco_data_extractor import latest_as_of, normalize_invesco_holdings, read_invesco_holdings
+from ishares_data_extractor import normalize_ishares_holdings
+from jpmorgan_json_parser import PRODUCT_DATA_URL, stream_fund_data
+from security_master import DEFAULT_DB_PATH as SECURITY_MASTER_DB
+from security_master import SecurityMaster
+from vanguard_data_downloader import VanguardFetcher
+from vanguard_portid_index import VanguardPortIdIndex, fetch_fund_list
+from xtrackers_data_downloader import download_etf_file
+from xtrackers_data_extractor import normalize_xtrackers_holdings
+
+PLUGINS: Dict[str, Type["IssuerPlugin"]] = {}
+
+
+def register_plugin(cls: Type["IssuerPlugin"]) -> Type["IssuerPlugin"]:
+    """Decoratore che registra un plugin con il suo nome."""
+    if not cls.name:
+        raise ValueError(f"Il plugin {cls.__name__} non ha un nome")
+    PLUGINS[cls.name] = cls
+    return cls
+
+
+def get_plugin(name: str, **kwargs) -> "IssuerPlugin":
+    """Crea un'istanza del plugin registrato con il nome indicato."""
+    if name not in PLUGINS:
+        raise KeyError(f"Nessun plugin registrato per l'emittente '{name}'")
+    return PLUGINS[name](**kwargs)
+
+
+def available_plugins() -> List[str]:
+    """Nomi degli emittenti registrati."""
+    return sorted(PLUGINS)
+
+
+def _stream_source(response: requests.Response) -> Any:
+    """
+    Sorgente per il parsing in streaming di una risposta.
+
+    response.raw se il corpo non è ancora stato letto; altrimenti il contenuto già in memoria
+    (risposte ricostruite senza raw o lette per intero, es. FixtureSession in replay/record).
+    """
+    if response.raw is None or response._content_consumed:
+        return response.content
+    response.raw.decode_content = True
+    return response.raw
+
+
+class IssuerPlugin:
+    """
+    Interfaccia comune agli emittenti.
+
+    Attributi di classe:
+        name: Nome dell'emittente (chiave in isin_list.json)
+        max_workers: ISIN elaborati in parallelo per questo emittente
+        requests_per_second: Limite di richieste HTTP verso il sito dell'emittente
+    """
+
+    name = ""
+    max_workers = 2
+    requests_per_second = 1.0
+    headers: Dict[str, str] = {}
+
+    def __init__(self, client: Optional[HttpClient] = None):
+        self.client = client or HttpClient(headers=self.headers,
+                                           requests_per_second=self.requests_per_second)
+
+    def download(self, isin: str) -> Any:
+        """Recupera i dati grezzi dell'ETF (percorso del file o payload)."""
+        raise NotImplementedError
+
+    def parse(self, isin: str, raw: Any) -> Any:
+        """Estrae i dati rilevanti dal formato dell'emittente."""
+        raise NotImplementedError
+
+    def normalize(self, isin: str, parsed: Any) -> pd.DataFrame:
+        """Converte i dati estratti nello schema di holdings_schema.HOLDINGS_COLUMNS."""
+        raise NotImplementedError
+
+    def process(self, isin: str) -> pd.DataFrame:
+        """Esegue in sequenza download, parse e normalize per un ISIN."""
+        raw = self.download(isin)
+        parsed = self.parse(isin, raw)
+        return self.normalize(isin, parsed)
+
+
+@register_plugin
+class IsharesPlugin(IssuerPlugin):
+    """iShares: CSV scaricati manualmente nella cartella input."""
+
+    name = "ishares"
+    max_workers = 4
+    input_folder = "input"
+    output_folder = "output"
+
+    def __init__(self, client: Optional[HttpClient] = None, pool: Optional[Executor] = None):
+        """
+        Args:
+            client: Client HTTP dedicato
+            pool: Pool di processi per il parsing (extraction_engine.create_pool); None = nel thread
+        """
+        super().__init__(client)
+        self.pool = pool
+
+    def download(self, isin: str) -> str:
+        path = os.path.join(self.input_folder, f"{isin}.csv")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"❌ File iShares non trovato: {path}")
+        return path
+
+    def parse(self, isin: str, raw: str) -> Dict:
+        # Le holdings normalizzate finiscono nel dataset colonnare (holdings_dataset.py), non nei file per ETF
+        return run_in_pool(self.pool, self.name, isin, {"input_base": self.input_folder,
+                                                        "output_base": self.output_folder, "write_files": False})
+
+    def normalize(self, isin: str, parsed: Dict) -> pd.DataFrame:
+        # La data di riferimento è nel preambolo del CSV, letta insieme al formato
+        return normalize_ishares_holdings(parsed["holdings"], isin, parsed["as_of_date"])
+
+
+@register_plugin
+class XtrackersPlugin(IssuerPlugin):
+    """Xtrackers: XLSX scaricabile direttamente a partire dall'ISIN."""
+
+    name = "xtrackers"
+    max_workers = 2
+    requests_per_second = 0.5
+    input_folder = os.path.join("input", "xtrackers")
+    output_folder = os.path.join("output", "xtrackers")
+
+    def __init__(self, client: Optional[HttpClient] = None, refresh: bool = False,
+                 pool: Optional[Executor] = None):
+        """
+        Args:
+            client: Client HTTP dedicato
+            refresh: Se True riscarica il file anche se già presente in input
+            pool: Pool di processi per il parsing (extraction_engine.create_pool); None = nel thread
+        """
+        super().__init__(client)
+        self.refresh = refresh
+        self.pool = pool
+
+    def download(self, isin: str) -> str:
+        path = os.path.join(self.input_folder, f"{isin}.xlsx")
+        if os.path.exists(path) and not self.refresh:
+            return path
+        return download_etf_file(isin, self.input_folder, self.client)
+
+    def parse(self, isin: str, raw: str) -> Dict:
+        return run_in_pool(self.pool, self.name, isin, {"input_base": self.input_folder,
+                                                        "output_base": self.output_folder,
+                                                        "write_files": False})
+
+    def normalize(self, isin: str, parsed: Dict) -> pd.DataFrame:
+        # L'XLSX non ha una data di riferimento: si usa quella del download del file
+        return normalize_xtrackers_holdings(parsed["holdings"], isin, parsed["as_of_date"])
+
+
+@register_plugin
+class JPMorganPlugin(IssuerPlugin):
+    """JPMorgan: JSON completo del fondo dall'endpoint product-data."""
+
+    name = "jpmorgan"
+    max_workers = 2
+
+    def download(self, isin: str) -> requests.Response:
+        # Risposta non ancora letta: il JSON viene consumato a blocchi in parse
+        return self.client.get(PRODUCT_DATA_URL.format(isin=isin), stream=True)
+
+    def parse(self, isin: str, raw: requests.Response) -> Dict:
+        try:
+            return stream_fund_data(_stream_source(raw))
+        finally:
+            raw.close()
+
+    def normalize(self, isin: str, parsed: Dict) -> pd.DataFrame:
+        column_map = {"name": "securityDescription", "ticker": "ticker", "isin": "isin",
+                      "country": "country", "weight": "marketValuePercent", "market_value": "marketValue"}
+        return normalize_holdings(parsed["holdings"], column_map, etf_isin=isin,
+                                  issuer=self.name, as_of_date=parsed["as_of_date"])
+
+
+@register_plugin
+class InvescoPlugin(IssuerPlugin):
+    """
+    Invesco: holdings dell'indice dalle API dng-api (formato di invesco_list.json).
+
+    Con holdings_db la lettura si ferma a effectiveDate se la data non è più recente
+    dell'ultima fotografia 'invesco' del fondo: il risultato sono holdings vuote.
+    """
+
+    name = "invesco"
+    max_workers = 2
+    holdings_url = ("https://dng-api.invesco.com/cache/v1/accounts/it_IT/shareclasses/"
+                    "{isin}/holdings/index?idType=isin")
+
+    def __init__(self, client: Optional[HttpClient] = None, security_master: Optional[SecurityMaster] = None,
+                 security_master_path: str = SECURITY_MASTER_DB, holdings_db: Optional[HoldingsDB] = None):
+        super().__init__(client)
+        self.security_master_path = security_master_path
+        self._security_master = security_master
+        self.holdings_db = holdings_db
+
+    @property
+    def security_master(self) -> SecurityMaster:
+        if self._security_master is None:
+            self._security_master = SecurityMaster(self.security_master_path)
+        return self._security_master
+
+    def download(self, isin: str) -> requests.Response:
+        # Risposta non ancora letta: le holdings vengono consumate a blocchi in parse
+        return self.client.get(self.holdings_url.format(isin=isin), stream=True)
+
+    def parse(self, isin: str, raw: requests.Response) -> Dict:
+        known_as_of = latest_as_of(self.holdings_db, isin) if self.holdings_db is not None else None
+        try:
+            return read_invesco_holdings(_stream_source(raw), known_as_of)
+        finally:
+            raw.close()
+
+    def normalize(self, isin: str, parsed: Dict) -> pd.DataFrame:
+        if parsed["skipped"]:
+            return empty_holdings()
+        return normalize_invesco_holdings(parsed["holdings"], isin, parsed["as_of_date"], self.security_master)
+
+
+# Non registrato: lo schema della sezione holdings (borHoldings) non è verificato e ogni ISIN
+# costerebbe una richiesta GraphQL a sé. Va registrato quando lo schema è confermato da una
+# risposta registrata; fino ad allora è utilizzabile solo istanziandolo direttamente.
+class VanguardPlugin(IssuerPlugin):
+    """Vanguard: endpoint GraphQL con risoluzione ISIN -> portId."""
+
+    name = "vanguard"
+    max_workers = 1
+    requests_per_second = 0.5
+
+    def __init__(self, client: Optional[HttpClient] = None, index_db_path: str = "vanguard_portids.db"):
+        super().__init__(client)
+        self.index_db_path = index_db_path
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = VanguardPortIdIndex(self.index_db_path,
+                                              fetch_func=lambda: fetch_fund_list(self.client))
+        return self._index
+
+    def download(self, isin: str) -> Dict[str, pd.DataFrame]:
+        fetcher = VanguardFetcher(session=self.client, sections=("holdings",))
+        return fetcher.fetch_isins([isin], self.index)
+
+    def parse(self, isin: str, raw: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        holdings = raw["holdings"]
+        if holdings.empty:
+            raise ValueError(f"❌ Nessuna holding Vanguard per {isin}")
+        return holdings
+
+    def normalize(self, isin: str, parsed: pd.DataFrame) -> pd.DataFrame:
+        column_map = {"name": "securityLongDescription", "ticker": "ticker", "sector": "gicsSectorDescription",
+                      "country": "bloombergIsoCountry", "weight": "marketValuePercentage",
+                      "market_value": "marketValueBaseCurrency", "as_of_date": "asOfDate"}
+        return normalize_holdings(parsed, column_map, etf_isin=isin, issuer=self.name)
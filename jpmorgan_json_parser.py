@@ -1,52 +1,114 @@
-import json
-from pprint import pprint  # per stampe più leggibili
+"""
+Estrazione di settori, regioni e holdings dal JSON product-data JPMorgan.
 
-with open("jpmorgan_example.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+Il JSON di un fondo contiene centinaia di sezioni (1,2 MB nell'esempio): qui
+ne servono solo tre, emeaSectorBreakdown, emeaRegionalBreakdown e
+dailyHoldingsAll. stream_fund_data legge il documento in streaming
+(json_stream.py) decodificando solo quei sottoalberi, un elemento alla volta,
+e restituisce le holdings già in colonne.
+"""
 
-fund_data = data["fundData"]
+import sys
+from typing import Dict, List, Optional
 
-# --- Parsing settori ---
-sectors = [
-    {
-        "name": item["name"],
-        "value": item["value"],
-        "secondaryValue": item["secondaryValue"],
-        "tertiaryValue": item["tertiaryValue"]
-    }
-    for item in fund_data["emeaSectorBreakdown"]["data"]
-]
-
-# --- Parsing regioni ---
-regions = [
-    {
-        "name": item["name"],
-        "value": item["value"],
-        "secondaryValue": item["secondaryValue"],
-        "tertiaryValue": item["tertiaryValue"]
-    }
-    for item in fund_data["emeaRegionalBreakdown"]["data"]
-]
-
-# --- Parsing holdings ---
-holdings = [
-    {
-        "securityDescription": item["securityDescription"],
-        "ticker": item["securityTicker"],
-        "isin": item["securityIsin"],
-        "country": item["country"],
-        "marketValue": item["marketValue"],
-        "marketValuePercent": item["marketValuePercent"]
+import pandas as pd
+
+from json_stream import Source, iter_items
+
+# Endpoint con tutti i dati di un fondo (vedi README)
+PRODUCT_DATA_URL = (
+    "https://am.jpmorgan.com/FundsMarketingHandler/product-data"
+    "?cusip={isin}&country=it&role=per&language=it&userLoggedIn=false&version=8.15_1755008531"
+)
+
+SECTORS_PREFIX = "fundData.emeaSectorBreakdown.data.item"
+REGIONS_PREFIX = "fundData.emeaRegionalBreakdown.data.item"
+HOLDINGS_PREFIX = "fundData.dailyHoldingsAll.data.item"
+AS_OF_PREFIX = "fundData.dailyHoldingsAll.effectiveDate"
+
+BREAKDOWN_FIELDS = ["name", "value", "secondaryValue", "tertiaryValue"]
+
+# Colonna delle holdings -> campo del JSON
+HOLDING_FIELDS = {
+    "securityDescription": "securityDescription",
+    "ticker": "securityTicker",
+    "isin": "securityIsin",
+    "country": "country",
+    "marketValue": "marketValue",
+    "marketValuePercent": "marketValuePercent",
+}
+NUMERIC_HOLDING_COLUMNS = ["marketValue", "marketValuePercent"]
+
+
+def _holdings_frame(columns: Dict[str, List]) -> pd.DataFrame:
+    df = pd.DataFrame(columns, columns=list(HOLDING_FIELDS))
+    for column in NUMERIC_HOLDING_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    return df
+
+
+def _breakdown_item(item: Dict) -> Dict:
+    return {field: item.get(field) for field in BREAKDOWN_FIELDS}
+
+
+def stream_fund_data(source: Source) -> Dict:
+    """
+    Legge in streaming settori, regioni, holdings e data di riferimento di un fondo.
+
+    Args:
+        source: Percorso del file JSON, contenuto (bytes) o file aperto (es. response.raw)
+
+    Returns:
+        Dict con sectors e regions (liste di dict), holdings (DataFrame con le colonne di
+        HOLDING_FIELDS) e as_of_date (stringa o None)
+    """
+    sectors, regions = [], []
+    holdings: Dict[str, List] = {column: [] for column in HOLDING_FIELDS}
+    as_of_date: Optional[str] = None
+
+    for prefix, value in iter_items(source, [SECTORS_PREFIX, REGIONS_PREFIX, HOLDINGS_PREFIX, AS_OF_PREFIX]):
+        if prefix == HOLDINGS_PREFIX:
+            # Ogni holding viene ridotta subito alle colonne necessarie
+            for column, field in HOLDING_FIELDS.items():
+                holdings[column].append(value.get(field))
+        elif prefix == SECTORS_PREFIX:
+            sectors.append(_breakdown_item(value))
+        elif prefix == REGIONS_PREFIX:
+            regions.append(_breakdown_item(value))
+        else:
+            as_of_date = value
+
+    return {"sectors": sectors, "regions": regions, "holdings": _holdings_frame(holdings), "as_of_date": as_of_date}
+
+
+def parse_fund_data(data: Dict) -> Dict:
+    """Come stream_fund_data, per un JSON già decodificato."""
+    fund_data = data["fundData"]
+    items = fund_data["dailyHoldingsAll"]["data"]
+    return {
+        "sectors": [_breakdown_item(item) for item in fund_data["emeaSectorBreakdown"]["data"]],
+        "regions": [_breakdown_item(item) for item in fund_data["emeaRegionalBreakdown"]["data"]],
+        "holdings": _holdings_frame({column: [item.get(field) for item in items]
+                                     for column, field in HOLDING_FIELDS.items()}),
+        "as_of_date": fund_data["dailyHoldingsAll"].get("effectiveDate"),
     }
-    for item in fund_data["dailyHoldingsAll"]["data"]
-]
 
-# --- Stampa ---
-print("\n\n\n\n\n📊 SETTORI")
-pprint(sectors)
 
-print("\n\n\n\n\n🌍 REGIONI")
-pprint(regions)
+def main(path: str = "jpmorgan_example.json") -> None:
+    parsed = stream_fund_data(path)
+
+    print(f"\n📅 Holdings al {parsed['as_of_date']}")
+
+    print("\n📊 SETTORI")
+    print(pd.DataFrame(parsed["sectors"]).to_string(index=False))
+
+    print("\n🌍 REGIONI")
+    print(pd.DataFrame(parsed["regions"]).to_string(index=False))
+
+    holdings = parsed["holdings"]
+    print(f"\n💼 HOLDINGS: {len(holdings)} titoli, peso totale {holdings['marketValuePercent'].sum():.2f}%")
+    print(holdings.head(15).to_string(index=False))
+
 
-print("\n\n\n\n\n💼 HOLDINGS")
-pprint(holdings)
\ No newline at end of file
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
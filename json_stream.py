@@ -0,0 +1,225 @@
+"""
+Lettura in streaming di documenti JSON: solo i sottoalberi richiesti.
+
+iter_items scorre il documento una volta, a blocchi, e restituisce i valori
+che si trovano ai prefissi indicati (stessa notazione di ijson:
+'fundData.dailyHoldingsAll.data.item' per ogni elemento di una lista).
+Tutto il resto viene saltato senza costruire oggetti Python, e la memoria
+occupata resta quella di un blocco più il valore corrente.
+
+Con ijson installato viene usato il suo parser (più veloce sui documenti
+molto grandi); altrimenti uno scanner in puro Python che salta i sottoalberi
+inutili con espressioni regolari e decodifica i valori richiesti con
+json.JSONDecoder.raw_decode.
+"""
+
+import codecs
+import importlib.util
+import io
+import json
+import re
+from typing import IO, Any, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# ijson è opzionale: senza, viene usato lo scanner in puro Python
+IJSON_AVAILABLE = importlib.util.find_spec("ijson") is not None
+if IJSON_AVAILABLE:
+    import ijson
+
+CHUNK_SIZE = 64 * 1024
+
+Source = Union[str, bytes, IO]
+
+_WHITESPACE = re.compile(r"[\s,:]*")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+# Token strutturali di un valore da saltare: stringhe intere, parentesi o un apice non ancora chiuso
+_SKIP_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{}]', re.DOTALL)
+_SCALAR = re.compile(r"[^\s,\]}]+")
+_DECODER = json.JSONDecoder()
+
+
+def _open(source: Source) -> Tuple[IO, bool]:
+    """File da leggere e True se va chiuso al termine."""
+    if isinstance(source, bytes):
+        return io.BytesIO(source), True
+    if isinstance(source, str):
+        return open(source, "rb"), True
+    return source, False
+
+
+class _Scanner:
+    """Buffer di testo riempito a blocchi da un file (binario UTF-8 o testo)."""
+
+    def __init__(self, stream: IO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: Optional[int] = None) -> bool:
+        """Aggiunge un blocco al buffer scartando la parte già letta; False a fine file."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(size or self.chunk_size)
+        if isinstance(chunk, bytes):
+            text = self.decoder.decode(chunk, final=not chunk)
+        else:
+            text = chunk
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """Primo carattere significativo (salta spazi, virgole e due punti); '' a fine documento."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def read_string(self) -> str:
+        while True:
+            match = _STRING.match(self.buffer, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return json.loads(match.group())
+            if not self.fill():
+                raise ValueError("❌ JSON troncato: stringa non terminata")
+
+    def read_value(self) -> Any:
+        """Decodifica il valore che inizia alla posizione corrente."""
+        if self.buffer[self.pos] not in '"[{':
+            # Numero o costante: va letto per intero, potrebbe continuare nel blocco successivo
+            while True:
+                match = _SCALAR.match(self.buffer, self.pos)
+                if match.end() < len(self.buffer) or not self.fill():
+                    self.pos = match.end()
+                    return json.loads(match.group())
+
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+                self.pos = end
+                return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Valore più lungo del buffer: blocchi via via più grandi per evitare riletture quadratiche
+            self.fill(size)
+            size *= 2
+
+    def skip_value(self) -> None:
+        """Salta il valore corrente senza costruire oggetti."""
+        first = self.buffer[self.pos]
+        if first == '"':
+            self.read_string()
+            return
+        if first not in "[{":
+            while True:
+                match = _SCALAR.match(self.buffer, self.pos)
+                if match.end() < len(self.buffer) or not self.fill():
+                    self.pos = match.end()
+                    return
+
+        depth = 0
+        while True:
+            for match in _SKIP_TOKEN.finditer(self.buffer, self.pos):
+                token = match.group()
+                if token == '"':
+                    # Stringa spezzata tra due blocchi: si riparte dall'apice dopo il refill
+                    self.pos = match.start()
+                    break
+                self.pos = match.end()
+                if token in "[{":
+                    depth += 1
+                elif token in "]}":
+                    depth -= 1
+                    if depth == 0:
+                        return
+            else:
+                self.pos = len(self.buffer)
+            if not self.fill():
+                raise ValueError("❌ JSON troncato: struttura non chiusa")
+
+
+def _targets_and_parents(prefixes: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    targets = set(prefixes)
+    parents = {""}
+    for prefix in targets:
+        parts = prefix.split(".")
+        parents.update(".".join(parts[:i]) for i in range(1, len(parts)))
+    return targets, parents
+
+
+def _iter_items_python(stream: IO, prefixes: Iterable[str], chunk_size: int) -> Iterator[Tuple[str, Any]]:
+    targets, parents = _targets_and_parents(prefixes)
+    scanner = _Scanner(stream, chunk_size)
+
+    def walk(prefix: str) -> Iterator[Tuple[str, Any]]:
+        char = scanner.peek()
+        if prefix in targets:
+            yield prefix, scanner.read_value()
+        elif prefix in parents and char == "{":
+            scanner.pos += 1
+            while scanner.peek() != "}":
+                key = scanner.read_string()
+                scanner.peek()
+                yield from walk(f"{prefix}.{key}" if prefix else key)
+            scanner.pos += 1
+        elif prefix in parents and char == "[":
+            scanner.pos += 1
+            item = f"{prefix}.item" if prefix else "item"
+            while scanner.peek() != "]":
+                yield from walk(item)
+            scanner.pos += 1
+        elif char:
+            scanner.skip_value()
+
+    yield from walk("")
+
+
+def _iter_items_ijson(stream: IO, prefixes: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    targets = set(prefixes)
+    builder, current = None, None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == current and event in ("end_map", "end_array"):
+                yield current, builder.value
+                builder = None
+        elif prefix in targets and event in ("start_map", "start_array"):
+            builder, current = ijson.ObjectBuilder(), prefix
+            builder.event(event, value)
+        elif prefix in targets and event not in ("map_key", "end_map", "end_array"):
+            yield prefix, value
+
+
+def iter_items(source: Source, prefixes: Iterable[str], chunk_size: int = CHUNK_SIZE,
+               use_ijson: Optional[bool] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Valori ai prefissi indicati, nell'ordine in cui compaiono nel documento.
+
+    Args:
+        source: Percorso del file, contenuto (bytes) o file aperto (binario o testo)
+        prefixes: Prefissi in notazione ijson (es. 'fundData.dailyHoldingsAll.data.item')
+        chunk_size: Dimensione dei blocchi letti dal file
+        use_ijson: Forza (True) o esclude (False) ijson; None = ijson se installato
+
+    Returns:
+        Iteratore di (prefisso, valore); un valore richiesto non contiene mai un altro prefisso richiesto
+    """
+    prefixes: List[str] = list(prefixes)
+    stream, close = _open(source)
+    try:
+        if (IJSON_AVAILABLE if use_ijson is None else use_ijson) and not isinstance(stream, io.TextIOBase):
+            yield from _iter_items_ijson(stream, prefixes)
+        else:
+            yield from _iter_items_python(stream, prefixes, chunk_size)
+    finally:
+        if close:
+            stream.close()
@@ -0,0 +1,231 @@
+"""
+Quotazioni e metadati di più ticker con richieste multi-simbolo a Yahoo Finance.
+
+Al posto di una chiamata yfinance per ticker, i simboli vengono raggruppati:
+l'endpoint quote restituisce i metadati di decine di simboli per richiesta,
+l'endpoint spark lo storico dei prezzi giornalieri. I risultati sono in cache
+con scadenza (cache_manager) e lo storico è memorizzato per colonne
+(giorni dall'epoch + prezzi di chiusura) invece che come lista di record.
+
+L'endpoint quote richiede dal 2023 un cookie di sessione Yahoo e il relativo
+"crumb": il cookie si ottiene da fc.yahoo.com, il crumb da getcrumb con lo
+stesso cookie; entrambi vengono richiesti alla prima quotazione e rinnovati
+se Yahoo risponde 401.
+
+Per registrare le risposte o rileggerle senza accesso alla rete si passa un
+client con FixtureSession (http_fixtures): anche cookie e crumb vengono
+registrati, quindi in riproduzione le richieste quote hanno lo stesso URL.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+from cache_manager import CacheManager
+from http_client import HttpClient
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+SPARK_URL = "https://query1.finance.yahoo.com/v7/finance/spark"
+# Handshake per l'endpoint quote: cookie di sessione, poi crumb legato al cookie
+COOKIE_URL = "https://fc.yahoo.com"
+CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+
+QUOTE_BATCH_SIZE = 50
+SPARK_BATCH_SIZE = 20
+
+QUOTE_FIELDS = [
+    "symbol", "longName", "shortName", "currency", "exchange", "quoteType",
+    "regularMarketPrice", "regularMarketTime", "marketCap", "trailingAnnualDividendYield",
+    "fiftyTwoWeekLow", "fiftyTwoWeekHigh",
+]
+
+DEFAULT_QUOTE_TTL_SECONDS = 15 * 60
+DEFAULT_HISTORY_TTL_SECONDS = 12 * 3600
+
+SECONDS_PER_DAY = 86400
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_quote_response(data: Dict) -> Dict[str, Dict]:
+    """Estrae i campi di QUOTE_FIELDS per ogni simbolo di una risposta quote."""
+    results = (data.get("quoteResponse") or {}).get("result") or []
+    return {item["symbol"]: {field: item.get(field) for field in QUOTE_FIELDS}
+            for item in results if item.get("symbol")}
+
+
+def parse_spark_response(data: Dict) -> Dict[str, Dict[str, List]]:
+    """
+    Converte una risposta spark in storici per colonne.
+
+    Supporta sia il formato v7 ({'spark': {'result': [...]}}) sia quello v8
+    ({'AAPL': {'timestamp': [...], 'close': [...]}}).
+
+    Returns:
+        Dict simbolo -> {'day': [giorni dall'epoch], 'close': [prezzi]}
+    """
+    series = {}
+    if "spark" in data:
+        for item in (data["spark"] or {}).get("result") or []:
+            response = (item.get("response") or [{}])[0]
+            quote = ((response.get("indicators") or {}).get("quote") or [{}])[0]
+            series[item["symbol"]] = (response.get("timestamp") or [], quote.get("close") or [])
+    else:
+        for symbol, item in data.items():
+            if isinstance(item, dict):
+                series[symbol] = (item.get("timestamp") or [], item.get("close") or [])
+
+    history = {}
+    for symbol, (timestamps, closes) in series.items():
+        # Date e prezzi possono avere lunghezze diverse: si tengono solo le coppie complete
+        size = min(len(timestamps), len(closes))
+        days = np.asarray(timestamps[:size], dtype=np.int64) // SECONDS_PER_DAY
+        close = np.asarray([np.nan if c is None else c for c in closes[:size]], dtype=np.float64)
+        valid = ~np.isnan(close)
+        history[symbol] = {"day": days[valid].tolist(), "close": close[valid].tolist()}
+    return history
+
+
+class MarketData:
+    """Recupero in blocco di quotazioni e storici con cache a scadenza."""
+
+    def __init__(self, cache: Optional[CacheManager] = None,
+                 client: Optional[HttpClient] = None,
+                 quote_ttl_seconds: float = DEFAULT_QUOTE_TTL_SECONDS,
+                 history_ttl_seconds: float = DEFAULT_HISTORY_TTL_SECONDS,
+                 quote_url: str = QUOTE_URL,
+                 spark_url: str = SPARK_URL):
+        """
+        Args:
+            cache: Cache dei risultati (default: cache in memoria)
+            client: Client HTTP (default: 2 richieste al secondo); con FixtureSession
+                registra o riproduce le risposte
+            quote_ttl_seconds: Validità dei metadati in cache
+            history_ttl_seconds: Validità degli storici in cache
+            quote_url: Endpoint quote
+            spark_url: Endpoint spark
+        """
+        self.cache = cache or CacheManager()
+        self.client = client or HttpClient(requests_per_second=2)
+        self.quote_ttl_seconds = quote_ttl_seconds
+        self.history_ttl_seconds = history_ttl_seconds
+        self.quote_url = quote_url
+        self.spark_url = spark_url
+        self.stats = {"requests": 0, "cache_hits": 0}
+        self._crumb: Optional[str] = None
+
+    # === TRASPORTO ===
+
+    def _get_crumb(self) -> str:
+        """Crumb Yahoo della sessione, ottenuto al primo uso (cookie da fc.yahoo.com, poi getcrumb)."""
+        if self._crumb is None:
+            try:
+                # fc.yahoo.com risponde 404 ma imposta comunque il cookie di sessione
+                self.client.get(COOKIE_URL, allow_redirects=True)
+            except requests.exceptions.HTTPError:
+                pass
+            crumb = self.client.get(CRUMB_URL).text.strip()
+            if not crumb or "<" in crumb:
+                raise ValueError("❌ Crumb Yahoo non ottenuto: cookie di sessione mancante")
+            self._crumb = crumb
+        return self._crumb
+
+    def _get_json(self, url: str, params: Dict, crumb: bool = False) -> Dict:
+        """
+        Esegue una richiesta e restituisce il JSON.
+
+        Con crumb=True la richiesta porta il crumb della sessione e, se Yahoo risponde 401,
+        viene ripetuta una volta con un crumb nuovo.
+        """
+        self.stats["requests"] += 1
+        if crumb:
+            try:
+                response = self.client.get(url, params={**params, "crumb": self._get_crumb()})
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 401:
+                    raise
+                # Crumb scaduto: nuova sessione e un solo nuovo tentativo
+                self._crumb = None
+                response = self.client.get(url, params={**params, "crumb": self._get_crumb()})
+        else:
+            response = self.client.get(url, params=params)
+        return response.json()
+
+    def _cached(self, prefix: str, symbols: List[str], ttl: float) -> Dict[str, Dict]:
+        found = self.cache.get_many_with_info(f"{prefix}:{symbol}" for symbol in symbols)
+        fresh = {key[len(prefix) + 1:]: info["value"] for key, info in found.items()
+                 if info["age_seconds"] <= ttl}
+        self.stats["cache_hits"] += len(fresh)
+        return fresh
+
+    # === API ===
+
+    def quotes(self, symbols: Iterable[str]) -> pd.DataFrame:
+        """
+        Metadati e ultima quotazione di più simboli.
+
+        Returns:
+            DataFrame indicizzato per simbolo con le colonne di QUOTE_FIELDS
+            (i simboli sconosciuti a Yahoo non compaiono)
+        """
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        results = self._cached("quote", symbols, self.quote_ttl_seconds)
+
+        misses = [s for s in symbols if s not in results]
+        for chunk in _chunks(misses, QUOTE_BATCH_SIZE):
+            data = self._get_json(self.quote_url, {"symbols": ",".join(chunk)}, crumb=True)
+            fetched = parse_quote_response(data)
+            self.cache.set_many({f"quote:{symbol}": value for symbol, value in fetched.items()})
+            results.update(fetched)
+
+        rows = [results[s] for s in symbols if s in results]
+        return pd.DataFrame(rows, columns=QUOTE_FIELDS).set_index("symbol")
+
+    def history_columns(self, symbols: Iterable[str], range_: str = "1mo",
+                        interval: str = "1d") -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Storico dei prezzi di chiusura per colonne.
+
+        Returns:
+            Dict simbolo -> {'day': array int32 dei giorni dall'epoch, 'close': array float64}
+        """
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        prefix = f"history:{range_}:{interval}"
+        results = self._cached(prefix, symbols, self.history_ttl_seconds)
+
+        misses = [s for s in symbols if s not in results]
+        for chunk in _chunks(misses, SPARK_BATCH_SIZE):
+            params = {"symbols": ",".join(chunk), "range": range_, "interval": interval}
+            fetched = parse_spark_response(self._get_json(self.spark_url, params))
+            self.cache.set_many({f"{prefix}:{symbol}": value for symbol, value in fetched.items()})
+            results.update(fetched)
+
+        return {
+            s: {"day": np.asarray(results[s]["day"], dtype=np.int32),
+                "close": np.asarray(results[s]["close"], dtype=np.float64)}
+            for s in symbols if s in results
+        }
+
+    def history(self, symbols: Iterable[str], range_: str = "1mo", interval: str = "1d") -> pd.DataFrame:
+        """
+        Storico dei prezzi di chiusura come tabella data x simbolo.
+
+        Returns:
+            DataFrame con indice di date e una colonna per simbolo
+        """
+        columns = self.history_columns(symbols, range_, interval)
+        series = {
+            symbol: pd.Series(data["close"],
+                              index=pd.to_datetime(data["day"].astype(np.int64) * SECONDS_PER_DAY, unit="s"))
+            for symbol, data in columns.items()
+        }
+        if not series:
+            return pd.DataFrame()
+        frame = pd.DataFrame(series)
+        frame.index.name = "date"
+        return frame
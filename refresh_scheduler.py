@@ -0,0 +1,283 @@
+"""
+Scheduler di aggiornamento incrementale basato sulla freschezza dei dati.
+
+Per ogni fondo viene memorizzata la data di riferimento (as-of) dell'ultimo
+dato scaricato. Conoscendo la cadenza di pubblicazione di ciascun emittente
+si stima quando sarà disponibile il dato successivo: ad ogni esecuzione
+vengono elaborati solo i fondi per cui è probabile che ci siano dati nuovi,
+in ordine di priorità (i più vecchi prima).
+"""
+
+import csv
+import heapq
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Cadenza di pubblicazione attesa per emittente (giorni)
+ISSUER_CADENCE_DAYS: Dict[str, float] = {
+    "ishares": 1,
+    "xtrackers": 1,
+    "jpmorgan": 1,
+    "invesco": 1,
+    "vanguard": 30,
+    "extraetf": 7,
+}
+DEFAULT_CADENCE_DAYS = 7
+
+# Dopo la data prevista, se il dato non cambia, i controlli si diradano fino a questo limite
+MAX_BACKOFF_DAYS = 7
+
+# Un fondo è considerato da aggiornare anche se manca meno di questo margine alla scadenza,
+# così un'esecuzione giornaliera non salta un giorno per pochi secondi
+DUE_TOLERANCE_SECONDS = 3600
+
+_ITALIAN_MONTHS = {
+    "gen": "Jan", "feb": "Feb", "mar": "Mar", "apr": "Apr", "mag": "May", "giu": "Jun",
+    "lug": "Jul", "ago": "Aug", "set": "Sep", "ott": "Oct", "nov": "Nov", "dic": "Dec",
+}
+
+
+def parse_as_of_date(value: Optional[str]) -> Optional[date]:
+    """
+    Converte le date usate dagli emittenti in oggetti date.
+
+    Formati supportati: '2025-08-21', '20/08/2025', '20/Aug/2025', '20/ago/2025'.
+    """
+    if not value:
+        return None
+    value = str(value).strip().strip('"')
+    month = re.search(r"/([A-Za-z]{3})/", value)
+    if month and month.group(1).lower() in _ITALIAN_MONTHS:
+        value = value.replace(month.group(1), _ITALIAN_MONTHS[month.group(1).lower()])
+
+    value = value.split("T")[0].split(" ")[0]
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%b/%Y", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def read_ishares_as_of(path: str) -> Optional[date]:
+    """Legge la data dalla prima riga di un CSV iShares (es. 'Al,"20/08/2025"')."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        first_row = next(csv.reader([f.readline()]), [])
+    return parse_as_of_date(first_row[1]) if len(first_row) > 1 else None
+
+
+def read_invesco_as_of(data: Dict) -> Optional[date]:
+    """Legge effectiveDate da un payload Invesco (formato di invesco_list.json)."""
+    return parse_as_of_date(data.get("effectiveDate"))
+
+
+def read_jpmorgan_as_of(data: Dict) -> Optional[date]:
+    """Legge la data delle holdings giornaliere da un payload JPMorgan."""
+    holdings = (data.get("fundData") or {}).get("dailyHoldingsAll") or {}
+    return parse_as_of_date(holdings.get("effectiveDate"))
+
+
+def read_extraetf_as_of(data: Dict) -> Optional[date]:
+    """Legge index_date_last_update dal portfolio_breakdown di una risposta ExtraETF."""
+    results = data.get("results") or []
+    if not results:
+        return None
+    breakdown = results[0].get("portfolio_breakdown") or {}
+    return parse_as_of_date(breakdown.get("index_date_last_update"))
+
+
+def read_json_as_of(path: str, issuer: str) -> Optional[date]:
+    """Legge la data di riferimento da un file JSON salvato per l'emittente indicato."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    readers = {"invesco": read_invesco_as_of, "jpmorgan": read_jpmorgan_as_of, "extraetf": read_extraetf_as_of}
+    return readers[issuer](data)
+
+
+class FreshnessScheduler:
+    """Stato di freschezza dei fondi su SQLite e coda di priorità dei fondi da aggiornare."""
+
+    def __init__(self, db_path: str = "refresh_state.db",
+                 cadence_days: Optional[Dict[str, float]] = None,
+                 max_backoff_days: float = MAX_BACKOFF_DAYS):
+        """
+        Args:
+            db_path: Percorso del database SQLite
+            cadence_days: Cadenza di pubblicazione per emittente (default ISSUER_CADENCE_DAYS)
+            max_backoff_days: Intervallo massimo tra due controlli senza novità
+        """
+        self.db_path = Path(db_path)
+        self.cadence_days = {**ISSUER_CADENCE_DAYS, **(cadence_days or {})}
+        self.max_backoff_days = max_backoff_days
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fund_freshness (
+                    issuer TEXT NOT NULL,
+                    isin TEXT NOT NULL,
+                    as_of_date TEXT,
+                    last_checked REAL,
+                    last_changed REAL,
+                    unchanged_checks INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (issuer, isin)
+                )
+            """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def cadence_seconds(self, issuer: str) -> float:
+        return self.cadence_days.get(issuer, DEFAULT_CADENCE_DAYS) * 86400
+
+    def register(self, issuer: str, isins: Iterable[str]) -> None:
+        """Aggiunge fondi mai visti (saranno elaborati alla prima esecuzione)."""
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO fund_freshness (issuer, isin) VALUES (?, ?)",
+                    [(issuer, isin) for isin in isins]
+                )
+
+    def record(self, issuer: str, isin: str, as_of_date: Optional[date], checked_at: Optional[float] = None) -> bool:
+        """
+        Registra l'esito di un controllo.
+
+        Args:
+            issuer: Emittente
+            isin: ISIN del fondo
+            as_of_date: Data di riferimento dei dati appena scaricati (None se sconosciuta)
+            checked_at: Timestamp del controllo (default: ora)
+
+        Returns:
+            True se la data è cambiata rispetto al controllo precedente
+        """
+        checked_at = checked_at or time.time()
+        new_value = as_of_date.isoformat() if as_of_date else None
+
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT as_of_date, unchanged_checks FROM fund_freshness WHERE issuer = ? AND isin = ?",
+                    (issuer, isin)
+                ).fetchone()
+                previous = row[0] if row else None
+                changed = new_value is not None and new_value != previous
+                unchanged_checks = 0 if changed or not row else row[1] + 1
+
+                conn.execute("""
+                    INSERT INTO fund_freshness (issuer, isin, as_of_date, last_checked, last_changed, unchanged_checks)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(issuer, isin) DO UPDATE SET
+                        as_of_date = COALESCE(excluded.as_of_date, as_of_date),
+                        last_checked = excluded.last_checked,
+                        last_changed = CASE WHEN ? THEN excluded.last_checked ELSE last_changed END,
+                        unchanged_checks = excluded.unchanged_checks
+                """, (issuer, isin, new_value, checked_at, checked_at if changed else None,
+                      unchanged_checks, changed))
+        return changed
+
+    def next_due(self, issuer: str, as_of_date: Optional[str], last_checked: Optional[float],
+                 unchanged_checks: int) -> float:
+        """
+        Stima il momento in cui conviene ricontrollare un fondo.
+
+        Il dato successivo è atteso a as_of + cadenza; in ogni caso tra due controlli
+        passa almeno una cadenza, che raddoppia ad ogni controllo senza novità
+        fino a max_backoff_days.
+        """
+        if last_checked is None:
+            return 0.0
+
+        cadence = self.cadence_seconds(issuer)
+        expected = 0.0
+        as_of = parse_as_of_date(as_of_date)
+        if as_of is not None:
+            expected = datetime.combine(as_of, datetime.min.time()).timestamp() + cadence
+
+        backoff = min(cadence * (2 ** unchanged_checks), max(cadence, self.max_backoff_days * 86400))
+        return max(expected, last_checked + backoff)
+
+    def due(self, now: Optional[float] = None, limit: Optional[int] = None,
+            issuers: Optional[Iterable[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Restituisce le coppie (issuer, isin) da aggiornare, le più in ritardo per prime.
+
+        Args:
+            now: Timestamp di riferimento (default: ora)
+            limit: Numero massimo di fondi restituiti
+            issuers: Limita la selezione a questi emittenti
+        """
+        now = now or time.time()
+        issuers = set(issuers) if issuers is not None else None
+
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT issuer, isin, as_of_date, last_checked, unchanged_checks FROM fund_freshness"
+                ).fetchall()
+
+        queue = []
+        for issuer, isin, as_of_date, last_checked, unchanged_checks in rows:
+            if issuers is not None and issuer not in issuers:
+                continue
+            due_at = self.next_due(issuer, as_of_date, last_checked, unchanged_checks)
+            if due_at <= now + DUE_TOLERANCE_SECONDS:
+                # Prima i fondi mai visti (due_at = 0), poi i più in ritardo
+                heapq.heappush(queue, (due_at, issuer, isin))
+
+        count = len(queue) if limit is None else min(limit, len(queue))
+        return [(issuer, isin) for _, issuer, isin in (heapq.heappop(queue) for _ in range(count))]
+
+    def plan(self, work: Dict[str, List[str]], now: Optional[float] = None,
+             limit: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Filtra una lista di lavoro {issuer: [isin]} mantenendo solo i fondi da aggiornare.
+        I fondi non ancora noti vengono registrati e quindi inclusi.
+        """
+        for issuer, isins in work.items():
+            self.register(issuer, isins)
+
+        wanted = {(issuer, isin) for issuer, isins in work.items() for isin in isins}
+        planned: Dict[str, List[str]] = {issuer: [] for issuer in work}
+        for issuer, isin in self.due(now=now, issuers=work.keys()):
+            if (issuer, isin) in wanted:
+                planned[issuer].append(isin)
+                if limit is not None and sum(len(v) for v in planned.values()) >= limit:
+                    break
+        return planned
+
+    def status(self) -> List[Dict]:
+        """Stato di tutti i fondi monitorati."""
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT issuer, isin, as_of_date, last_checked, last_changed, unchanged_checks "
+                    "FROM fund_freshness ORDER BY issuer, isin"
+                ).fetchall()
+        return [
+            {"issuer": r[0], "isin": r[1], "as_of_date": r[2], "last_checked": r[3],
+             "last_changed": r[4], "unchanged_checks": r[5],
+             "next_due": self.next_due(r[0], r[2], r[3], r[5])}
+            for r in rows
+        ]
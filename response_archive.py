@@ -0,0 +1,220 @@
+"""
+Archivio compresso delle risposte grezze scaricate, indirizzato per contenuto.
+
+Ogni risposta viene salvata una sola volta (chiave: SHA-256 del contenuto),
+compressa con zlib, in un database SQLite. Un indice separato registra ogni
+download (ISIN, sorgente, momento del download, hash), così si conserva lo
+storico dei download senza duplicare i contenuti identici e la versione più
+recente di un ISIN si legge con una sola query sull'indice.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+COMPRESSION_LEVEL = 6
+
+
+class ResponseArchive:
+    """Archivio delle risposte per ISIN e sorgente, con deduplicazione dei contenuti."""
+
+    def __init__(self, db_path: str = "response_archive.db"):
+        """
+        Args:
+            db_path: Percorso del database SQLite
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    isin TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    sha256 TEXT NOT NULL REFERENCES blobs(sha256)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_responses_latest
+                ON responses(isin, source, fetched_at DESC)
+            """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # === SCRITTURA ===
+
+    def put(self, isin: str, source: str, content: bytes, fetched_at: Optional[float] = None) -> Tuple[str, bool]:
+        """
+        Archivia una risposta.
+
+        Args:
+            isin: ISIN del fondo
+            source: Sorgente (es. 'extraetf', 'jpmorgan')
+            content: Contenuto grezzo della risposta
+            fetched_at: Momento del download (default: ora)
+
+        Returns:
+            (hash SHA-256 del contenuto, True se il contenuto non era già archiviato)
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        fetched_at = fetched_at or time.time()
+
+        with self._lock:
+            with self._get_connection() as conn:
+                exists = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (digest,)).fetchone()
+                if not exists:
+                    conn.execute("INSERT INTO blobs (sha256, size, data) VALUES (?, ?, ?)",
+                                 (digest, len(content), zlib.compress(content, COMPRESSION_LEVEL)))
+                conn.execute("INSERT INTO responses (isin, source, fetched_at, sha256) VALUES (?, ?, ?, ?)",
+                             (isin, source, fetched_at, digest))
+        return digest, not exists
+
+    def put_json(self, isin: str, source: str, data: Any, fetched_at: Optional[float] = None) -> Tuple[str, bool]:
+        """Archivia un payload JSON serializzato in forma compatta."""
+        content = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.put(isin, source, content, fetched_at)
+
+    # === LETTURA ===
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Contenuto decompresso dato il suo hash."""
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute("SELECT data FROM blobs WHERE sha256 = ?", (digest,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def latest(self, isin: str, source: str) -> Optional[bytes]:
+        """Contenuto dell'ultima risposta archiviata per ISIN e sorgente."""
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute("""
+                    SELECT b.data FROM responses r JOIN blobs b ON b.sha256 = r.sha256
+                    WHERE r.isin = ? AND r.source = ?
+                    ORDER BY r.fetched_at DESC, r.id DESC LIMIT 1
+                """, (isin, source)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def latest_json(self, isin: str, source: str) -> Optional[Any]:
+        """Ultima risposta archiviata decodificata come JSON."""
+        content = self.latest(isin, source)
+        return json.loads(content) if content is not None else None
+
+    def latest_many(self, source: str, isins: Optional[Iterable[str]] = None) -> Dict[str, bytes]:
+        """
+        Ultima risposta di più ISIN in una sola query.
+
+        Args:
+            source: Sorgente
+            isins: ISIN da leggere (default: tutti quelli della sorgente)
+
+        Returns:
+            Dict ISIN -> contenuto decompresso
+        """
+        wanted = set(isins) if isins is not None else None
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute("""
+                    SELECT r.isin, b.data FROM responses r JOIN blobs b ON b.sha256 = r.sha256
+                    WHERE r.source = ? AND r.id = (
+                        SELECT r2.id FROM responses r2 WHERE r2.isin = r.isin AND r2.source = r.source
+                        ORDER BY r2.fetched_at DESC, r2.id DESC LIMIT 1
+                    )
+                """, (source,)).fetchall()
+        return {isin: zlib.decompress(data) for isin, data in rows if wanted is None or isin in wanted}
+
+    def history(self, isin: str, source: str) -> List[Dict]:
+        """Storico dei download di un ISIN (dal più recente), con l'hash del contenuto."""
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute("""
+                    SELECT fetched_at, sha256 FROM responses WHERE isin = ? AND source = ?
+                    ORDER BY fetched_at DESC, id DESC
+                """, (isin, source)).fetchall()
+        return [{"fetched_at": fetched_at, "sha256": digest} for fetched_at, digest in rows]
+
+    def isins(self, source: str) -> List[str]:
+        """ISIN con almeno una risposta archiviata per la sorgente."""
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute("SELECT DISTINCT isin FROM responses WHERE source = ? ORDER BY isin",
+                                    (source,)).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Numero di risposte e contenuti, dimensione originale e compressa."""
+        with self._lock:
+            with self._get_connection() as conn:
+                responses = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                blobs, size, stored = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+                ).fetchone()
+        return {"responses": responses, "blobs": blobs, "raw_bytes": size, "stored_bytes": stored}
+
+    # === MIGRAZIONE ===
+
+    def import_json_directory(self, directory: str, source: str) -> int:
+        """
+        Importa i file <ISIN>.json di una cartella (es. extraetf/data).
+        Il contenuto viene ricompattato; come momento del download si usa la data di modifica del file.
+
+        Returns:
+            Numero di file importati
+        """
+        count = 0
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.put_json(filename[:-len(".json")], source, data, fetched_at=os.path.getmtime(path))
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    # Uso: python response_archive.py <cartella JSON> <sorgente> [archivio.db]
+    if len(sys.argv) < 3:
+        print("Uso: python response_archive.py <cartella JSON> <sorgente> [archivio.db]")
+        sys.exit(1)
+
+    directory, source = sys.argv[1], sys.argv[2]
+    archive = ResponseArchive(sys.argv[3] if len(sys.argv) > 3 else os.path.join(directory, "archive.db"))
+    imported = archive.import_json_directory(directory, source)
+    stats = archive.stats()
+    print(f"📦 Importati {imported} file da {directory}")
+    print(f"Risposte: {stats['responses']} | Contenuti distinti: {stats['blobs']}")
+    print(f"Dimensione: {stats['raw_bytes'] / 1e6:.2f} MB -> {stats['stored_bytes'] / 1e6:.2f} MB compressi")
@@ -0,0 +1,415 @@
+"""
+Anagrafica unica dei titoli: ogni identificativo -> un ID intero denso.
+
+Le sorgenti identificano i titoli in modo diverso (iShares: ticker e nome;
+Invesco: ISIN e CUSIP; JPMorgan: ticker e ISIN; ExtraETF: nome e ISIN).
+SecurityMaster assegna a ogni titolo un ID 0..N-1 e mantiene un indice hash
+(dict) per tipo di identificativo. resolve_frame risolve un intero DataFrame
+con una ricerca per colonna, crea gli ID mancanti e collega gli
+identificativi secondari di ogni riga, così che un titolo visto una volta con
+ISIN e nome venga riconosciuto anche dove compare solo il nome.
+
+Priorità degli identificativi: ISIN, CUSIP, ticker, nome normalizzato.
+
+Il ticker da solo non identifica un titolo: iShares usa il ticker
+dell'emittente per tutte le sue obbligazioni (JGB, CGB, TNOTE...) e lo stesso
+ticker indica titoli diversi su borse diverse ("SAN": Santander e Sanofi).
+Per questo la chiave del ticker è ticker + nome (il solo ticker quando il
+nome manca). Una chiave di ticker o nome condivisa da più righe
+dello stesso fondo e data non distingue nulla e viene ignorata: quelle righe
+si risolvono solo con ISIN o CUSIP, altrimenti restano non risolte.
+
+Per ogni ID vengono conservati anche settore, paese, valuta e asset class
+appresi dalle sorgenti che li forniscono (learn_attributes), così le sorgenti
+che non li hanno (es. Invesco) possono completarli con un join per ID.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DB_PATH = "security_master.db"
+
+# Tipi di identificativo in ordine di priorità
+IDENTIFIER_KINDS = ["isin", "cusip", "ticker", "name"]
+
+# Identificativi non univoci per natura: ignorati se ripetuti nella stessa fotografia
+SHARED_KINDS = ["ticker", "name"]
+
+# Colonne che separano le fotografie (fondo, data) all'interno di un frame
+SNAPSHOT_COLUMNS = ["etf_isin", "as_of_date"]
+
+# Attributi dei titoli (colonne di holdings_schema) appresi dalle sorgenti che li forniscono
+ATTRIBUTE_COLUMNS = ["sector", "country", "currency", "asset_class"]
+
+# ID dei titoli non risolti
+UNRESOLVED = -1
+
+# Forme societarie ignorate in coda al nome ("NVIDIA CORP" e "Nvidia" -> "NVIDIA")
+LEGAL_SUFFIXES = ["INC", "CORP", "CORPORATION", "CO", "LTD", "LIMITED", "PLC", "SA", "AG", "NV", "SE", "SPA",
+                  "AB", "ASA", "OYJ", "BHD", "TBK", "PCL", "REIT"]
+_LEGAL_SUFFIX_PATTERN = r"(?:\s+(?:" + "|".join(LEGAL_SUFFIXES) + r"))+$"
+_MISSING = {"", "-", "N/A", "NAN", "NONE"}
+
+
+def normalize_identifiers(kind: str, values: pd.Series) -> pd.Series:
+    """
+    Forma canonica di una colonna di identificativi (None dove il valore manca).
+
+    ISIN, CUSIP e ticker vengono portati in maiuscolo; i nomi perdono anche
+    punteggiatura e forma societaria finale ('full_name': solo la punteggiatura).
+    """
+    text = values.astype("string").str.strip().str.upper()
+    if kind in ("name", "full_name"):
+        text = text.str.replace(r"[^0-9A-Z]+", " ", regex=True).str.strip()
+    if kind == "name":
+        text = text.str.replace(_LEGAL_SUFFIX_PATTERN, "", regex=True).str.strip()
+    text = text.where(~text.isin(_MISSING))
+    return text.astype(object).where(text.notna(), None)
+
+
+def ticker_keys(tickers: pd.Series, names: pd.Series) -> pd.Series:
+    """
+    Chiavi del ticker: 'TICKER|NOME', il solo ticker se il nome manca.
+
+    Il nome mantiene la forma societaria: "RIO TINTO PLC" e "RIO TINTO LTD" restano distinti.
+    """
+    names = normalize_identifiers("full_name", names)
+    return pd.Series([ticker if ticker is None or name is None else f"{ticker}|{name}"
+                      for ticker, name in zip(tickers.tolist(), names.tolist())], dtype=object)
+
+
+def drop_shared(keys: pd.Series, snapshots: Optional[pd.DataFrame] = None) -> pd.Series:
+    """Toglie (None) le chiavi presenti su più righe della stessa fotografia."""
+    frame = snapshots.reset_index(drop=True).copy() if snapshots is not None else pd.DataFrame(index=keys.index)
+    frame["_key"] = keys
+    shared = frame.duplicated(keep=False).to_numpy() & keys.notna().to_numpy()
+    return keys.where(~shared, None)
+
+
+class SecurityMaster:
+    """Risoluzione degli identificativi dei titoli in ID interi densi."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Args:
+            db_path: Database SQLite in cui salvare l'anagrafica (None = solo in memoria)
+        """
+        self.db_path = Path(db_path) if db_path is not None else None
+        self._lock = threading.RLock()
+        # Indici hash: tipo -> valore normalizzato -> ID
+        self._index: Dict[str, Dict[str, int]] = {kind: {} for kind in IDENTIFIER_KINDS}
+        # Anagrafica per ID (valori originali, per la visualizzazione)
+        self._records: List[Dict[str, Optional[str]]] = []
+        self._dirty: Set[int] = set()
+        self._new_identifiers: List[Tuple[str, str, int]] = []
+        # Attributi per ID: un array object per colonna (None = non noto)
+        self._attributes: Dict[str, np.ndarray] = {column: np.full(0, None, dtype=object)
+                                                   for column in ATTRIBUTE_COLUMNS}
+        self._dirty_attributes: Set[int] = set()
+        if self.db_path is not None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # === PERSISTENZA ===
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS securities (
+                    security_id INTEGER PRIMARY KEY,
+                    isin TEXT,
+                    cusip TEXT,
+                    ticker TEXT,
+                    name TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS security_identifiers (
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    security_id INTEGER NOT NULL,
+                    PRIMARY KEY (kind, value)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS security_attributes (
+                    security_id INTEGER PRIMARY KEY,
+                    {", ".join(f"{column} TEXT" for column in ATTRIBUTE_COLUMNS)}
+                )
+            """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _load(self) -> None:
+        with self._get_connection() as conn:
+            rows = conn.execute("SELECT security_id, isin, cusip, ticker, name FROM securities "
+                                "ORDER BY security_id").fetchall()
+            identifiers = conn.execute("SELECT kind, value, security_id FROM security_identifiers").fetchall()
+            attributes = conn.execute(f"SELECT security_id, {', '.join(ATTRIBUTE_COLUMNS)} "
+                                      f"FROM security_attributes").fetchall()
+        self._records = [dict(zip(IDENTIFIER_KINDS, row[1:])) for row in rows]
+        for kind, value, security_id in identifiers:
+            self._index[kind][value] = security_id
+        self._ensure_capacity()
+        if attributes:
+            ids = np.array([row[0] for row in attributes], dtype=np.int64)
+            for position, column in enumerate(ATTRIBUTE_COLUMNS, start=1):
+                self._attributes[column][ids] = [row[position] for row in attributes]
+
+    def save(self) -> int:
+        """
+        Salva nel database i titoli e gli identificativi nuovi o aggiornati (una transazione).
+
+        Returns:
+            Numero di titoli salvati
+        """
+        if self.db_path is None:
+            raise ValueError("❌ SecurityMaster in memoria: nessun db_path")
+        with self._lock:
+            dirty = sorted(self._dirty)
+            dirty_attributes = sorted(self._dirty_attributes)
+            with self._get_connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO securities (security_id, isin, cusip, ticker, name) VALUES (?, ?, ?, ?, ?)",
+                    [(i, *(self._records[i][kind] for kind in IDENTIFIER_KINDS)) for i in dirty])
+                conn.executemany("INSERT OR IGNORE INTO security_identifiers (kind, value, security_id) "
+                                 "VALUES (?, ?, ?)", self._new_identifiers)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO security_attributes (security_id, {', '.join(ATTRIBUTE_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(ATTRIBUTE_COLUMNS))})",
+                    [(i, *(self._attributes[column][i] for column in ATTRIBUTE_COLUMNS)) for i in dirty_attributes])
+            self._dirty.clear()
+            self._new_identifiers.clear()
+            self._dirty_attributes.clear()
+        return len(dirty)
+
+    # === RISOLUZIONE ===
+
+    def _create(self, kind: str, value: str) -> int:
+        security_id = len(self._records)
+        self._records.append({k: None for k in IDENTIFIER_KINDS})
+        self._index[kind][value] = security_id
+        self._new_identifiers.append((kind, value, security_id))
+        self._dirty.add(security_id)
+        return security_id
+
+    def _lookup_pass(self, ids: np.ndarray, keys: Dict[str, pd.Series]) -> None:
+        """Completa gli ID ancora mancanti con una ricerca hash per tipo di identificativo."""
+        kinds = list(keys)
+        for position, (kind, values) in enumerate(keys.items()):
+            todo = np.flatnonzero(ids == UNRESOLVED)
+            if len(todo) == 0:
+                return
+            mapped = values.iloc[todo].map(self._index[kind])
+            found = mapped.notna().to_numpy()
+            rows, candidates = todo[found], mapped[found].to_numpy(dtype=np.int64)
+            # Un identificativo meno affidabile non basta se il titolo trovato ha già un identificativo
+            # più affidabile diverso (es. due obbligazioni con lo stesso nome e ISIN diversi)
+            for higher in kinds[:position]:
+                row_has = keys[higher].iloc[rows].notna().to_numpy()
+                if not row_has.any():
+                    continue
+                record_has = np.fromiter((self._records[i][higher] is not None for i in candidates.tolist()),
+                                         dtype=bool, count=len(candidates))
+                keep = ~(row_has & record_has)
+                rows, candidates = rows[keep], candidates[keep]
+            ids[rows] = candidates
+
+    def _link(self, ids: np.ndarray, keys: Dict[str, pd.Series], raw: Dict[str, pd.Series],
+              rows_mask: np.ndarray) -> None:
+        """Collega agli ID delle righe indicate gli identificativi non ancora noti e completa l'anagrafica."""
+        for kind, values in keys.items():
+            index = self._index[kind]
+            mask = rows_mask & values.notna().to_numpy()
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                continue
+            row_keys = values.iloc[rows]
+            row_ids = ids[rows]
+            # Il primo titolo che usa un identificativo lo mantiene
+            first = np.flatnonzero(~row_keys.duplicated().to_numpy())
+            for key, security_id in zip(row_keys.iloc[first].tolist(), row_ids[first].tolist()):
+                if key not in index:
+                    index[key] = security_id
+                    self._new_identifiers.append((kind, key, security_id))
+            # Valori originali per i titoli che non ne hanno ancora uno di questo tipo
+            records = self._records
+            _, first = np.unique(row_ids, return_index=True)
+            for security_id, value in zip(row_ids[first].tolist(), raw[kind].iloc[rows[first]].tolist()):
+                record = records[security_id]
+                if record[kind] is None and value is not None:
+                    record[kind] = str(value).strip()
+                    self._dirty.add(security_id)
+
+    def resolve_frame(self, df: pd.DataFrame, columns: Optional[Dict[str, str]] = None,
+                      create: bool = True) -> np.ndarray:
+        """
+        Risolve gli ID di tutte le righe di un DataFrame.
+
+        Ticker e nome ripetuti su più righe della stessa fotografia (etf_isin, as_of_date se
+        presenti; altrimenti tutto il frame) non vengono usati.
+
+        Args:
+            df: Holdings con una o più colonne di identificativi
+            columns: Mappa tipo di identificativo ('isin', 'cusip', 'ticker', 'name') -> colonna
+                (default: le colonne con lo stesso nome del tipo)
+            create: Crea un nuovo ID per i titoli non ancora noti
+
+        Returns:
+            Array int64 di ID, UNRESOLVED per le righe senza identificativi (o non note se create=False)
+        """
+        columns = columns or {kind: kind for kind in IDENTIFIER_KINDS}
+        raw = {kind: df[columns[kind]].reset_index(drop=True) for kind in IDENTIFIER_KINDS
+               if columns.get(kind) in df.columns}
+        keys = {kind: normalize_identifiers(kind, values) for kind, values in raw.items()}
+        if "ticker" in keys and "name" in keys:
+            keys["ticker"] = ticker_keys(keys["ticker"], raw["name"])
+        snapshots = df[[column for column in SNAPSHOT_COLUMNS if column in df.columns]]
+        for kind in SHARED_KINDS:
+            if kind in keys:
+                keys[kind] = drop_shared(keys[kind], snapshots)
+        ids = np.full(len(df), UNRESOLVED, dtype=np.int64)
+
+        with self._lock:
+            self._lookup_pass(ids, keys)
+            self._link(ids, keys, raw, ids != UNRESOLVED)
+            if create:
+                # Nuovi titoli per tipo di identificativo, dal più affidabile: una riga con ISIN
+                # nuovo e un nome visto altrove nel frame diventa il titolo a cui il nome si collega
+                for kind, values in keys.items():
+                    rows = np.flatnonzero((ids == UNRESOLVED) & values.notna().to_numpy())
+                    if len(rows) == 0:
+                        continue
+                    for value in pd.unique(values.iloc[rows]):
+                        self._create(kind, value)
+                    ids[rows] = values.iloc[rows].map(self._index[kind]).to_numpy(dtype=np.int64)
+                    created = np.zeros(len(ids), dtype=bool)
+                    created[rows] = True
+                    self._link(ids, keys, raw, created)
+                    unresolved = ids == UNRESOLVED
+                    self._lookup_pass(ids, keys)
+                    self._link(ids, keys, raw, unresolved & (ids != UNRESOLVED))
+        return ids
+
+    def resolve(self, isin: Optional[str] = None, cusip: Optional[str] = None, ticker: Optional[str] = None,
+                name: Optional[str] = None, create: bool = True) -> Optional[int]:
+        """ID di un singolo titolo (None se non risolvibile)."""
+        row = pd.DataFrame({"isin": [isin], "cusip": [cusip], "ticker": [ticker], "name": [name]}, dtype=object)
+        security_id = int(self.resolve_frame(row, create=create)[0])
+        return None if security_id == UNRESOLVED else security_id
+
+    def lookup(self, kind: str, value: str) -> Optional[int]:
+        """ID associato a un identificativo, senza crearne di nuovi."""
+        key = normalize_identifiers(kind, pd.Series([value], dtype=object)).iloc[0]
+        return self._index[kind].get(key) if key is not None else None
+
+    # === ANAGRAFICA ===
+
+    def info(self, security_id: int) -> Dict[str, Optional[str]]:
+        """Identificativi originali del titolo (isin, cusip, ticker, name)."""
+        return {"security_id": security_id, **self._records[security_id]}
+
+    def label(self, security_id: int) -> str:
+        """Etichetta leggibile: 'Nome (ISIN)', o il primo identificativo disponibile."""
+        record = self._records[security_id]
+        name = record["name"] or record["ticker"] or record["cusip"] or record["isin"] or f"#{security_id}"
+        return f"{name} ({record['isin']})" if record["isin"] and name != record["isin"] else name
+
+    def to_frame(self) -> pd.DataFrame:
+        """Anagrafica completa (identificativi e attributi), indicizzata per ID."""
+        self._ensure_capacity()
+        frame = pd.DataFrame(self._records, columns=IDENTIFIER_KINDS)
+        for column in ATTRIBUTE_COLUMNS:
+            frame[column] = self._attributes[column][:len(frame)]
+        return frame.rename_axis("security_id")
+
+    # === ATTRIBUTI ===
+
+    def _ensure_capacity(self) -> None:
+        size = len(self._records)
+        for column, values in self._attributes.items():
+            if len(values) < size:
+                grown = np.full(max(size, 2 * len(values)), None, dtype=object)
+                grown[:len(values)] = values
+                self._attributes[column] = grown
+
+    def update_attributes(self, ids: np.ndarray, frame: pd.DataFrame) -> int:
+        """
+        Completa gli attributi non ancora noti dei titoli (il primo valore visto resta).
+
+        Args:
+            ids: ID delle righe di frame (da resolve_frame)
+            frame: DataFrame con una o più colonne di ATTRIBUTE_COLUMNS
+
+        Returns:
+            Numero di attributi aggiunti
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        added = 0
+        with self._lock:
+            self._ensure_capacity()
+            for column in ATTRIBUTE_COLUMNS:
+                if column not in frame.columns:
+                    continue
+                text = frame[column].astype("string").str.strip()
+                valid = (text.notna() & (text != "") & (text != "-")).to_numpy(dtype=bool) & (ids != UNRESOLVED)
+                store = self._attributes[column]
+                rows = np.flatnonzero(valid)
+                rows = rows[pd.isna(store[ids[rows]])]
+                if len(rows) == 0:
+                    continue
+                # Più righe per lo stesso titolo: vince la prima
+                targets, first = np.unique(ids[rows], return_index=True)
+                store[targets] = text.iloc[rows[first]].to_numpy(dtype=object)
+                self._dirty_attributes.update(targets.tolist())
+                added += len(targets)
+        return added
+
+    def learn_attributes(self, holdings: pd.DataFrame) -> np.ndarray:
+        """Risolve holdings normalizzate (holdings_schema) e ne memorizza gli attributi; ritorna gli ID."""
+        ids = self.resolve_frame(holdings)
+        self.update_attributes(ids, holdings)
+        return ids
+
+    def attributes(self, ids: np.ndarray) -> pd.DataFrame:
+        """
+        Join vettoriale ID -> attributi.
+
+        Returns:
+            DataFrame con le colonne di ATTRIBUTE_COLUMNS, una riga per ID (None se non noto)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            self._ensure_capacity()
+            missing = ids == UNRESOLVED
+            positions = np.where(missing, 0, ids)
+            frame = {}
+            for column in ATTRIBUTE_COLUMNS:
+                values = self._attributes[column][positions] if len(self._records) else \
+                    np.full(len(ids), None, dtype=object)
+                values[missing] = None
+                frame[column] = values
+        return pd.DataFrame(frame, columns=ATTRIBUTE_COLUMNS)
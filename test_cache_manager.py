@@ -139,4 +139,15 @@ def test_cachemanager_get_or_set_and_ttl(request, cache_manager_fixture):
     cache.set("shortlived", "x")
     time.sleep(0.05)
     removed = cache.cleanup_expired_keys(0.01)
-    assert removed >= 1
\ No newline at end of file
+    assert removed >= 1
+
+
+@pytest.mark.parametrize("cache_manager_fixture", ["cache_manager_memory", "cache_manager_persistent"])
+def test_cachemanager_set_many_get_many(request, cache_manager_fixture):
+    cache = request.getfixturevalue(cache_manager_fixture)
+    cache.set_many({"a": 1, "b": {"x": None}, "c": [1, 2]})
+    found = cache.get_many_with_info(["a", "b", "missing"])
+    assert set(found) == {"a", "b"}
+    assert found["b"]["value"] == {"x": None}
+    assert found["a"]["age_seconds"] >= 0
+    assert cache.size() == 3
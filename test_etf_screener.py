@@ -0,0 +1,38 @@
+import pandas as pd
+
+from etf_screener import ETFScreener
+
+OVERVIEW = "etf_overview.csv"
+
+
+def test_compound_query_matches_pandas(tmp_path):
+    screener = ETFScreener.load(OVERVIEW, cache_path=str(tmp_path / "overview.npz"))
+    filters = {"currency": "EUR", "ter": (None, 0.2), "hedged": False,
+               "replication": ["Full replication", "Optimized sampling"], "size": (100, None)}
+
+    df = pd.read_csv(OVERVIEW)
+    expected = df[(df["currency"] == "EUR") & (df["ter"] <= 0.2) & ~df["hedged"]
+                  & df["replication"].isin(["Full replication", "Optimized sampling"]) & (df["size"] >= 100)]
+    expected = expected.sort_values("last_year", ascending=False, kind="stable", na_position="last")
+
+    rows = screener.select(filters, sort_by="last_year", ascending=False)
+    assert sorted(rows.tolist()) == sorted(expected.index.tolist())
+    assert screener.query(filters, sort_by="last_year", ascending=False, limit=5,
+                          columns=["isin"])["isin"].tolist() == expected["isin"].head(5).tolist()
+    assert len(screener.select({"currency": "XXX"})) == 0
+    assert screener.get("sxr8")["isin"] == "IE00B5BMR087"
+
+
+def test_cache_is_reused_until_the_csv_changes(tmp_path):
+    csv_path = tmp_path / "overview.csv"
+    cache_path = str(tmp_path / "overview.npz")
+    pd.read_csv(OVERVIEW).head(50).to_csv(csv_path, index=False)
+
+    built = ETFScreener.load(str(csv_path), cache_path)
+    cached = ETFScreener.load(str(csv_path), cache_path)
+    pd.testing.assert_frame_equal(cached.to_frame(), built.to_frame())
+    assert cached.query({"inception_date": ("2010-01-01", None)}, sort_by="inception_date")["isin"].tolist() == \
+        built.query({"inception_date": ("2010-01-01", None)}, sort_by="inception_date")["isin"].tolist()
+
+    pd.read_csv(OVERVIEW).head(10).to_csv(csv_path, index=False)
+    assert len(ETFScreener.load(str(csv_path), cache_path)) == 10
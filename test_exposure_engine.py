@@ -0,0 +1,96 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraetf"))
+
+from exposure_engine import ExposureEngine, _synthetic_funds
+from portfolio_aggregator import PortfolioAggregator
+from security_master import SecurityMaster
+
+
+def _equity(isin, sectors, countries, items, marketcap_giant):
+    return {"isin": isin, "asset_class_name": "Azioni", "fund_domicile_code": "IE", "portfolio_breakdown": {
+        "global_stock_exposure_list": [{"name": name, "value": value} for name, value in sectors],
+        "country_stocks_exposure_list": [{"name": code, "code": code, "value": value} for code, value in countries],
+        "region_stock_exposure_list": [{"name": "Europa", "value": 100.0}],
+        "currency_allocations": [{"name": "Euro", "value": 100.0}],
+        "items": [{"isin": isin_, "name": name, "weight": weight} for isin_, name, weight in items],
+        "marketcap_giant": marketcap_giant, "marketcap_large": 100.0 - marketcap_giant,
+    }}
+
+
+def _aggregator():
+    aggregator = PortfolioAggregator(data_dir="./missing")
+    aggregator.etf_data = {
+        "IE0000000001": _equity("IE0000000001", [("Tecnologia", 60.0), ("Finanza", 40.0)], [("US", 100.0)],
+                                [("US0378331005", "Apple", 10.0), (None, "Cassa", 1.0)], 50.0),
+        # Stesso titolo con un nome diverso: una sola voce
+        "IE0000000002": _equity("IE0000000002", [("Finanza", 100.0)], [("DE", 70.0), ("US", 30.0)],
+                                [("US0378331005", "Apple Inc", 5.0)], 30.0),
+        "IE0000000003": {"isin": "IE0000000003", "asset_class_name": "Criptovalute", "fund_domicile_code": "CH",
+                         "crypto_currency_name": "Bitcoin", "portfolio_breakdown": {}},
+    }
+    return aggregator
+
+
+def test_aggregate_portfolio_matches_per_fund_arithmetic():
+    aggregator = _aggregator()
+    result = aggregator.aggregate_portfolio({"IE0000000001": 50.0, "IE0000000002": 30.0,
+                                             "IE0000000003": 10.0, "IE0000000009": 10.0})
+
+    assert result["esposizione_settoriale"] == [("Finanza", 50.0), ("Tecnologia", 30.0), ("Bitcoin", 10.0)]
+    assert result["esposizione_geografica"] == [("US", 59.0), ("DE", 21.0), ("CH", 10.0)]
+    assert result["esposizione_regioni"] == [("Europa", 90.0)]
+    assert result["holdings"] == [("Apple (US0378331005)", 6.5), ("Cassa", 0.5)]
+    assert result["valute"] == [("Euro", 80.0)]
+    # Marketcap sulla sola parte azionaria: (50 * 0,5 + 30 * 0,3) / 0,8
+    assert np.isclose(result["marketcap_giant"], 42.5) and np.isclose(result["marketcap_large"], 57.5)
+
+    ids, weights = aggregator.holding_ids("IE0000000002")
+    assert aggregator.security_master.label(int(ids[0])) == "Apple (US0378331005)" and weights.tolist() == [5.0]
+
+
+def test_sparse_product_paths_agree():
+    engine = ExposureEngine.compile(_synthetic_funds(200), SecurityMaster())
+    matrix = engine.matrices["holdings"]
+    rows = np.arange(0, 200, 7)
+    weights = np.linspace(0.1, 1.0, len(rows))
+
+    expected = np.zeros(matrix.n_columns)
+    for row, weight in zip(rows.tolist(), weights.tolist()):
+        columns, values = matrix.row(row)
+        np.add.at(expected, columns, values * weight)
+
+    # Poche righe: voci ordinate; tutte le righe (peso zero fuori portafoglio): vettore denso
+    columns, values = matrix.product(rows, weights)
+    assert len(matrix.positions(rows)[0]) < matrix.n_columns
+    assert columns.tolist() == np.flatnonzero(expected).tolist() and np.allclose(values, expected[columns])
+
+    all_rows = np.arange(len(matrix))
+    dense_columns, dense_values = matrix.product(all_rows, np.bincount(rows, weights, minlength=len(matrix)))
+    assert len(matrix.positions(all_rows)[0]) >= matrix.n_columns
+    assert np.allclose(dense_values, expected[dense_columns])
+
+
+def test_batch_aggregation_matches_single_portfolios():
+    aggregator = _aggregator()
+    isins = ["IE0000000001", "IE0000000002", "IE0000000003", "IE0000000009"]
+    weights = np.array([[50.0, 30.0, 10.0, 10.0], [0.0, 100.0, 0.0, 0.0], [25.0, 25.0, 50.0, 0.0]])
+
+    # Blocchi da una voce: ogni portafoglio è un blocco
+    batch = aggregator.aggregate_portfolios(weights, isins, max_entries=1)
+
+    for row, portfolio_weights in enumerate(weights):
+        single = aggregator.aggregate_portfolio({isin: w for isin, w in zip(isins, portfolio_weights) if w})
+        for dimension in ("esposizione_settoriale", "esposizione_geografica", "holdings", "valute"):
+            columns = batch[dimension]
+            rows = columns["portfolio"] == row
+            assert sorted(zip(columns["key"][rows].tolist(), columns["value"][rows].tolist())) == \
+                sorted(single[dimension])
+        assert np.isclose(batch["marketcap"][row, 0], single["marketcap_giant"])
+
+    assert batch["holdings"]["security_id"].dtype == np.int64
+    assert batch["asset_classes"][:, 0].tolist() == [80.0, 100.0, 50.0]
+    assert batch["asset_classes"][0, -1] == 10.0
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraetf"))
+
+from extra_etf_data_downloader import download_etf_data
+from http_client import HttpClient
+from http_fixtures import FixtureSession, FixtureStore
+from work_journal import WorkJournal
+
+A, B, C = "IE00B4L5Y983", "IE00B5BMR087", "IE00BK5BQT80"
+
+
+class CrashingClient(HttpClient):
+    """Client che interrompe il processo alla richiesta per un ISIN."""
+
+    def __init__(self, session, crash_on=None):
+        super().__init__(session=session, max_retries=0)
+        self.crash_on = crash_on
+        self.requested = []
+
+    def request(self, method, url, **kwargs):
+        if self.crash_on and self.crash_on in url:
+            raise KeyboardInterrupt
+        self.requested.append(url.split("isin=")[1].split("&")[0])
+        return super().request(method, url, **kwargs)
+
+
+def test_interrupted_run_is_completed_by_a_different_list(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    for isin in (A, B, C):
+        store.save("GET", f"https://extraetf.com/api-v2/detail/?isin={isin}&extraetf_locale=it", b"", 200,
+                   {"Content-Type": "application/json"}, json.dumps({"results": [{"isin": isin}]}).encode())
+    journal = WorkJournal(str(tmp_path / "journal.db"))
+
+    def download(isins, crash_on=None):
+        client = CrashingClient(FixtureSession(store, mode="replay"), crash_on)
+        download_etf_data(isins, output_dir=str(tmp_path / "out"), delay=0, journal=journal, client=client)
+        return client.requested
+
+    with pytest.raises(KeyboardInterrupt):
+        download([A, B], crash_on=B)
+    # B, rimasto dalla lista interrotta, viene completato insieme a C e l'esecuzione si chiude
+    assert download([C]) == [B, C]
+    # Nuova esecuzione: A viene scaricato di nuovo invece di risultare già fatto
+    assert download([A]) == [A]
@@ -0,0 +1,30 @@
+import os
+import shutil
+
+import pytest
+
+from extraction_engine import create_pool
+from issuer_plugins import IsharesPlugin
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    shutil.copy(os.path.join(REPO, "input", "IE00B4L5Y983.csv"), input_folder)
+    (input_folder / "BROKEN000000.csv").write_text("Al,\"22/08/2025\"\n \nA,B,C\n1,2,3\n", encoding="utf-8")
+    return tmp_path
+
+
+def test_ishares_plugin_parses_in_the_pool(workspace):
+    plugin = IsharesPlugin(pool=create_pool(["ishares"], max_workers=2))
+    plugin.input_folder = str(workspace / "input")
+    try:
+        holdings = plugin.process("IE00B4L5Y983")
+        assert len(holdings) > 0 and (holdings["etf_isin"] == "IE00B4L5Y983").all()
+        with pytest.raises(RuntimeError, match="columns"):
+            plugin.process("BROKEN000000")
+    finally:
+        plugin.pool.shutdown()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pyarrow.dataset as ds
+
+from holdings_dataset import HoldingsDataset
+from holdings_schema import HOLDINGS_COLUMNS, normalize_holdings
+
+
+def holdings(etf_isin, issuer, as_of, rows):
+    df = pd.DataFrame(rows, columns=["Name", "ISIN", "Sector", "Weight"])
+    return normalize_holdings(df, {"name": "Name", "isin": "ISIN", "sector": "Sector", "weight": "Weight"},
+                              etf_isin=etf_isin, issuer=issuer, as_of_date=as_of)
+
+
+def test_write_read_with_pushdown(tmp_path):
+    dataset = HoldingsDataset(str(tmp_path / "holdings"))
+    assert dataset.read().empty
+
+    dataset.write(holdings("IE00B4L5Y983", "ishares", "2025-08-20",
+                           [("NVIDIA", "US67066G1040", "IT", 60.0), ("APPLE", "US0378331005", "IT", 40.0)]))
+    dataset.write(holdings("LU0292096186", "xtrackers", None, [("NVIDIA", "US67066G1040", "IT", 100.0)]))
+    assert (tmp_path / "holdings" / "issuer=ishares" / "as_of_date=2025-08-20" / "IE00B4L5Y983.parquet").exists()
+
+    df = dataset.read()
+    assert list(df.columns) == HOLDINGS_COLUMNS and len(df) == 3
+
+    nvidia = dataset.read(["etf_isin", "weight"], isins=["US67066G1040"], issuers=["ishares"])
+    assert nvidia.to_dict("records") == [{"etf_isin": "IE00B4L5Y983", "weight": 60.0}]
+    assert len(dataset.read(["isin"], start="2025-08-01", end="2025-08-31")) == 2
+    assert len(dataset.read(["isin"], filter=ds.field("as_of_date").is_null())) == 1
+
+
+def test_rewrite_replaces_fund_and_latest(tmp_path):
+    dataset = HoldingsDataset(str(tmp_path / "holdings"))
+    dataset.write(holdings("IE00B4L5Y983", "ishares", "2025-08-20", [("A", "X1", "IT", 100.0)]))
+    dataset.write(holdings("IE00B4L5Y983", "ishares", "2025-08-20", [("B", "X2", "IT", 100.0)]))
+    dataset.write(holdings("IE00B4L5Y983", "ishares", "2025-08-21",
+                           [("B", "X2", "IT", 70.0), ("C", "X3", "Energy", 30.0)]))
+
+    assert dataset.read(["name"], end="2025-08-20")["name"].tolist() == ["B"]
+    assert len(dataset.funds()) == 2
+    latest = dataset.latest(["name", "as_of_date"])
+    assert sorted(latest["name"]) == ["B", "C"]
+    assert (latest["as_of_date"] == pd.Timestamp("2025-08-21")).all()
+    # Una partizione senza data non nasconde quella datata
+    dataset.write(holdings("IE00B4L5Y983", "ishares", None, [("D", "X4", "IT", 100.0)]))
+    assert sorted(dataset.latest(["name"])["name"]) == ["B", "C"]
+    exposures = dataset.exposures("sector", start="2025-08-21")
+    assert exposures.loc["IE00B4L5Y983", "Energy"] == 30.0
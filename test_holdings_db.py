@@ -0,0 +1,43 @@
+import pandas as pd
+
+from holdings_db import HoldingsDB
+
+
+def make_holdings(weights):
+    return pd.DataFrame({
+        "name": ["NVIDIA CORP", "MICROSOFT CORP", "CASH"][:len(weights)],
+        "isin": ["US67066G1040", "US5949181045", None][:len(weights)],
+        "sector": ["IT", "IT", "Cash"][:len(weights)],
+        "country": ["United States"] * len(weights),
+        "currency": ["USD"] * len(weights),
+        "weight": weights,
+    })
+
+
+def test_replace_snapshot_swaps_fund_rows(tmp_path):
+    db = HoldingsDB(str(tmp_path / "holdings.db"))
+    db.replace_snapshot("IE00B4L5Y983", "ishares", make_holdings([7.0, 6.0, 1.0]), as_of_date="2025-08-20",
+                        fund={"issuer": "ishares"})
+    db.replace_snapshot("IE00B4L5Y983", "ishares", make_holdings([8.0, 5.0]), as_of_date="2025-08-20")
+
+    stats = db.stats()
+    assert stats["snapshots"] == 1
+    assert stats["holdings"] == 2
+    assert stats["securities"] == 3
+    holdings = db.fund_holdings("IE00B4L5Y983")
+    assert holdings["weight"].tolist() == [8.0, 5.0]
+    assert db.fund_exposures("IE00B4L5Y983", "sector").to_dict() == {"IT": 13.0}
+    assert db.snapshots()["issuer"].tolist() == ["ishares"]
+
+
+def test_security_lookup_uses_latest_snapshot_per_fund(tmp_path):
+    db = HoldingsDB(str(tmp_path / "holdings.db"))
+    db.replace_snapshot("IE00B4L5Y983", "ishares", make_holdings([7.0, 6.0]), as_of_date="2025-08-19")
+    db.replace_snapshot("IE00B4L5Y983", "ishares", make_holdings([7.5, 6.0]), as_of_date="2025-08-20")
+    db.replace_snapshot("IE00BJ0KDQ92", "xtrackers", make_holdings([4.0]),
+                        exposures={"country": {"US": 100.0}})
+
+    funds = db.security_funds("us67066g1040")
+    assert funds[["etf_isin", "weight"]].values.tolist() == [["IE00B4L5Y983", 7.5], ["IE00BJ0KDQ92", 4.0]]
+    assert db.fund_exposures("IE00BJ0KDQ92", "country").to_dict() == {"US": 100.0}
+    assert len(db.fund_holdings("IE00B4L5Y983", as_of_date="2025-08-19")) == 2
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from holdings_dataset import HoldingsDataset
+from holdings_diff import DIFF_COLUMNS, diff_snapshots, iter_dataset_diffs, write_changes
+
+
+def _snapshot(as_of, isins, names, weights):
+    return pd.DataFrame({"etf_isin": "IE00B4L5Y983", "issuer": "ishares", "as_of_date": pd.Timestamp(as_of),
+                         "isin": isins, "ticker": None, "name": names, "weight": weights})
+
+
+def test_diff_snapshots():
+    old = _snapshot("2025-08-20", ["US0378331005", "US5949181045", "US0231351067", "US0231351067"],
+                    ["Apple", "Microsoft", "Amazon", "Amazon"], [5.0, 4.0, 1.5, 1.5])
+    # Microsoft cambia nome ma non ISIN: stesso titolo
+    new = _snapshot("2025-08-21", ["US5949181045", "US0231351067", "US67066G1040"],
+                    ["Microsoft Corp", "Amazon", "Nvidia"], [4.05, 2.0, 6.0])
+
+    changes = diff_snapshots(old, new, threshold=0.1)
+    assert list(changes.columns) == DIFF_COLUMNS
+
+    changes = changes.set_index("isin")
+    assert changes.loc["US0378331005", "change"] == "removed"
+    assert changes.loc["US67066G1040", "change"] == "added"
+    # Le due righe Amazon della prima data si sommano: 3,0 -> 2,0
+    assert changes.loc["US0231351067", ["change", "weight_old", "delta"]].tolist() == ["reweighted", 3.0, -1.0]
+    assert "US5949181045" not in changes.index
+
+
+def test_dataset_diffs_are_streamed_per_fund(tmp_path):
+    dataset = HoldingsDataset(str(tmp_path / "holdings"))
+    for as_of, weights in (("2025-08-19", [50.0, 50.0]), ("2025-08-20", [60.0, 40.0]), ("2025-08-21", [60.0, 40.0])):
+        snapshot = _snapshot(as_of, ["US0378331005", "US5949181045"], ["Apple", "Microsoft"], weights)
+        for column in ("sector", "country", "currency", "asset_class", "market_value"):
+            snapshot[column] = None
+        dataset.write(snapshot)
+
+    latest = list(iter_dataset_diffs(dataset))
+    assert len(latest) == 1 and latest[0].empty
+
+    path = str(tmp_path / "changes.csv")
+    assert write_changes(iter_dataset_diffs(dataset, consecutive=True), path) == 2
+    written = pd.read_csv(path)
+    assert written["as_of_new"].unique().tolist() == ["2025-08-20"]
+    assert sorted(written["delta"]) == [-10.0, 10.0]
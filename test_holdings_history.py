@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from holdings_history import HoldingsHistory
+
+
+def _holdings(as_of, weights):
+    isins = [f"US{i:010d}" for i in range(len(weights))]
+    return pd.DataFrame({"etf_isin": "IE00B4L5Y983", "as_of_date": pd.Timestamp(as_of), "isin": isins,
+                         "ticker": None, "name": [f"Titolo {i}" for i in range(len(weights))], "weight": weights})
+
+
+def test_reconstruction_and_series_from_keyframes_and_deltas(tmp_path):
+    history = HoldingsHistory(str(tmp_path / "history.db"), keyframe_interval=3)
+    weights = np.full(20, 5.0)
+    snapshots = {}
+    for day, as_of in enumerate(pd.bdate_range("2025-08-18", periods=7)):
+        weights = weights.copy()
+        weights[day] += 0.5
+        holdings = _holdings(as_of, weights)
+        if day == 4:
+            holdings = holdings.iloc[1:]
+        history.add_holdings(holdings)
+        snapshots[as_of] = holdings
+
+    stats = history.stats()
+    assert (stats["keyframes"], stats["deltas"]) == (3, 4)
+    assert stats["stored_rows"] < stats["full_rows"] / 2
+
+    for as_of, holdings in snapshots.items():
+        rebuilt = history.snapshot("IE00B4L5Y983", as_of)
+        assert rebuilt["isin"].tolist() == holdings["isin"].tolist()
+        assert rebuilt["weight"].tolist() == holdings["weight"].tolist()
+
+    # Fra due date pubblicate vale l'ultima fotografia precedente
+    assert len(history.snapshot("IE00B4L5Y983", "2025-08-23")) == 19
+
+    series = history.series("IE00B4L5Y983", "US0000000000", start="2025-08-19")
+    assert series.index[0] == pd.Timestamp("2025-08-19")
+    assert series.tolist()[:3] == [5.5, 5.5, 5.5]
+    # Titolo assente il 22 e di nuovo presente il 25
+    assert np.isnan(series.loc["2025-08-22"]) and series.loc["2025-08-25"] == 5.5
+
+
+def test_out_of_order_dates_are_reencoded(tmp_path):
+    history = HoldingsHistory(str(tmp_path / "history.db"))
+    history.add_holdings(_holdings("2025-08-20", [50.0, 50.0]))
+    history.add_holdings(_holdings("2025-08-22", [40.0, 60.0]))
+    # Data intermedia arrivata in ritardo: la data successiva resta corretta
+    history.add_holdings(_holdings("2025-08-21", [45.0, 45.0, 10.0]))
+
+    assert history.dates("IE00B4L5Y983") == ["2025-08-20", "2025-08-21", "2025-08-22"]
+    assert history.snapshot("IE00B4L5Y983", "2025-08-21")["weight"].tolist() == [45.0, 45.0, 10.0]
+    assert history.snapshot("IE00B4L5Y983")["weight"].tolist() == [40.0, 60.0]
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from holdings_index import HoldingsIndex
+
+
+def holdings(rows):
+    return pd.DataFrame(rows, columns=["isin", "ticker", "name", "weight"])
+
+
+def test_lookup_merges_identifiers_and_replaces_funds(tmp_path):
+    index = HoldingsIndex()
+    index.add_fund("IE00B4L5Y983", holdings([[None, "NVDA", "NVIDIA CORP", 5.0], [None, "MSFT", "MICROSOFT", 4.0]]),
+                   as_of_date="2025-08-20")
+    index.add_fund("IE00BJ0KDQ92", holdings([["US67066G1040", None, "NVIDIA CORP", 7.6]]))
+    assert index.postings("US67066G1040", "nvda") == [("IE00BJ0KDQ92", 7.6, None),
+                                                      ("IE00B4L5Y983", 5.0, "2025-08-20")]
+
+    # Un fondo aggiunto di nuovo sostituisce le sue righe
+    index.add_fund("IE00B4L5Y983", holdings([[None, "MSFT", "MICROSOFT", 4.5]]), as_of_date="2025-08-21")
+    assert index.postings("NVDA") == []
+    assert index.lookup("msft")["weight"].tolist() == [4.5]
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = HoldingsIndex.load(path)
+    assert loaded.postings("MSFT") == [("IE00B4L5Y983", 4.5, "2025-08-21")]
+    assert len(loaded) == 2
+
+
+def test_incremental_add_after_load(tmp_path):
+    path = str(tmp_path / "index.npz")
+    index = HoldingsIndex()
+    index.add_fund("A", holdings([["US0378331005", None, "APPLE", 3.0]]))
+    index.save(path)
+
+    loaded = HoldingsIndex.load(path)
+    loaded.add_fund("B", holdings([["US0378331005", None, "APPLE", 6.0], ["US0378331005", None, "APPLE", 1.0]]))
+    assert [(fund, weight) for fund, weight, _ in loaded.postings("US0378331005")] == [("B", 7.0), ("A", 3.0)]
+    assert loaded.remove_fund("A")
+    assert [fund for fund, _, _ in loaded.postings("US0378331005")] == ["B"]
+
+
+def test_incremental_compaction_matches_a_full_build():
+    rng = np.random.default_rng(0)
+    funds = {f"F{i}": holdings([[f"US{key:010d}", None, None, float(rng.integers(1, 20))]
+                                for key in rng.choice(300, size=40, replace=False)]) for i in range(30)}
+
+    full = HoldingsIndex()
+    for etf_isin, frame in funds.items():
+        full.add_fund(etf_isin, frame)
+    full.compact()
+
+    incremental = HoldingsIndex()
+    for etf_isin, frame in funds.items():
+        incremental.add_fund(etf_isin, frame.iloc[:20])
+        incremental.compact()
+    incremental.add_fund("GONE", holdings([["XX0000000000", None, None, 1.0]]))
+    incremental.compact()
+    incremental.remove_fund("GONE")
+    for etf_isin, frame in funds.items():
+        incremental.add_fund(etf_isin, frame)
+        incremental.compact()
+
+    assert incremental._keys.tolist() == full._keys.tolist()
+    assert incremental._offsets.tolist() == full._offsets.tolist()
+    for key in full._keys.tolist():
+        assert incremental.postings(key) == full.postings(key)
@@ -0,0 +1,82 @@
+import pandas as pd
+
+from holdings_dataset import HoldingsDataset
+from holdings_schema import empty_holdings
+from holdings_validation import report_issues, validate_dataset, validate_holdings
+from invesco_data_extractor import extract_invesco
+from ishares_data_extractor import extract_ishares, normalize_ishares_holdings
+from security_master import SecurityMaster
+
+
+def _fund(etf_isin, issuer, as_of, weights, isins=None, sectors=None):
+    size = len(weights)
+    return pd.DataFrame({
+        "etf_isin": etf_isin, "issuer": issuer, "as_of_date": pd.Timestamp(as_of) if as_of else pd.NaT,
+        "name": [f"Titolo {i}" for i in range(size)],
+        "isin": isins or [f"US{i:010d}" for i in range(size)], "ticker": None,
+        "sector": sectors or ["Tecnologia"] * size, "country": "Stati Uniti", "weight": weights,
+    })
+
+
+def test_rules_flag_the_right_funds():
+    holdings = pd.concat([
+        _fund("IE0000000001", "ishares", "2025-08-29", [60.0, 40.0]),
+        _fund("IE0000000002", "ishares", "2025-08-29", [60.0, 30.0, None],
+              isins=["US0000000001", "US0000000001", "US0000000002"]),
+        _fund("IE0000000003", "xtrackers", "2025-06-01", [80.0, 20.0], sectors=["-", "Energia"]),
+        _fund("IE0000000004", "extraetf", None, [30.0, -2.0]),
+    ], ignore_index=True)
+
+    report = validate_holdings(holdings, today="2025-08-30").set_index("etf_isin")
+
+    assert report.loc["IE0000000001", "status"] == "ok"
+    assert report.loc["IE0000000002", "issues"] == "weight_sum;nan_weights;duplicate_securities"
+    assert report.loc["IE0000000003", "issues"] == "unknown_sector;stale_as_of"
+    assert report.loc["IE0000000003", "unknown_sector_weight"] == 0.8
+    # extraETF: solo le holdings principali, una somma inferiore a 100 non è un errore
+    assert report.loc["IE0000000004", "issues"] == "negative_weights;missing_as_of"
+    assert report["status"].tolist() == ["ok", "error", "warning", "error"]
+    assert len(report_issues(report.reset_index())) == 7
+
+
+def test_empty_holdings_give_an_empty_report():
+    report = validate_holdings(empty_holdings())
+    assert report.empty and "status" in report.columns
+    assert report_issues(report).empty
+
+
+def test_validate_dataset(tmp_path):
+    dataset = HoldingsDataset(str(tmp_path / "holdings"))
+    dataset.write(extract_invesco("IE000OEF25S1", verbose=False, security_master=SecurityMaster())["holdings"])
+
+    report = validate_dataset(dataset, today="2025-08-26")
+
+    assert len(report) == 1
+    assert report.loc[0, "holdings"] == 1323
+    # Senza anagrafica titoli il file Invesco non ha né settori né paesi
+    assert report.loc[0, "issues"] == "unknown_sector;unknown_country"
+    assert report.loc[0, "weight_sum"].round(2) == 100
+
+
+def test_duplicates_need_the_isin_or_ticker_and_name():
+    holdings = _fund("IE0000000001", "ishares", "2025-08-29", [25.0, 25.0, 20.0, 10.0, 10.0, 10.0],
+                     isins=[None] * 6)
+    holdings["ticker"] = ["BHP", "BHP", "T", "T", "AAPL", "AAPL"]
+    holdings["name"] = ["BHP GROUP LTD", "BHP GROUP PLC", "TREASURY NOTE", "TREASURY NOTE",
+                        "APPLE INC", "APPLE INC"]
+    holdings["asset_class"] = ["Equity", "Equity", "Fixed Income", "Fixed Income", "Equity", "Equity"]
+
+    report = validate_holdings(holdings, today="2025-08-30")
+
+    # Stesso ticker con nomi diversi e obbligazioni dello stesso emittente non sono duplicati
+    assert report.loc[0, "duplicate_rows"] == 2
+
+
+def test_issuer_tickers_of_a_bond_fund_are_not_duplicates():
+    result = extract_ishares("IE00BDBRDM35", verbose=False, write_files=False)
+    holdings = normalize_ishares_holdings(result["holdings"], "IE00BDBRDM35", result["as_of_date"])
+
+    report = validate_holdings(holdings, today=result["as_of_date"])
+
+    assert report.loc[0, "holdings"] == 19432
+    assert report.loc[0, "duplicate_rows"] == 0
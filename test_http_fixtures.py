@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraetf"))
+
+from extra_etf_data_downloader import download_etf_data
+from http_client import HttpClient
+from http_fixtures import FixtureServer, FixtureSession, FixtureStore
+from response_archive import ResponseArchive
+from work_journal import WorkJournal
+from xtrackers_data_downloader import base_url, download_etf_file
+
+
+@pytest.fixture
+def origin():
+    """Sito 'reale' locale: restituisce un JSON con l'ISIN richiesto."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            isin = parse_qs(urlparse(self.path).query).get("isin", [""])[0]
+            body = json.dumps({"results": [{"isin": isin, "name": f"Fondo {isin}"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+
+
+def test_record_and_replay(origin, tmp_path):
+    base, hits = origin
+    store = FixtureStore(str(tmp_path / "fixtures"))
+
+    recorder = HttpClient(session=FixtureSession(store, mode="record"))
+    recorded = recorder.get(f"{base}/api/", params={"isin": "IE00BK5BQT80", "a": "1"}).json()
+    assert len(store) == 1
+
+    replayer = HttpClient(session=FixtureSession(store, mode="replay"), max_retries=0)
+    # Stessi parametri in ordine diverso: stessa fixture, nessuna richiesta al sito
+    assert replayer.get(f"{base}/api/?a=1&isin=IE00BK5BQT80").json() == recorded
+    assert len(hits) == 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        replayer.get(f"{base}/api/", params={"isin": "IE00B6R52259"})
+
+
+def test_server_replays_with_errors_and_throttling(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    origin_url = "https://extraetf.com/api-v2/detail/?isin=IE00BK5BQT80&extraetf_locale=it"
+    content = json.dumps({"results": [{"isin": "IE00BK5BQT80"}]}).encode()
+    store.save("GET", origin_url, b"", 200, {"Content-Type": "application/json"}, content)
+
+    isins = [f"IE{n:09d}0" for n in range(40)]
+    with FixtureServer(store, error_rate=0.1, throttle_rate=0.1, retry_after=0.001, seed=1) as server:
+        client = HttpClient(session=server.session(), max_retries=8, backoff_seconds=0.001)
+        journal = WorkJournal(str(tmp_path / "journal.db"))
+        download_etf_data(isins, output_dir=str(tmp_path / "out"), delay=0, journal=journal, client=client)
+
+    # Tutti gli ISIN sono stati serviti adattando la risposta registrata
+    archive = ResponseArchive(str(tmp_path / "out" / "archive.db"))
+    for isin in isins:
+        assert archive.latest_json(isin, "extraetf")["results"][0]["isin"] == isin
+    assert server.stats["adapted"] == len(isins)
+    assert server.stats["throttled"] > 0 and server.stats["errors"] > 0
+    assert client.stats["retries"] == server.stats["throttled"] + server.stats["errors"]
+
+
+def test_server_serves_binary_downloads(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    url = base_url.format(isin="IE00BJ0KDQ92")
+    store.save("GET", url, b"", 200, {"Content-Disposition": "attachment; filename=x.xlsx"}, b"PK\x03\x04data")
+
+    with FixtureServer(store) as server:
+        client = HttpClient(session=server.session(), max_retries=0)
+        path = download_etf_file("IE00BJ0KDQ92", str(tmp_path / "downloads"), client=client)
+    with open(path, "rb") as f:
+        assert f.read() == b"PK\x03\x04data"
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pandas as pd
+
+from invesco_data_extractor import extract_invesco, read_invesco_holdings
+from security_master import SecurityMaster
+
+EXAMPLE = "invesco_list.json"
+
+
+def test_holdings_are_completed_from_the_security_master():
+    master = SecurityMaster()
+    # Attributi pubblicati da un altro emittente, con il CUSIP come unico identificativo in comune
+    other = pd.DataFrame({"cusip": ["166764100"], "name": ["Chevron"], "sector": ["Energia"],
+                          "country": ["Stati Uniti"], "currency": ["USD"]})
+    master.update_attributes(master.resolve_frame(other), other)
+
+    result = extract_invesco("IE000OEF25S1", EXAMPLE, verbose=False, security_master=master)
+
+    holdings = result["holdings"]
+    assert result["status"] == "ok"
+    assert result["as_of_date"] == date(2025, 8, 25)
+    assert len(holdings) == 1323
+    assert abs(holdings["weight"].sum() - 100) < 0.01
+    chevron = holdings[holdings["isin"] == "US1667641005"].iloc[0]
+    assert (chevron["sector"], chevron["country"], chevron["currency"]) == ("Energia", "Stati Uniti", "USD")
+    assert result["breakdowns"]["sector"]["Energia"] == chevron["weight"]
+    assert result["coverage"] == chevron["weight"] / holdings["weight"].sum()
+
+
+def test_unchanged_effective_date_is_skipped(tmp_path):
+    skipped = read_invesco_holdings(EXAMPLE, known_as_of=date(2025, 8, 25))
+    assert skipped["skipped"] and skipped["holdings"].empty
+
+    db_path = str(tmp_path / "holdings.db")
+    first = extract_invesco("IE000OEF25S1", EXAMPLE, verbose=False, security_master=SecurityMaster(),
+                            db_path=db_path)
+    second = extract_invesco("IE000OEF25S1", EXAMPLE, verbose=False, security_master=SecurityMaster(),
+                             db_path=db_path)
+    assert first["snapshot_id"] is not None
+    assert second["status"] == "skipped"
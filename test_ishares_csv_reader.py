@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from ishares_csv_reader import PYARROW_AVAILABLE, detect_ishares_format, read_ishares_csv
+
+ITALIAN = (
+    '﻿Al,"20/08/2025"\n'
+    ' \n'
+    "Ticker dell'emittente,Nome,Valore di mercato,Ponderazione (%),Prezzo\n"
+    '"005930","SAMSUNG","6.476.595.712,60","2,05","10,81"\n'
+    '"AKRBP","AKER BP","-4.008,49","-","21,55"\n'
+    '"700","TENCENT","1.000,00","0,00","3,01"\n'
+    '\xa0\n'
+)
+
+ENGLISH = (
+    'Fund Holdings as of,"20/Aug/2025"\n'
+    ' \n'
+    'Ticker,Name,Market Value,Weight (%),Price\n'
+    '"NVDA","NVIDIA CORP","6,476,595,712.60","5.48","175.40"\n'
+    '"MSFT","MICROSOFT CORP","5,404,821,813.60","4.58","505.72"\n'
+)
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content.encode("utf-8"))
+    return str(path)
+
+
+def test_detect_italian_format(tmp_path):
+    fmt = detect_ishares_format(write(tmp_path, "it.csv", ITALIAN))
+    assert fmt.encoding == "utf-8-sig"
+    assert fmt.as_of_date == date(2025, 8, 20)
+    assert (fmt.delimiter, fmt.decimal, fmt.thousands, fmt.header_row) == (",", ",", ".", 2)
+    # I ticker numerici restano testo: solo i valori con parte decimale contano come numeri
+    assert fmt.numeric_columns == ["Valore di mercato", "Ponderazione (%)", "Prezzo"]
+
+
+@pytest.mark.parametrize("engine", ["c", pytest.param("pyarrow", marks=pytest.mark.skipif(
+    not PYARROW_AVAILABLE, reason="pyarrow non installato"))])
+def test_read_italian_and_english(tmp_path, engine):
+    df, _ = read_ishares_csv(write(tmp_path, "it.csv", ITALIAN), engine=engine)
+    assert len(df) == 3
+    assert df["Ticker dell'emittente"].tolist() == ["005930", "AKRBP", "700"]
+    assert df["Valore di mercato"].tolist() == [6476595712.60, -4008.49, 1000.0]
+    assert df["Ponderazione (%)"].isna().tolist() == [False, True, False]
+
+    df, fmt = read_ishares_csv(write(tmp_path, "en.csv", ENGLISH), engine=engine)
+    assert fmt.as_of_date == date(2025, 8, 20) and fmt.decimal == "."
+    assert df["Market Value"].sum() == pytest.approx(11881417526.2)
+
+
+def test_semicolon_delimiter(tmp_path):
+    content = 'Al;"22/08/2025"\n\nTicker;Nome;Ponderazione (%)\n"A";"X";"1,5"\n"B";"Y";"2,5"\n'
+    df, fmt = read_ishares_csv(write(tmp_path, "sc.csv", content))
+    assert fmt.delimiter == ";"
+    assert df["Ponderazione (%)"].sum() == pytest.approx(4.0)
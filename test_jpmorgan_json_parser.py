@@ -0,0 +1,20 @@
+import json
+
+import pandas as pd
+
+from jpmorgan_json_parser import parse_fund_data, stream_fund_data
+
+EXAMPLE = "jpmorgan_example.json"
+
+
+def test_streaming_matches_full_parse():
+    streamed = stream_fund_data(EXAMPLE)
+    with open(EXAMPLE, encoding="utf-8") as f:
+        parsed = parse_fund_data(json.load(f))
+
+    assert streamed["as_of_date"] == parsed["as_of_date"] == "2025-08-25"
+    assert streamed["sectors"] == parsed["sectors"]
+    assert streamed["regions"] == parsed["regions"]
+    pd.testing.assert_frame_equal(streamed["holdings"], parsed["holdings"])
+    assert streamed["holdings"].loc[0, "ticker"] == "NVDA"
+    assert streamed["holdings"]["marketValuePercent"].dtype == "float64"
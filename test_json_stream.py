@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+import json_stream
+from json_stream import iter_items
+
+DOCUMENT = {
+    "meta": {"skip": [{"deep": ["x", "y\"]}"]}], "n": 1},
+    "fund": {"name": "Fondo è", "holdings": [{"isin": "US0378331005", "weight": 2.5e1}, {"isin": None, "weight": -3}],
+             "asOf": "2025-08-20", "total": 123456789},
+}
+PREFIXES = ["fund.holdings.item", "fund.asOf", "fund.total", "fund.name"]
+EXPECTED = [("fund.name", "Fondo è"), ("fund.holdings.item", {"isin": "US0378331005", "weight": 25.0}),
+            ("fund.holdings.item", {"isin": None, "weight": -3}), ("fund.asOf", "2025-08-20"),
+            ("fund.total", 123456789)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 64, 65536])
+def test_items_match_full_decode_for_any_chunk_size(chunk_size):
+    content = json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8")
+    assert list(iter_items(content, PREFIXES, chunk_size=chunk_size, use_ijson=False)) == EXPECTED
+
+
+def test_sources_and_backends(tmp_path):
+    path = tmp_path / "fund.json"
+    path.write_text(json.dumps(DOCUMENT, indent=2, ensure_ascii=False), encoding="utf-8")
+    assert list(iter_items(str(path), PREFIXES, use_ijson=False)) == EXPECTED
+    with open(path, encoding="utf-8") as f:
+        assert list(iter_items(f, ["fund.asOf"])) == [("fund.asOf", "2025-08-20")]
+    assert list(iter_items(io.BytesIO(b"[1, 2]"), ["item"], use_ijson=False)) == [("item", 1), ("item", 2)]
+    if json_stream.IJSON_AVAILABLE:
+        assert list(iter_items(str(path), PREFIXES, use_ijson=True)) == EXPECTED
@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+import pytest
+import requests
+
+from http_client import HttpClient
+from http_fixtures import FixtureSession, FixtureStore
+from market_data import COOKIE_URL, CRUMB_URL, MarketData, QUOTE_URL, parse_spark_response
+
+
+class FakeResponse:
+    def __init__(self, data, text=""):
+        self._data = data
+        self.text = text
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    def __init__(self, expired_crumbs=()):
+        self.calls = []
+        self.crumbs = iter(["crumb1", "crumb2"])
+        self.expired_crumbs = set(expired_crumbs)
+
+    def get(self, url, params=None, **kwargs):
+        if url == COOKIE_URL:
+            return FakeResponse(None)
+        if url == CRUMB_URL:
+            return FakeResponse(None, text=next(self.crumbs))
+        self.calls.append((url, params))
+        if params.get("crumb") in self.expired_crumbs:
+            response = requests.Response()
+            response.status_code = 401
+            raise requests.exceptions.HTTPError("401 Unauthorized", response=response)
+        symbols = params["symbols"].split(",")
+        if url == QUOTE_URL:
+            return FakeResponse({"quoteResponse": {"result": [
+                {"symbol": s, "longName": f"{s} name", "currency": "USD", "regularMarketPrice": 10.0}
+                for s in symbols if s != "UNKNOWN"]}})
+        return FakeResponse({"spark": {"result": [
+            {"symbol": s, "response": [{"timestamp": [86400 * 20000, 86400 * 20001, 86400 * 20002],
+                                        "indicators": {"quote": [{"close": [1.0, None, 3.0]}]}}]}
+            for s in symbols]}})
+
+
+def test_quotes_are_batched_and_cached():
+    client = FakeClient()
+    market_data = MarketData(client=client)
+    symbols = [f"S{i}" for i in range(60)] + ["s1", "UNKNOWN"]
+
+    quotes = market_data.quotes(symbols)
+    assert len(quotes) == 60
+    assert quotes.loc["S1", "longName"] == "S1 name"
+    # 61 simboli distinti -> 2 richieste da massimo 50
+    assert len(client.calls) == 2
+
+    assert {params["crumb"] for _, params in client.calls} == {"crumb1"}
+
+    market_data.quotes(["S1", "S2"])
+    assert len(client.calls) == 2
+
+
+def test_quotes_refresh_expired_crumb():
+    client = FakeClient(expired_crumbs={"crumb1"})
+    market_data = MarketData(client=client)
+
+    assert market_data.quotes(["AAA"]).loc["AAA", "regularMarketPrice"] == 10.0
+    assert [params["crumb"] for _, params in client.calls] == ["crumb1", "crumb2"]
+
+
+def test_history_is_columnar():
+    market_data = MarketData(client=FakeClient())
+    columns = market_data.history_columns(["AAA", "BBB"])
+    assert columns["AAA"]["day"].dtype == np.int32
+    assert columns["AAA"]["day"].tolist() == [20000, 20002]
+    assert columns["AAA"]["close"].tolist() == [1.0, 3.0]
+
+    frame = market_data.history(["AAA", "BBB"])
+    assert list(frame.columns) == ["AAA", "BBB"]
+    assert len(frame) == 2
+
+
+def test_replay_recorded_responses(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    store.save("GET", f"{COOKIE_URL}/", b"", 404, {}, b"")
+    store.save("GET", CRUMB_URL, b"", 200, {"Content-Type": "text/plain"}, b"crumb1")
+    store.save("GET", f"{QUOTE_URL}?symbols=AAA&crumb=crumb1", b"", 200, {"Content-Type": "application/json"},
+               json.dumps({"quoteResponse": {"result": [{"symbol": "AAA", "regularMarketPrice": 10.0}]}}).encode())
+
+    offline = MarketData(client=HttpClient(session=FixtureSession(store, mode="replay"), max_retries=0))
+    assert offline.quotes(["AAA"]).loc["AAA", "regularMarketPrice"] == 10.0
+    with pytest.raises(requests.exceptions.ConnectionError):
+        offline.quotes(["BBB"])
+
+
+def test_parse_spark_v8_format():
+    history = parse_spark_response({"AAPL": {"timestamp": [86400 * 3], "close": [5.5]}})
+    assert history == {"AAPL": {"day": [3], "close": [5.5]}}
+
+
+def test_parse_spark_with_fewer_closes_than_timestamps():
+    history = parse_spark_response({"AAPL": {"timestamp": [86400 * 3, 86400 * 4, 86400 * 5], "close": [5.5, 6.0]}})
+    assert history == {"AAPL": {"day": [3, 4], "close": [5.5, 6.0]}}
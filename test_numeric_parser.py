@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import numeric_parser
+from numeric_parser import infer_separators, parse_numeric, parse_numeric_columns
+
+ITALIAN = ["6.476.595.712,60", "-4.008,49", "(1.234,50)", "2,05%", "-", "", "\xa01.000,00 ", None]
+ITALIAN_EXPECTED = [6476595712.60, -4008.49, -1234.50, 2.05, np.nan, np.nan, 1000.0, np.nan]
+
+
+@pytest.mark.parametrize("pyarrow", [True, False])
+@pytest.mark.parametrize("dtype", ["str", object])
+def test_parse_italian_values(monkeypatch, pyarrow, dtype):
+    if pyarrow and not numeric_parser.PYARROW_AVAILABLE:
+        pytest.skip("pyarrow non installato")
+    monkeypatch.setattr(numeric_parser, "PYARROW_AVAILABLE", pyarrow)
+    result = parse_numeric(pd.Series(ITALIAN, dtype=dtype), locale="it")
+    assert result.dtype == "float64"
+    np.testing.assert_allclose(result.to_numpy(), ITALIAN_EXPECTED)
+
+
+def test_numeric_and_mixed_columns_are_not_stringified():
+    floats = pd.Series([0.0767, 0.051], name="Weighting")
+    pd.testing.assert_series_equal(parse_numeric(floats, locale="it"), floats)
+    # Colonna Excel mista: i float restano tali anche con la convenzione italiana
+    mixed = pd.Series([0.0767, "0,051", None, "n/a"], dtype=object)
+    np.testing.assert_allclose(parse_numeric(mixed, locale="it").to_numpy(), [0.0767, 0.051, np.nan, np.nan])
+
+
+def test_infer_separators_and_per_column_locale():
+    assert infer_separators(["1.234,50", "2,05"]) == (",", ".")
+    assert infer_separators(["1,234.50", "2.05"]) == (".", ",")
+    assert parse_numeric(pd.Series(["1.234,50"]), locale=None).iloc[0] == 1234.5
+
+    df = pd.DataFrame({"Valore di mercato": ["1.234,50"], "Weight (%)": ["5.48%"], "Name": ["A"]})
+    out = parse_numeric_columns(df, {"Valore di mercato": "it", "Weight (%)": "en", "Missing": "en"})
+    assert out.loc[0, "Valore di mercato"] == 1234.5
+    assert out.loc[0, "Weight (%)"] == 5.48
+    assert df.loc[0, "Weight (%)"] == "5.48%"
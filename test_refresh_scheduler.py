@@ -0,0 +1,75 @@
+from datetime import date, datetime
+
+import pytest
+
+from refresh_scheduler import (
+    FreshnessScheduler,
+    parse_as_of_date,
+    read_extraetf_as_of,
+    read_ishares_as_of,
+    read_invesco_as_of,
+)
+
+DAY = 86400
+
+
+def _ts(day):
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return FreshnessScheduler(str(tmp_path / "refresh.db"))
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("2025-08-21", date(2025, 8, 21)),
+    ("20/08/2025", date(2025, 8, 20)),
+    ("20/Aug/2025", date(2025, 8, 20)),
+    ("20/ago/2025", date(2025, 8, 20)),
+    ("2025-08-25T00:00:00", date(2025, 8, 25)),
+    ("", None),
+    ("n/a", None),
+])
+def test_parse_as_of_date(value, expected):
+    assert parse_as_of_date(value) == expected
+
+
+def test_read_as_of_from_sources(tmp_path):
+    csv_file = tmp_path / "ishares.csv"
+    csv_file.write_text('﻿Al,"22/08/2025"\n \nTicker,Nome\n', encoding="utf-8")
+    assert read_ishares_as_of(str(csv_file)) == date(2025, 8, 22)
+    assert read_invesco_as_of({"effectiveDate": "2025-08-25"}) == date(2025, 8, 25)
+    data = {"results": [{"portfolio_breakdown": {"index_date_last_update": "2025-08-21"}}]}
+    assert read_extraetf_as_of(data) == date(2025, 8, 21)
+
+
+def test_new_funds_are_due_first(scheduler):
+    now = _ts(date(2025, 9, 1))
+    scheduler.record("ishares", "OLD", date(2025, 8, 1), checked_at=now - 10 * DAY)
+    scheduler.register("ishares", ["NEW"])
+    assert scheduler.due(now=now) == [("ishares", "NEW"), ("ishares", "OLD")]
+
+
+def test_fresh_fund_is_skipped_until_next_publication(scheduler):
+    checked = _ts(date(2025, 9, 1)) + 8 * 3600
+    assert scheduler.record("ishares", "A", date(2025, 9, 1), checked_at=checked) is True
+    assert scheduler.due(now=checked + 3600) == []
+    assert scheduler.due(now=checked + DAY) == [("ishares", "A")]
+
+
+def test_unchanged_checks_back_off(scheduler):
+    start = _ts(date(2025, 9, 1))
+    scheduler.record("ishares", "A", date(2025, 9, 1), checked_at=start)
+    assert scheduler.record("ishares", "A", date(2025, 9, 1), checked_at=start + DAY) is False
+    # Dopo un controllo senza novità il prossimo è tra due giorni
+    assert scheduler.due(now=start + 2 * DAY) == []
+    assert scheduler.due(now=start + 3 * DAY) == [("ishares", "A")]
+
+
+def test_plan_filters_work_and_respects_cadence(scheduler):
+    now = _ts(date(2025, 9, 10))
+    scheduler.record("vanguard", "V1", date(2025, 8, 31), checked_at=now - DAY)
+    scheduler.record("ishares", "I1", date(2025, 9, 8), checked_at=now - 2 * DAY)
+    planned = scheduler.plan({"vanguard": ["V1"], "ishares": ["I1", "I2"]}, now=now)
+    assert planned == {"vanguard": [], "ishares": ["I2", "I1"]}
@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraetf"))
+
+from portfolio_aggregator import PortfolioAggregator
+from response_archive import ResponseArchive
+
+
+def test_put_deduplicates_and_keeps_history(tmp_path):
+    archive = ResponseArchive(str(tmp_path / "archive.db"))
+
+    first, new_first = archive.put("IE00BK5BQT80", "extraetf", b'{"v":1}', fetched_at=100)
+    second, new_second = archive.put("IE00BK5BQT80", "extraetf", b'{"v":1}', fetched_at=200)
+    third, _ = archive.put("IE00BK5BQT80", "extraetf", b'{"v":2}', fetched_at=300)
+
+    assert first == second and new_first and not new_second
+    assert archive.latest_json("IE00BK5BQT80", "extraetf") == {"v": 2}
+    assert [h["sha256"] for h in archive.history("IE00BK5BQT80", "extraetf")] == [third, second, first]
+    assert archive.get(first) == b'{"v":1}'
+    assert archive.stats()["blobs"] == 2 and archive.stats()["responses"] == 3
+    assert archive.latest("IE00BK5BQT80", "jpmorgan") is None
+
+
+def test_latest_many_and_aggregator(tmp_path):
+    archive = ResponseArchive(str(tmp_path / "archive.db"))
+    for isin in ("IE00BK5BQT80", "IE00B6R52259"):
+        archive.put_json(isin, "extraetf", {"results": [{"isin": isin, "asset_class_name": "old"}]}, fetched_at=1)
+        archive.put_json(isin, "extraetf", {"results": [{"isin": isin, "asset_class_name": "Azioni"}]}, fetched_at=2)
+
+    latest = archive.latest_many("extraetf")
+    assert set(latest) == {"IE00BK5BQT80", "IE00B6R52259"}
+    assert json.loads(latest["IE00B6R52259"])["results"][0]["asset_class_name"] == "Azioni"
+
+    aggregator = PortfolioAggregator(data_dir=str(tmp_path))
+    aggregator.load_etf_data()
+    assert aggregator.etf_data["IE00BK5BQT80"]["asset_class_name"] == "Azioni"
+
+
+def test_import_json_directory(tmp_path):
+    for isin in ("IE00BK5BQT80", "IE00B6R52259"):
+        with open(tmp_path / f"{isin}.json", "w", encoding="utf-8") as f:
+            json.dump({"results": [{"isin": isin}]}, f, indent=2)
+
+    archive = ResponseArchive(str(tmp_path / "archive.db"))
+    assert archive.import_json_directory(str(tmp_path), "extraetf") == 2
+    assert archive.isins("extraetf") == ["IE00B6R52259", "IE00BK5BQT80"]
+    # Il contenuto è ricompattato: niente indentazione
+    assert b"\n" not in archive.latest("IE00BK5BQT80", "extraetf")
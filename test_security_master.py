@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from ishares_data_extractor import extract_ishares, normalize_ishares_holdings
+from security_master import UNRESOLVED, SecurityMaster
+
+
+def test_identifiers_from_different_sources_share_one_id():
+    master = SecurityMaster()
+    extraetf = pd.DataFrame({"isin": ["US67066G1040", "US5949181045", None],
+                             "name": ["Nvidia", "Microsoft Corp.", None]})
+    assert master.resolve_frame(extraetf).tolist() == [0, 1, UNRESOLVED]
+
+    # iShares: solo ticker e nome; JPMorgan: ticker e ISIN
+    ishares = pd.DataFrame({"Ticker": ["NVDA", "MSFT"], "Nome": ["NVIDIA CORP", "MICROSOFT CORP"]})
+    assert master.resolve_frame(ishares, {"ticker": "Ticker", "name": "Nome"}).tolist() == [0, 1]
+    assert master.resolve(ticker="nvda", isin="US67066G1040") == 0
+    assert master.label(0) == "Nvidia (US67066G1040)"
+    assert master.info(0)["ticker"] == "NVDA"
+
+
+def test_name_match_does_not_override_a_different_isin():
+    master = SecurityMaster()
+    bonds = pd.DataFrame({"isin": ["FR0012938116", "FR0013250560"],
+                          "name": ["France (Republic Of) 1%", "France (Republic Of) 1%"]})
+    assert master.resolve_frame(bonds).tolist() == [0, 1]
+    assert master.resolve_frame(bonds.iloc[::-1]).tolist() == [1, 0]
+    # Nome condiviso da due obbligazioni dello stesso frame: non identifica nessuna delle due
+    assert master.resolve(name="FRANCE REPUBLIC OF 1", create=False) is None
+    assert master.resolve(isin="XS0000000000", create=False) is None
+
+
+def test_save_and_reload(tmp_path):
+    path = str(tmp_path / "securities.db")
+    master = SecurityMaster(path)
+    master.resolve_frame(pd.DataFrame({"isin": ["US0378331005"], "cusip": ["037833100"], "name": ["Apple Inc"]}))
+    assert master.save() == 1
+
+    reloaded = SecurityMaster(path)
+    assert len(reloaded) == 1
+    assert reloaded.lookup("cusip", "037833100") == 0
+    assert reloaded.resolve(name="APPLE INC.", create=False) == 0
+
+
+def test_issuer_tickers_do_not_merge_different_bonds():
+    extracted = extract_ishares("IE00BDBRDM35", verbose=False, write_files=False)
+    holdings = normalize_ishares_holdings(extracted["holdings"], "IE00BDBRDM35", extracted["as_of_date"])
+    master = SecurityMaster()
+    ids = master.resolve_frame(holdings)
+
+    # Ogni ID risolto è una sola riga del fondo: niente titoli che raccolgono tutte le JGB o i TNOTE
+    resolved = ids[ids != UNRESOLVED]
+    assert len(np.unique(resolved)) == len(resolved) > 0
+    # Righe con lo stesso ticker dell'emittente e lo stesso nome: nessun identificativo, non risolte
+    tnote = (holdings["ticker"] == "TNOTE").fillna(False).to_numpy()
+    assert (ids[tnote & (holdings["name"] == "TREASURY NOTE").fillna(False).to_numpy()] == UNRESOLVED).all()
+
+    # Stesso ticker su borse diverse: titoli distinti
+    equities = pd.DataFrame({"etf_isin": "IE00B4L5Y983", "ticker": ["SAN", "SAN", "T"],
+                             "name": ["BANCO SANTANDER SA", "SANOFI SA", "AT&T INC"]})
+    other = pd.DataFrame({"etf_isin": "JP0000000000", "ticker": ["T"], "name": ["TOKYO GAS"]})
+    first, second, att = master.resolve_frame(equities).tolist()
+    assert len({first, second, att}) == 3
+    assert master.resolve_frame(other).tolist() != [att]
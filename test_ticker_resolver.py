@@ -0,0 +1,88 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from cache_manager import CacheManager
+from http_client import HttpClient
+from ticker_resolver import TickerResolver
+
+KNOWN = {"US67066G1040": "NVDA", "US0231351067": "AMZN"}
+
+
+@pytest.fixture
+def search_server():
+    """Server di ricerca locale che imita l'endpoint Yahoo."""
+    queries = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            isin = parse_qs(urlparse(self.path).query)["q"][0]
+            queries.append(isin)
+            if isin == "BROKEN":
+                self.send_response(500)
+                self.end_headers()
+                return
+            quotes = [{"symbol": KNOWN[isin], "longname": f"{KNOWN[isin]} Inc", "exchange": "NMS"}] if isin in KNOWN else []
+            body = json.dumps({"quotes": quotes}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/search", queries
+    server.shutdown()
+
+
+def make_resolver(url, cache):
+    client = HttpClient(max_retries=0)
+    return TickerResolver(cache=cache, client=client, search_url=url, max_workers=4)
+
+
+def test_resolve_many_dedupes_and_caches(search_server, tmp_path):
+    url, queries = search_server
+    cache = CacheManager(use_persistent=True, db_path=str(tmp_path / "tickers.db"))
+
+    results = make_resolver(url, cache).resolve_many(
+        ["US67066G1040", "us67066g1040 ", "US0231351067", "XX0000000000", "", None])
+    assert results["US67066G1040"]["ticker"] == "NVDA"
+    assert results["US0231351067"]["ticker"] == "AMZN"
+    assert results["XX0000000000"]["ticker"] is None
+    assert sorted(queries) == ["US0231351067", "US67066G1040", "XX0000000000"]
+
+    # Seconda esecuzione: tutto dalla cache, compresi i risultati negativi
+    resolver = make_resolver(url, cache)
+    assert resolver.resolve("US0231351067") == "AMZN"
+    assert resolver.resolve_many(["XX0000000000"])["XX0000000000"]["ticker"] is None
+    assert len(queries) == 3
+    assert resolver.stats["cache_hits"] == 2
+
+
+def test_errors_are_not_cached(search_server, tmp_path):
+    url, queries = search_server
+    cache = CacheManager(use_persistent=True, db_path=str(tmp_path / "tickers.db"))
+
+    resolver = make_resolver(url, cache)
+    assert resolver.resolve_many(["BROKEN", "US67066G1040"]) == {
+        "US67066G1040": {"ticker": "NVDA", "name": "NVDA Inc", "exchange": "NMS"}}
+    assert "BROKEN" in resolver.errors
+    assert not cache.exists("ticker:BROKEN")
+
+
+def test_negative_results_expire(search_server, tmp_path):
+    url, queries = search_server
+    cache = CacheManager(use_persistent=True, db_path=str(tmp_path / "tickers.db"))
+    make_resolver(url, cache).resolve_many(["XX0000000000"])
+
+    resolver = make_resolver(url, cache)
+    resolver.negative_ttl_seconds = -1
+    resolver.resolve_many(["XX0000000000"])
+    assert queries == ["XX0000000000", "XX0000000000"]
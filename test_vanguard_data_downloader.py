@@ -0,0 +1,102 @@
+import pytest
+
+from vanguard_data_downloader import (
+    VanguardFetcher,
+    build_batched_query,
+    parse_batched_response,
+)
+from vanguard_portid_index import VanguardPortIdIndex
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    def __init__(self, responder):
+        self.headers = {}
+        self.payloads = []
+        self._responder = responder
+
+    def post(self, url, json=None, timeout=None):
+        self.payloads.append(json)
+        return FakeResponse(self._responder(json))
+
+
+def _fake_data(port_ids):
+    # Fondi senza portId, nell'ordine della variabile $portIds
+    return {
+        "allocation": [{"marketAllocation": [
+            {"portId": port_id, "countryCode": "US", "fundMktPercent": 60.0, "__typename": "X"},
+            {"portId": port_id, "countryCode": "JP", "fundMktPercent": 40.0, "__typename": "X"},
+        ]} for port_id in port_ids],
+        "sectors": [{"sectorDiversification": [{"sectorName": "Tech", "fundPercent": 25.0}]}
+                    for _ in port_ids],
+    }
+
+
+def test_build_batched_query_uses_one_port_id_list_per_section():
+    payload = build_batched_query(["9679", 'x"1234'], ["allocation", "sectors"])
+    query = payload["query"]
+    assert "allocation: funds(portIds: $portIds)" in query
+    assert "sectors: funds(portIds: $portIds)" in query
+    assert query.count("marketAllocation") == 1
+    # I portId viaggiano come variabile, mai interpolati nella query
+    assert payload["variables"] == {"portIds": ["9679", 'x"1234']}
+    assert "1234" not in query
+
+
+def test_build_batched_query_unknown_section():
+    with pytest.raises(ValueError):
+        build_batched_query(["9679"], ["unknown"])
+
+
+def test_parse_batched_response_normalizes_frames():
+    frames = parse_batched_response(_fake_data(["1", "2"]), ["1", "2"], ["allocation", "sectors", "holdings"])
+    assert len(frames["allocation"]) == 4
+    assert "__typename" not in frames["allocation"].columns
+    assert set(frames["sectors"]["portId"]) == {"1", "2"}
+    assert frames["holdings"].empty
+    assert "portId" in frames["holdings"].columns
+    assert frames["sectors"]["portId"].tolist() == ["1", "2"]
+
+
+def test_parse_batched_response_drops_misaligned_sections():
+    data = _fake_data(["1", "2"])
+    data["sectors"] = data["sectors"][:1]
+    frames = parse_batched_response(data, ["1", "2"], ["allocation", "sectors"])
+    assert len(frames["allocation"]) == 4
+    assert frames["sectors"].empty
+
+
+def test_fetcher_chunks_requests():
+    def responder(payload):
+        return {"data": _fake_data(payload["variables"]["portIds"])}
+
+    session = FakeSession(responder)
+    fetcher = VanguardFetcher(session=session, batch_size=2, sections=("allocation", "sectors"))
+    frames = fetcher.fetch(["1", "2", "3", "2"])
+
+    assert len(session.payloads) == 2
+    assert len(frames["allocation"]) == 6
+    assert sorted(frames["sectors"]["portId"].unique()) == ["1", "2", "3"]
+
+
+def test_fetch_isins_keeps_share_classes_sharing_a_port_id(tmp_path):
+    index = VanguardPortIdIndex(str(tmp_path / "portids.db"), fetch_func=lambda: [
+        ("IE00BK5BQT80", "9679", "FTSE All-World Acc"), ("IE00B3RBWM25", "9679", "FTSE All-World Dist")])
+    index.refresh()
+    session = FakeSession(lambda payload: {"data": _fake_data(payload["variables"]["portIds"])})
+    fetcher = VanguardFetcher(session=session, sections=("allocation",))
+
+    frames = fetcher.fetch_isins(["IE00BK5BQT80", "IE00B3RBWM25"], index)
+
+    assert len(session.payloads) == 1
+    assert sorted(frames["allocation"]["isin"].value_counts().items()) == [("IE00B3RBWM25", 2), ("IE00BK5BQT80", 2)]
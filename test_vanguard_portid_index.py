@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from http_fixtures import FixtureSession, FixtureStore
+from vanguard_data_downloader import url
+from vanguard_portid_index import FUND_LIST_QUERY, VanguardPortIdIndex, fetch_fund_list, parse_fund_list
+
+
+@pytest.fixture
+def fund_list():
+    return [("IE00BK5BQT80", "9679", "FTSE All-World"), ("IE00B3XXRP09", "9503", "S&P 500")]
+
+
+@pytest.fixture
+def index(tmp_path, fund_list):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return list(fund_list)
+
+    idx = VanguardPortIdIndex(str(tmp_path / "portids.db"), fetch_func=fetch)
+    idx.calls = calls
+    return idx
+
+
+def test_parse_fund_list_reads_isin_from_profile_or_identifiers():
+    data = {"funds": [
+        {"profile": {"portId": "1", "isin": "ie0000000001", "fundFullName": "A"}},
+        {"profile": {"portId": "2", "identifiers": [{"altId": "ISIN", "altIdValue": "IE0000000002"}]}},
+        {"profile": {"portId": "3"}},
+    ]}
+    assert parse_fund_list(data) == [("IE0000000001", "1", "A"), ("IE0000000002", "2", None)]
+
+
+def test_refresh_is_incremental(index, fund_list):
+    assert index.refresh() == {"added": 2, "updated": 0}
+    # Refresh recente: nessuna nuova chiamata
+    assert index.refresh() == {"added": 0, "updated": 0}
+    assert len(index.calls) == 1
+
+    fund_list[0] = ("IE00BK5BQT80", "9999", "FTSE All-World")
+    assert index.refresh(force=True) == {"added": 0, "updated": 1}
+    assert index.lookup("ie00bk5bqt80") == "9999"
+
+    # Solo il nome cambia: la riga viene comunque aggiornata
+    fund_list[1] = ("IE00B3XXRP09", "9503", "S&P 500 UCITS ETF")
+    assert index.refresh(force=True) == {"added": 0, "updated": 1}
+    assert index.refresh(force=True) == {"added": 0, "updated": 0}
+
+
+def test_resolve_batches(index):
+    index.refresh()
+    batches, missing = index.resolve_batches(
+        ["IE00BK5BQT80", "IE00B3XXRP09", "IE00BK5BQT80", "XX0000000000"], batch_size=1
+    )
+    assert batches == [["9679"], ["9503"]]
+    assert missing == ["XX0000000000"]
+    # L'ISIN mancante non forza un nuovo download se il refresh è recente
+    assert len(index.calls) == 1
+
+
+def test_fetch_fund_list_raises_on_graphql_errors(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    store.save("POST", url, json.dumps(FUND_LIST_QUERY).encode(), 200, {"Content-Type": "application/json"},
+               json.dumps({"errors": [{"message": "Cannot query field \"isin\" on type \"Profile\"."}]}).encode())
+
+    with pytest.raises(ValueError, match="isin"):
+        fetch_fund_list(FixtureSession(store, mode="replay"))
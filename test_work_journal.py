@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from work_journal import DONE, FAILED, IN_FLIGHT, PENDING, WorkJournal, atomic_write, file_digest
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return WorkJournal(str(tmp_path / "journal.db"), max_attempts=2)
+
+
+def _items(*isins):
+    return [(isin, "download") for isin in isins]
+
+
+def test_resume_after_interruption(journal):
+    run_id = journal.start_run("job", _items("A", "B", "C"))
+    journal.claim(run_id, "A", "download")
+    journal.complete(run_id, "A", "download")
+    journal.claim(run_id, "B", "download")
+    # Crash: B resta in_flight, C pending
+
+    resumed = WorkJournal(str(journal.db_path), max_attempts=2)
+    assert resumed.start_run("job", _items("A", "B", "C")) == run_id
+    assert resumed.pending(run_id) == _items("B", "C")
+    assert resumed.summary(run_id)["states"] == {PENDING: 2, IN_FLIGHT: 0, DONE: 1, FAILED: 0}
+
+
+def test_finished_run_starts_a_new_one(journal):
+    run_id = journal.start_run("job", _items("A"))
+    journal.claim(run_id, "A", "download")
+    journal.complete(run_id, "A", "download")
+    assert journal.finish_run(run_id)
+    assert journal.start_run("job", _items("A")) != run_id
+
+
+def test_failed_items_are_retried_until_max_attempts(journal):
+    run_id = journal.start_run("job", _items("A"))
+    for _ in range(2):
+        assert journal.pending(run_id) == _items("A")
+        journal.claim(run_id, "A", "download")
+        journal.fail(run_id, "A", "download", "timeout")
+    assert journal.pending(run_id) == []
+    assert journal.finish_run(run_id)
+
+    report = journal.summary(run_id)
+    assert report["total_retries"] == 1
+    assert report["failed"] == [{"isin": "A", "stage": "download", "attempts": 2, "error": "timeout"}]
+
+
+def test_write_output_is_atomic_and_idempotent(journal, tmp_path):
+    path = str(tmp_path / "out" / "A.json")
+    run_id = journal.start_run("job", _items("A"))
+    digest = journal.write_output(run_id, "A", "download", path, b'{"a": 1}')
+    assert file_digest(path) == digest
+    mtime = os.stat(path).st_mtime_ns
+
+    # Stesso contenuto già completato: nessuna riscrittura
+    journal.write_output(run_id, "A", "download", path, b'{"a": 1}')
+    assert os.stat(path).st_mtime_ns == mtime
+    assert journal.summary(run_id)["states"][DONE] == 1
+    assert [f for f in os.listdir(tmp_path / "out") if f.startswith(".tmp-")] == []
+
+
+def test_atomic_write_replaces_content(tmp_path):
+    path = str(tmp_path / "f.bin")
+    atomic_write(path, b"old")
+    atomic_write(path, b"new")
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import xlsx_reader
+from xlsx_reader import read_xlsx, read_xlsx_streaming
+
+HEADER = [None, "Name", "ISIN", "Country", "Exchange", "Weighting"]
+ROWS = [
+    [1, "NVIDIA CORP", "US67066G1040", "United States", "-", 0.0767],
+    [2, "MICROSOFT CORP", "US5949181045", "United States", "-", 0.0641],
+    [3, "CASH", None, "-", "-", "N/A"],
+]
+
+
+def write_xlsx(path, rows=ROWS):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Disclaimer"])
+    sheet.append([])
+    sheet.append([])
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_streaming_read_matches_read_excel(tmp_path):
+    path = write_xlsx(tmp_path / "fund.xlsx")
+    pd.testing.assert_frame_equal(read_xlsx_streaming(path, skiprows=3), pd.read_excel(path, skiprows=3))
+
+    df = read_xlsx_streaming(path, skiprows=3, usecols=["Weighting", "Name", "Missing"])
+    assert list(df.columns) == ["Name", "Weighting"]
+    assert df["Weighting"].dtype == "float64"
+    assert df["Weighting"].isna().sum() == 1
+
+
+@pytest.mark.skipif(not xlsx_reader.PYARROW_AVAILABLE, reason="pyarrow non installato")
+def test_cache_keyed_by_content(tmp_path, monkeypatch):
+    path = write_xlsx(tmp_path / "fund.xlsx")
+    cache_dir = str(tmp_path / "cache")
+    first = read_xlsx(path, skiprows=3, usecols=["Name", "Weighting"], cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("il file non deve essere riletto")
+
+    streaming = xlsx_reader.read_xlsx_streaming
+    monkeypatch.setattr(xlsx_reader, "read_xlsx_streaming", fail)
+    pd.testing.assert_frame_equal(read_xlsx(path, skiprows=3, usecols=["Name", "Weighting"], cache_dir=cache_dir),
+                                  first)
+
+    # Contenuto modificato: nuova chiave e nuova lettura
+    monkeypatch.setattr(xlsx_reader, "read_xlsx_streaming", streaming)
+    write_xlsx(path, ROWS[:1])
+    assert len(read_xlsx(path, skiprows=3, usecols=["Name", "Weighting"], cache_dir=cache_dir)) == 1
+    assert len(os.listdir(cache_dir)) == 2
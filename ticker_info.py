@@ -1,39 +1,24 @@
-import requests
-import yfinance as yf
+import sys
 
-# Crea una sessione con User-Agent "da browser"
-session = requests.Session()
-session.headers.update({
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115 Safari/537.36"
-})
+from cache_manager import CacheManager
+from market_data import MarketData
 
 # ticker = "AAPL"
-ticker = "SSAC.L"
-stock = yf.Ticker(ticker, session=session)
+DEFAULT_TICKERS = ["SSAC.L"]
 
-info = stock.info
-# shares = stock.shares
-# print(f"aaaaaaAA: {shares}")
+if __name__ == "__main__":
+    tickers = sys.argv[1:] or DEFAULT_TICKERS
 
-print(info.get("longName"))
-print(stock.history(period="1mo").tail())
+    # Quotazioni e storici di tutti i ticker con poche richieste multi-simbolo
+    market_data = MarketData(cache=CacheManager(use_persistent=True))
 
-for k, v in info.items():
-    print(k, ":", v)
+    quotes = market_data.quotes(tickers)
+    history = market_data.history(tickers, range_="1mo")
 
-# import requests
-# import yfinance as yf
-#
-# # Creo la sessione con User-Agent
-# session = requests.Session()
-# session.headers.update({
-#     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115 Safari/537.36"
-# })
-#
-# # Patch globale: sostituisco la sessione di yfinance
-# yf.shared._requests = session
-#
-# ticker = "AAPL"
-# stock = yf.Ticker(ticker)
-#
-# print(stock.info.get("longName"))
\ No newline at end of file
+    for ticker, info in quotes.iterrows():
+        print(info.get("longName"))
+        for k, v in info.items():
+            print(k, ":", v)
+
+    print(history.tail())
+    print(f"Richieste: {market_data.stats}")
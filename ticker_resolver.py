@@ -0,0 +1,132 @@
+"""
+Risoluzione ISIN -> ticker in blocco tramite la ricerca di Yahoo Finance.
+
+Gli ISIN vengono deduplicati e cercati prima nella cache persistente
+(cache_manager); solo quelli mancanti o scaduti vengono richiesti al servizio
+di ricerca, in parallelo e con rate limit. Anche gli ISIN senza risultato
+vengono memorizzati (con una scadenza più breve) per non ripetere la ricerca.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import requests
+
+from cache_manager import CacheManager
+from http_client import HttpClient
+
+YAHOO_SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"
+
+CACHE_KEY_PREFIX = "ticker:"
+DEFAULT_TTL_SECONDS = 30 * 86400
+DEFAULT_NEGATIVE_TTL_SECONDS = 7 * 86400
+
+
+def parse_search_response(data: Dict) -> Dict[str, Optional[str]]:
+    """
+    Estrae il primo risultato dalla risposta della ricerca Yahoo.
+
+    Returns:
+        Dict con ticker, name ed exchange (ticker None se non ci sono risultati)
+    """
+    quotes = data.get("quotes") or []
+    if not quotes:
+        return {"ticker": None, "name": None, "exchange": None}
+    quote = quotes[0]
+    return {
+        "ticker": quote.get("symbol"),
+        "name": quote.get("longname") or quote.get("shortname"),
+        "exchange": quote.get("exchange"),
+    }
+
+
+class TickerResolver:
+    """Risolve ISIN in ticker con cache persistente e richieste concorrenti."""
+
+    def __init__(self, cache: Optional[CacheManager] = None,
+                 client: Optional[HttpClient] = None,
+                 search_url: str = YAHOO_SEARCH_URL,
+                 max_workers: int = 8,
+                 requests_per_second: float = 5.0,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 negative_ttl_seconds: float = DEFAULT_NEGATIVE_TTL_SECONDS):
+        """
+        Args:
+            cache: Cache ISIN -> ticker (default: cache persistente su cache.db)
+            client: Client HTTP (default: nuovo client con il rate limit indicato)
+            search_url: Endpoint di ricerca
+            max_workers: Richieste contemporanee
+            requests_per_second: Limite di frequenza del client di default
+            ttl_seconds: Validità di un ticker in cache
+            negative_ttl_seconds: Validità di un risultato vuoto in cache
+        """
+        self.cache = cache or CacheManager(use_persistent=True)
+        self.client = client or HttpClient(requests_per_second=requests_per_second, burst=max_workers)
+        self.search_url = search_url
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.errors: Dict[str, str] = {}
+        self.stats = {"requested": 0, "cache_hits": 0, "fetched": 0, "not_found": 0, "errors": 0}
+
+    @staticmethod
+    def _cache_key(isin: str) -> str:
+        return f"{CACHE_KEY_PREFIX}{isin}"
+
+    def _is_fresh(self, info: Dict) -> bool:
+        ttl = self.ttl_seconds if info["value"].get("ticker") else self.negative_ttl_seconds
+        return info["age_seconds"] <= ttl
+
+    def _search(self, isin: str) -> Dict[str, Optional[str]]:
+        params = {"q": isin, "quotesCount": 1, "newsCount": 0}
+        return parse_search_response(self.client.get(self.search_url, params=params).json())
+
+    def resolve_many(self, isins: Iterable[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Risolve una lista di ISIN.
+
+        Args:
+            isins: ISIN da risolvere (anche duplicati o vuoti)
+
+        Returns:
+            Dict ISIN -> {ticker, name, exchange}. Gli ISIN falliti per errori
+            temporanei non compaiono nel risultato e sono elencati in self.errors.
+        """
+        unique = list(dict.fromkeys(str(isin).strip().upper() for isin in isins if isin and str(isin).strip()))
+        self.stats["requested"] += len(unique)
+
+        cached = self.cache.get_many_with_info(self._cache_key(isin) for isin in unique)
+        results: Dict[str, Dict[str, Optional[str]]] = {}
+        misses = []
+        for isin in unique:
+            info = cached.get(self._cache_key(isin))
+            if info and self._is_fresh(info):
+                results[isin] = info["value"]
+            else:
+                misses.append(isin)
+        self.stats["cache_hits"] += len(unique) - len(misses)
+
+        if misses:
+            print(f"🔎 Ricerca di {len(misses)} ISIN ({len(unique) - len(misses)} già in cache)")
+            fetched = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {isin: executor.submit(self._search, isin) for isin in misses}
+                for isin, future in futures.items():
+                    try:
+                        fetched[isin] = future.result()
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        # Errori temporanei: non vengono memorizzati così si ritenta alla prossima esecuzione
+                        self.errors[isin] = str(e)
+                        self.stats["errors"] += 1
+
+            self.cache.set_many({self._cache_key(isin): value for isin, value in fetched.items()})
+            self.stats["fetched"] += len(fetched)
+            self.stats["not_found"] += sum(1 for value in fetched.values() if not value["ticker"])
+            results.update(fetched)
+
+        return {isin: results[isin] for isin in unique if isin in results}
+
+    def resolve(self, isin: str) -> Optional[str]:
+        """Risolve un singolo ISIN e restituisce il ticker (None se non trovato)."""
+        result = self.resolve_many([isin]).get(str(isin).strip().upper())
+        return result["ticker"] if result else None
@@ -1,3 +1,17 @@
+"""
+Downloader Vanguard basato sull'endpoint GraphQL del sito italiano.
+
+L'endpoint accetta liste di portId: per ridurre il numero di round-trip
+ogni richiesta contiene, tramite alias GraphQL, tutte le sezioni richieste
+(profilo, allocazione geografica, settori) per un blocco di fondi, passato
+una volta sola come variabile $portIds. I fondi di ogni sezione vengono
+attribuiti ai portId per posizione, nell'ordine della variabile: il campo
+portId sul fondo non compare nelle query note del sito.
+Le risposte vengono trasformate in DataFrame normalizzati in memoria.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
 import pandas as pd
 import requests
 
@@ -12,17 +26,22 @@ headers = {
     "x-consumer-id": "it0"
 }
 
-payload = {
-    "operationName": "MarketAllocationGqlQuery",
-    "variables": {"portIds": ["9679"]},
-    "query": """query MarketAllocationGqlQuery($portIds: [String!]!) {
-      funds(portIds: $portIds) {
-        profile {
+DEFAULT_BATCH_SIZE = 20
+
+# Per ciascuna sezione: campo radice della query e selezione dei campi.
+# "allocation" e "sectors" corrispondono a MarketAllocationGqlQuery e getSectorDiversification.
+SECTIONS: Dict[str, Dict[str, str]] = {
+    "profile": {
+        "root": "funds",
+        "selection": """profile {
           fundFullName
           marketOfDomicile
-          __typename
-        }
-        marketAllocation {
+          primarySectorEquityClassification
+        }""",
+    },
+    "allocation": {
+        "root": "funds",
+        "selection": """marketAllocation {
           portId
           date
           countryCode
@@ -32,37 +51,232 @@ payload = {
           benchmarkMktPercent
           regionCode
           regionName
-          __typename
-        }
-        __typename
-      }
-    }"""
+        }""",
+    },
+    "sectors": {
+        "root": "funds",
+        "selection": """sectorDiversification {
+          sectorCode
+          date
+          sectorName
+          fundPercent
+          benchmarkPercent
+        }""",
+    },
+    "holdings": {
+        "root": "borHoldings",
+        "selection": """holdings(limit: 10000) {
+          totalHoldings
+          items {
+            issuerName
+            securityLongDescription
+            ticker
+            sedol1
+            bloombergIsoCountry
+            gicsSectorDescription
+            marketValuePercentage
+            marketValueBaseCurrency
+            numberOfShares
+            asOfDate
+          }
+        }""",
+    },
 }
 
-# Settori
-
-# ```json
-# {operationName: "getSectorDiversification", variables: {portIds: ["9679"]},…}
-# operationName
-# :
-# "getSectorDiversification"
-# query
-# :
-# "query getSectorDiversification($portIds: [String!]!) {\n  funds(portIds: $portIds) {\n    profile {\n      primarySectorEquityClassification\n      __typename\n    }\n    sectorDiversification {\n      sectorCode\n      date\n      sectorName\n      fundPercent\n      benchmarkPercent\n      __typename\n    }\n    __typename\n  }\n}\n"
-# variables
-# :
-# {portIds: ["9679"]}
-# ```
-
-resp = requests.post(url, headers=headers, json=payload)
-data = resp.json()
-
-# estraiamo la tabella marketAllocation
-alloc = data["data"]["funds"][0]["marketAllocation"]
-df = pd.DataFrame(alloc)
-
-# esporta in CSV e XLSX
-df.to_csv("market_allocation.csv", index=False)
-df.to_excel("market_allocation.xlsx", index=False)
-
-print("Salvati market_allocation.csv e market_allocation.xlsx")
+# "holdings" (borHoldings) non è tra le sezioni di default: il suo schema non è verificato
+# e un campo errato farebbe fallire l'intera richiesta aggregata
+DEFAULT_SECTIONS = ("profile", "allocation", "sectors")
+
+
+def _chunks(items: Sequence[str], size: int) -> Iterable[List[str]]:
+    """Divide una sequenza in blocchi di dimensione massima size."""
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
+
+
+def build_batched_query(port_ids: Sequence[str], sections: Sequence[str] = DEFAULT_SECTIONS) -> Dict:
+    """
+    Costruisce il payload di una singola richiesta GraphQL: un alias per sezione,
+    ciascuno con la lista completa dei portId passata come variabile.
+
+    Args:
+        port_ids: Lista dei portId Vanguard
+        sections: Sezioni da richiedere (chiavi di SECTIONS)
+
+    Returns:
+        Payload JSON pronto per requests.post
+    """
+    unknown = [s for s in sections if s not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Sezioni sconosciute: {unknown}")
+
+    fields = []
+    for section in sections:
+        spec = SECTIONS[section]
+        fields.append(
+            f'{section}: {spec["root"]}(portIds: $portIds) {{\n'
+            f'        {spec["selection"]}\n'
+            f'      }}'
+        )
+
+    query = "query BatchedFundsQuery($portIds: [String!]!) {\n      " + "\n      ".join(fields) + "\n    }"
+    return {"operationName": "BatchedFundsQuery", "variables": {"portIds": [str(p) for p in port_ids]},
+            "query": query}
+
+
+def _drop_typename(rows: List[Dict]) -> List[Dict]:
+    return [{k: v for k, v in row.items() if k != "__typename"} for row in rows]
+
+
+def parse_batched_response(data: Dict, port_ids: Sequence[str],
+                           sections: Sequence[str] = DEFAULT_SECTIONS) -> Dict[str, pd.DataFrame]:
+    """
+    Converte la risposta di build_batched_query in DataFrame normalizzati,
+    uno per sezione, con la colonna portId sempre presente.
+
+    Il fondo in posizione i di ogni sezione è quello di port_ids[i]; una sezione con un
+    numero di fondi diverso da quello richiesto viene scartata con un avviso.
+
+    Args:
+        data: Contenuto della chiave "data" della risposta GraphQL
+        port_ids: portId richiesti nella stessa richiesta
+        sections: Sezioni richieste
+
+    Returns:
+        Dict sezione -> DataFrame
+    """
+    rows: Dict[str, List[Dict]] = {section: [] for section in sections}
+    data = data or {}
+    port_ids = [str(p) for p in port_ids]
+
+    for section in sections:
+        funds = data.get(section) or []
+        if len(funds) != len(port_ids):
+            print(f"⚠️ Sezione {section}: {len(funds)} fondi per {len(port_ids)} portId, scartata")
+            continue
+        for port_id, fund in zip(port_ids, funds):
+            if fund is None:
+                continue
+
+            if section == "holdings":
+                items = (fund.get("holdings") or {}).get("items") or []
+                for item in _drop_typename(items):
+                    rows[section].append({"portId": port_id, **item})
+            elif section == "profile":
+                profile = fund.get("profile") or {}
+                rows[section].append({"portId": port_id, **_drop_typename([profile])[0]})
+            elif section == "allocation":
+                for item in _drop_typename(fund.get("marketAllocation") or []):
+                    rows[section].append({**item, "portId": port_id})
+            elif section == "sectors":
+                for item in _drop_typename(fund.get("sectorDiversification") or []):
+                    rows[section].append({"portId": port_id, **item})
+
+    frames = {}
+    for section, section_rows in rows.items():
+        df = pd.DataFrame(section_rows)
+        if "portId" not in df.columns:
+            df["portId"] = pd.Series(dtype="object")
+        frames[section] = df
+    return frames
+
+
+class VanguardFetcher:
+    """Scarica più sezioni per molti fondi Vanguard con richieste GraphQL aggregate."""
+
+    def __init__(self, session: Optional[requests.Session] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 sections: Sequence[str] = DEFAULT_SECTIONS,
+                 endpoint: str = url,
+                 timeout: float = 30):
+        """
+        Args:
+            session: Sessione HTTP da riutilizzare (default: nuova sessione)
+            batch_size: Numero massimo di fondi per richiesta
+            sections: Sezioni da richiedere per ogni fondo
+            endpoint: URL dell'endpoint GraphQL
+            timeout: Timeout in secondi per ogni richiesta
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size deve essere almeno 1")
+
+        self.session = session or requests.Session()
+        self.session.headers.update(headers)
+        self.batch_size = batch_size
+        self.sections = tuple(sections)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.errors: List[Dict] = []
+
+    def fetch_batch(self, port_ids: Sequence[str]) -> Dict[str, pd.DataFrame]:
+        """Esegue una singola richiesta per un blocco di fondi."""
+        payload = build_batched_query(port_ids, self.sections)
+        resp = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+        resp.raise_for_status()
+        body = resp.json()
+
+        # GraphQL può restituire dati parziali insieme agli errori
+        for error in body.get("errors") or []:
+            print(f"⚠️ Errore GraphQL: {error.get('message')}")
+            self.errors.append(error)
+
+        return parse_batched_response(body.get("data"), port_ids, self.sections)
+
+    def fetch(self, port_ids: Iterable[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Scarica tutte le sezioni per la lista di portId, in blocchi da batch_size.
+
+        Returns:
+            Dict sezione -> DataFrame concatenato su tutti i blocchi
+        """
+        unique_ids = list(dict.fromkeys(str(p) for p in port_ids))
+        collected: Dict[str, List[pd.DataFrame]] = {section: [] for section in self.sections}
+
+        for batch in _chunks(unique_ids, self.batch_size):
+            print(f"➡️  Richiesta Vanguard per {len(batch)} fondi...")
+            frames = self.fetch_batch(batch)
+            for section, df in frames.items():
+                if not df.empty:
+                    collected[section].append(df)
+
+        return {
+            section: pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame(columns=["portId"])
+            for section, dfs in collected.items()
+        }
+
+    def fetch_isins(self, isins: Iterable[str], index) -> Dict[str, pd.DataFrame]:
+        """
+        Come fetch, ma partendo da ISIN risolti tramite un VanguardPortIdIndex.
+        Ogni DataFrame riceve anche la colonna isin; le classi di quota che
+        condividono un portId ricevono ciascuna le proprie righe.
+        """
+        isins = list(isins)
+        batches, missing = index.resolve_batches(isins, batch_size=self.batch_size)
+        if missing:
+            print(f"⚠️ ISIN senza portId Vanguard: {missing}")
+
+        port_to_isins = pd.DataFrame([(port_id, isin) for isin, port_id in index.lookup_many(isins).items()],
+                                     columns=["portId", "isin"], dtype=object)
+        frames = self.fetch(port_id for batch in batches for port_id in batch)
+        return {section: df.astype({"portId": object}).merge(port_to_isins, on="portId", how="left")
+                for section, df in frames.items()}
+
+
+def main():
+    fetcher = VanguardFetcher(sections=("allocation", "sectors"))
+    frames = fetcher.fetch(["9679"])
+    for error in fetcher.errors:
+        print(f"❌ Errore GraphQL: {error.get('message')} {error.get('path') or ''}".rstrip())
+
+    # estraiamo la tabella marketAllocation
+    df = frames["allocation"]
+
+    # esporta in CSV e XLSX
+    df.to_csv("market_allocation.csv", index=False)
+    df.to_excel("market_allocation.xlsx", index=False)
+
+    print("Salvati market_allocation.csv e market_allocation.xlsx")
+
+
+if __name__ == "__main__":
+    main()
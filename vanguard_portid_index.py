@@ -0,0 +1,245 @@
+"""
+Indice persistente ISIN -> portId per i fondi Vanguard.
+
+L'endpoint GraphQL di Vanguard identifica i fondi tramite portId interni.
+L'indice viene costruito dalla lista fondi dell'emittente, salvato su SQLite
+e aggiornato in modo incrementale (solo le righe nuove o modificate).
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from vanguard_data_downloader import headers, url
+
+# Lista di tutti i fondi con i relativi identificativi.
+# Schema non verificato su una risposta registrata: solo funds { profile { fundFullName } }
+# coincide con le query di vanguard_data_downloader, mentre funds senza portIds e i campi
+# portId, isin e identifiers del profilo sono ipotesi. Se l'endpoint rifiuta la query
+# fetch_fund_list solleva un errore con i messaggi GraphQL invece di restituire una lista vuota
+FUND_LIST_QUERY = {
+    "operationName": "FundListQuery",
+    "variables": {},
+    "query": """query FundListQuery {
+      funds {
+        profile {
+          portId
+          fundFullName
+          isin
+          identifiers {
+            altId
+            altIdValue
+          }
+        }
+      }
+    }"""
+}
+
+# SQLite limita il numero di parametri per singola query
+_SQL_CHUNK = 500
+
+
+def parse_fund_list(data: Dict) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Estrae le coppie (isin, portId, nome) dalla risposta della lista fondi.
+
+    L'ISIN può trovarsi direttamente nel profilo o tra gli identificativi alternativi.
+    """
+    entries = []
+    for fund in (data or {}).get("funds") or []:
+        profile = fund.get("profile") or {}
+        port_id = profile.get("portId")
+        isin = profile.get("isin")
+        if not isin:
+            for identifier in profile.get("identifiers") or []:
+                if str(identifier.get("altId", "")).upper() == "ISIN":
+                    isin = identifier.get("altIdValue")
+                    break
+        if port_id and isin:
+            entries.append((isin.strip().upper(), str(port_id), profile.get("fundFullName")))
+    return entries
+
+
+def fetch_fund_list(session: Optional[requests.Session] = None, timeout: float = 30) -> List[Tuple[str, str, Optional[str]]]:
+    """Scarica la lista fondi dall'endpoint GraphQL di Vanguard."""
+    session = session or requests.Session()
+    resp = session.post(url, headers=headers, json=FUND_LIST_QUERY, timeout=timeout)
+    resp.raise_for_status()
+    body = resp.json()
+    # Una lista vuota per uno schema errato verrebbe registrata come refresh riuscito
+    if body.get("errors") and not (body.get("data") or {}).get("funds"):
+        messages = "; ".join(str(error.get("message")) for error in body["errors"])
+        raise ValueError(f"❌ Lista fondi Vanguard non disponibile: {messages}")
+    return parse_fund_list(body.get("data"))
+
+
+class VanguardPortIdIndex:
+    """Indice ISIN -> portId persistente su SQLite con refresh incrementale."""
+
+    def __init__(self, db_path: str = "vanguard_portids.db",
+                 fetch_func: Callable[[], List[Tuple[str, str, Optional[str]]]] = fetch_fund_list):
+        """
+        Args:
+            db_path: Percorso del database SQLite
+            fetch_func: Funzione che restituisce la lista (isin, portId, nome)
+        """
+        self.db_path = Path(db_path)
+        self.fetch_func = fetch_func
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza le tabelle dell'indice."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS port_ids (
+                    isin TEXT PRIMARY KEY,
+                    port_id TEXT NOT NULL,
+                    fund_name TEXT,
+                    first_seen REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_port_id ON port_ids(port_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_state (
+                    key TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def last_refresh(self) -> Optional[float]:
+        """Timestamp dell'ultimo refresh completato o None."""
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT value FROM index_state WHERE key = 'last_refresh'"
+                ).fetchone()
+                return row[0] if row else None
+
+    def upsert(self, entries: Iterable[Tuple[str, str, Optional[str]]]) -> Dict[str, int]:
+        """
+        Inserisce o aggiorna le coppie ISIN -> portId. Le righe invariate non vengono toccate.
+
+        Returns:
+            Dict con il numero di righe 'added' e 'updated'
+        """
+        entries = list(entries)
+        now = time.time()
+        with self._lock:
+            current = self._records(isin for isin, _, _ in entries)
+            added = [(isin, port_id, name, now, now) for isin, port_id, name in entries
+                     if isin not in current]
+            updated = [(port_id, name, now, isin) for isin, port_id, name in entries
+                       if isin in current and current[isin] != (port_id, name)]
+
+            with self._get_connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO port_ids (isin, port_id, fund_name, first_seen, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)", added
+                )
+                conn.executemany(
+                    "UPDATE port_ids SET port_id = ?, fund_name = ?, updated_at = ? WHERE isin = ?", updated
+                )
+        return {"added": len(added), "updated": len(updated)}
+
+    def refresh(self, max_age_seconds: float = 7 * 24 * 3600, force: bool = False) -> Dict[str, int]:
+        """
+        Aggiorna l'indice dalla lista fondi se l'ultimo refresh è più vecchio di max_age_seconds.
+
+        Returns:
+            Dict con 'added' e 'updated' (zero se il refresh non era necessario)
+        """
+        last = self.last_refresh()
+        if not force and last is not None and time.time() - last < max_age_seconds:
+            return {"added": 0, "updated": 0}
+
+        stats = self.upsert(self.fetch_func())
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO index_state (key, value) VALUES ('last_refresh', ?)",
+                    (time.time(),)
+                )
+        print(f"✅ Indice Vanguard aggiornato: {stats['added']} nuovi, {stats['updated']} modificati")
+        return stats
+
+    def lookup(self, isin: str) -> Optional[str]:
+        """Restituisce il portId di un ISIN o None."""
+        return self.lookup_many([isin]).get(isin.strip().upper())
+
+    def _records(self, isins: Iterable[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """ISIN -> (portId, nome del fondo) per gli ISIN presenti, con poche query."""
+        keys = list(dict.fromkeys(isin.strip().upper() for isin in isins))
+        result = {}
+        with self._lock:
+            with self._get_connection() as conn:
+                for start in range(0, len(keys), _SQL_CHUNK):
+                    chunk = keys[start:start + _SQL_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT isin, port_id, fund_name FROM port_ids WHERE isin IN ({placeholders})", chunk
+                    )
+                    result.update((isin, (port_id, name)) for isin, port_id, name in cursor.fetchall())
+        return result
+
+    def lookup_many(self, isins: Iterable[str]) -> Dict[str, str]:
+        """Risolve una lista di ISIN con poche query; restituisce solo quelli trovati."""
+        return {isin: port_id for isin, (port_id, _) in self._records(isins).items()}
+
+    def resolve_batches(self, isins: Iterable[str], batch_size: int = 20,
+                        refresh_missing: bool = True,
+                        missing_refresh_interval: float = 3600) -> Tuple[List[List[str]], List[str]]:
+        """
+        Trasforma una lista di ISIN in blocchi di portId pronti per VanguardFetcher.
+
+        Se alcuni ISIN non sono presenti e refresh_missing è True, aggiorna la lista
+        fondi (al massimo una volta ogni missing_refresh_interval secondi) prima di riprovare.
+
+        Returns:
+            Tupla (blocchi di portId, ISIN non risolti)
+        """
+        keys = list(dict.fromkeys(isin.strip().upper() for isin in isins))
+        found = self.lookup_many(keys)
+
+        if refresh_missing and len(found) < len(keys):
+            self.refresh(max_age_seconds=missing_refresh_interval)
+            found = self.lookup_many(keys)
+
+        port_ids = list(dict.fromkeys(found[isin] for isin in keys if isin in found))
+        missing = [isin for isin in keys if isin not in found]
+        batches = [port_ids[i:i + batch_size] for i in range(0, len(port_ids), batch_size)]
+        return batches, missing
+
+    def size(self) -> int:
+        """Numero di ISIN presenti nell'indice."""
+        with self._lock:
+            with self._get_connection() as conn:
+                return conn.execute("SELECT COUNT(*) FROM port_ids").fetchone()[0]
+
+
+if __name__ == "__main__":
+    index = VanguardPortIdIndex()
+    index.refresh()
+    print(f"ISIN indicizzati: {index.size()}")
+    batches, missing = index.resolve_batches(["IE00BK5BQT80", "IE00B3XXRP09"])
+    print(f"Blocchi portId: {batches}")
+    print(f"ISIN non trovati: {missing}")
@@ -0,0 +1,270 @@
+"""
+Journal persistente delle elaborazioni batch (ISIN x fase) su SQLite.
+
+Se un'esecuzione si interrompe, la successiva riprende dagli elementi non
+ancora completati invece di ricominciare da capo. Gli output vengono scritti
+in modo atomico (file temporaneo + rename) e marcati come completati con il
+loro hash, così ogni file risulta scritto una sola volta anche in caso di crash.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+
+def atomic_write(path: str, data: bytes) -> str:
+    """
+    Scrive un file in modo atomico: o il contenuto completo o il file precedente.
+
+    Returns:
+        Hash SHA-256 del contenuto scritto
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Hash SHA-256 di un file o None se non esiste."""
+    if not os.path.exists(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class WorkJournal:
+    """Journal delle unità di lavoro con stati pending, in_flight, done e failed."""
+
+    def __init__(self, db_path: str = "work_journal.db", max_attempts: int = 3):
+        """
+        Args:
+            db_path: Percorso del database SQLite
+            max_attempts: Tentativi massimi per elemento prima di considerarlo fallito definitivamente
+        """
+        self.db_path = Path(db_path)
+        self.max_attempts = max_attempts
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Inizializza il database SQLite."""
+        with self._get_connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    run_id INTEGER NOT NULL,
+                    isin TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    output_path TEXT,
+                    output_sha256 TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, isin, stage)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_items_state ON work_items(run_id, state)")
+
+    @contextmanager
+    def _get_connection(self):
+        """Context manager per la connessione al database."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # === CICLO DI VITA DI UN'ESECUZIONE ===
+
+    def start_run(self, job: str, items: Iterable[Tuple[str, str]]) -> int:
+        """
+        Riprende l'ultima esecuzione non conclusa del job o ne crea una nuova.
+
+        Gli elementi rimasti in_flight (processo interrotto) tornano pending;
+        gli elementi nuovi vengono aggiunti come pending.
+
+        Args:
+            job: Nome del job (es. 'extraetf_download')
+            items: Coppie (isin, stage)
+
+        Returns:
+            Identificativo dell'esecuzione
+        """
+        now = time.time()
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT run_id FROM runs WHERE job = ? AND finished_at IS NULL ORDER BY run_id DESC LIMIT 1",
+                    (job,)
+                ).fetchone()
+
+                if row:
+                    run_id = row[0]
+                    recovered = conn.execute(
+                        "UPDATE work_items SET state = ?, updated_at = ? WHERE run_id = ? AND state = ?",
+                        (PENDING, now, run_id, IN_FLIGHT)
+                    ).rowcount
+                    print(f"↩️  Ripresa esecuzione {run_id} del job {job} ({recovered} elementi interrotti)")
+                else:
+                    run_id = conn.execute(
+                        "INSERT INTO runs (job, started_at) VALUES (?, ?)", (job, now)
+                    ).lastrowid
+
+                conn.executemany(
+                    "INSERT OR IGNORE INTO work_items (run_id, isin, stage, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(run_id, isin, stage, PENDING, now) for isin, stage in items]
+                )
+        return run_id
+
+    def pending(self, run_id: int) -> List[Tuple[str, str]]:
+        """Elementi ancora da elaborare: pending o falliti con tentativi residui."""
+        with self._lock:
+            with self._get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT isin, stage FROM work_items WHERE run_id = ? "
+                    "AND (state = ? OR (state = ? AND attempts < ?)) ORDER BY isin, stage",
+                    (run_id, PENDING, FAILED, self.max_attempts)
+                ).fetchall()
+        return [(isin, stage) for isin, stage in rows]
+
+    def claim(self, run_id: int, isin: str, stage: str) -> None:
+        """Segna un elemento come in elaborazione e incrementa i tentativi."""
+        self._update(run_id, isin, stage, "state = ?, attempts = attempts + 1", (IN_FLIGHT,))
+
+    def complete(self, run_id: int, isin: str, stage: str,
+                 output_path: Optional[str] = None, output_sha256: Optional[str] = None) -> None:
+        """Segna un elemento come completato, con l'eventuale output prodotto."""
+        self._update(run_id, isin, stage, "state = ?, last_error = NULL, output_path = ?, output_sha256 = ?",
+                     (DONE, output_path, output_sha256))
+
+    def fail(self, run_id: int, isin: str, stage: str, error: str) -> None:
+        """Segna un elemento come fallito."""
+        self._update(run_id, isin, stage, "state = ?, last_error = ?", (FAILED, error))
+
+    def _update(self, run_id: int, isin: str, stage: str, assignments: str, values: Tuple) -> None:
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.execute(
+                    f"UPDATE work_items SET {assignments}, updated_at = ? WHERE run_id = ? AND isin = ? AND stage = ?",
+                    (*values, time.time(), run_id, isin, stage)
+                )
+
+    def write_output(self, run_id: int, isin: str, stage: str, path: str, data: bytes) -> str:
+        """
+        Scrive l'output di un elemento in modo atomico e lo segna come completato.
+
+        Se l'elemento risulta già completato con lo stesso contenuto su disco, non riscrive nulla.
+
+        Returns:
+            Hash SHA-256 dell'output
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT state, output_sha256 FROM work_items WHERE run_id = ? AND isin = ? AND stage = ?",
+                    (run_id, isin, stage)
+                ).fetchone()
+        if row and row[0] == DONE and row[1] == digest and file_digest(path) == digest:
+            return digest
+
+        atomic_write(path, data)
+        self.complete(run_id, isin, stage, path, digest)
+        return digest
+
+    def finish_run(self, run_id: int) -> bool:
+        """
+        Chiude l'esecuzione se non ci sono elementi da ritentare.
+
+        Returns:
+            True se l'esecuzione è stata chiusa
+        """
+        if self.pending(run_id):
+            return False
+        with self._lock:
+            with self._get_connection() as conn:
+                conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+        return True
+
+    # === REPORT ===
+
+    def summary(self, run_id: int) -> Dict:
+        """
+        Riepilogo di un'esecuzione.
+
+        Returns:
+            Dict con conteggi per stato, tentativi ripetuti, elementi ritentati e falliti
+        """
+        with self._lock:
+            with self._get_connection() as conn:
+                counts = dict(conn.execute(
+                    "SELECT state, COUNT(*) FROM work_items WHERE run_id = ? GROUP BY state", (run_id,)
+                ).fetchall())
+                retried = conn.execute(
+                    "SELECT isin, stage, attempts, state FROM work_items WHERE run_id = ? AND attempts > 1 "
+                    "ORDER BY attempts DESC", (run_id,)
+                ).fetchall()
+                failed = conn.execute(
+                    "SELECT isin, stage, attempts, last_error FROM work_items WHERE run_id = ? AND state = ?",
+                    (run_id, FAILED)
+                ).fetchall()
+
+        return {
+            "run_id": run_id,
+            "states": {state: counts.get(state, 0) for state in STATES},
+            "total_retries": sum(attempts - 1 for _, _, attempts, _ in retried),
+            "retried": [{"isin": i, "stage": s, "attempts": a, "state": st} for i, s, a, st in retried],
+            "failed": [{"isin": i, "stage": s, "attempts": a, "error": e} for i, s, a, e in failed],
+        }
+
+    def print_summary(self, run_id: int) -> None:
+        """Stampa il riepilogo di un'esecuzione."""
+        report = self.summary(run_id)
+        print(f"\n=== JOURNAL (esecuzione {run_id}) ===")
+        print(" | ".join(f"{state}: {count}" for state, count in report["states"].items()))
+        print(f"Tentativi ripetuti: {report['total_retries']}")
+        for item in report["retried"]:
+            print(f"  ↻ {item['isin']} [{item['stage']}]: {item['attempts']} tentativi ({item['state']})")
+        for item in report["failed"]:
+            print(f"  ✗ {item['isin']} [{item['stage']}]: {item['error']}")
@@ -0,0 +1,154 @@
+"""
+Lettura in streaming dei file XLSX degli emittenti con cache colonnare su disco.
+
+pd.read_excel carica con openpyxl l'intero foglio e tutte le colonne ad ogni
+esecuzione. read_xlsx apre invece il file in modalità read-only, scorre le
+righe una volta sola e conserva solo le colonne richieste. Il DataFrame
+ottenuto viene salvato in formato Arrow IPC (Feather) con chiave l'hash del
+contenuto del file: un file non modificato viene riletto in pochi millisecondi.
+"""
+
+import hashlib
+import importlib.util
+import os
+import tempfile
+from typing import List, Optional, Sequence
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Senza pyarrow la cache colonnare viene disattivata e il file viene sempre letto
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+if PYARROW_AVAILABLE:
+    import pyarrow as pa
+    from pyarrow import feather
+
+# Cambia quando cambia il modo di costruire il DataFrame (invalida le cache esistenti)
+CACHE_VERSION = 1
+CACHE_EXTENSION = ".arrow"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Testi considerati valori mancanti, come nei default di pd.read_excel
+NA_VALUES = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+
+def file_sha256(path: str) -> str:
+    """Hash SHA-256 del contenuto di un file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(path: str, skiprows: int = 0, usecols: Optional[Sequence[str]] = None) -> str:
+    """Chiave di cache: hash del contenuto del file e dei parametri di lettura."""
+    params = repr((CACHE_VERSION, skiprows, tuple(usecols) if usecols is not None else None))
+    return hashlib.sha256(f"{file_sha256(path)}:{params}".encode("utf-8")).hexdigest()
+
+
+def _column_names(header: Sequence) -> List[str]:
+    # Stessa convenzione di pandas per le intestazioni vuote
+    return [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+
+
+def read_xlsx_streaming(path: str, skiprows: int = 0, usecols: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Legge il primo foglio di un XLSX in modalità read-only, una riga alla volta.
+
+    Args:
+        path: Percorso del file XLSX
+        skiprows: Righe da saltare prima dell'intestazione (come in pd.read_excel)
+        usecols: Colonne da conservare (default: tutte); quelle assenti vengono ignorate
+
+    Returns:
+        DataFrame con le colonne richieste, nell'ordine del file; le righe vuote vengono scartate
+        e i testi di NA_VALUES diventano valori mancanti
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(min_row=skiprows + 1, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame(columns=list(usecols or []))
+
+        names = _column_names(header)
+        wanted = set(usecols) if usecols is not None else set(names)
+        positions = [i for i, name in enumerate(names) if name in wanted]
+        if not positions:
+            return pd.DataFrame()
+
+        # Le celle fuori dall'intervallo delle colonne richieste non vengono nemmeno create
+        first, last = positions[0], positions[-1]
+        offsets = [i - first for i in positions]
+        columns: List[list] = [[] for _ in positions]
+        for row in sheet.iter_rows(min_row=skiprows + 2, min_col=first + 1, max_col=last + 1, values_only=True):
+            values = [row[offset] if offset < len(row) else None for offset in offsets]
+            values = [None if isinstance(value, str) and value in NA_VALUES else value for value in values]
+            if all(value is None for value in values):
+                continue
+            for column, value in zip(columns, values):
+                column.append(value)
+    finally:
+        workbook.close()
+
+    return pd.DataFrame({names[i]: column for i, column in zip(positions, columns)})
+
+
+def _load_cache(cache_path: str) -> Optional[pd.DataFrame]:
+    try:
+        return feather.read_feather(cache_path)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def _save_cache(df: pd.DataFrame, cache_path: str) -> bool:
+    """Scrittura atomica del DataFrame in Arrow IPC; False se i tipi non sono rappresentabili."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colonne con tipi misti (es. numeri e testo): niente cache, il file verrà riletto
+        return False
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def read_xlsx(path: str, skiprows: int = 0, usecols: Optional[Sequence[str]] = None,
+              cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Legge un XLSX passando dalla cache colonnare se il contenuto non è cambiato.
+
+    Args:
+        path: Percorso del file XLSX
+        skiprows: Righe da saltare prima dell'intestazione
+        usecols: Colonne da conservare (default: tutte)
+        cache_dir: Cartella della cache Arrow (None = nessuna cache)
+
+    Returns:
+        DataFrame con le colonne richieste
+    """
+    if cache_dir is None or not PYARROW_AVAILABLE:
+        return read_xlsx_streaming(path, skiprows, usecols)
+
+    cache_path = os.path.join(cache_dir, cache_key(path, skiprows, usecols) + CACHE_EXTENSION)
+    if os.path.exists(cache_path):
+        df = _load_cache(cache_path)
+        if df is not None:
+            return df
+
+    df = read_xlsx_streaming(path, skiprows, usecols)
+    _save_cache(df, cache_path)
+    return df
@@ -4,7 +4,65 @@ from pathlib import Path
 import time
 from urllib.parse import urlparse
 
-def download_etf_files(isin_list, download_folder="etf_downloads", delay=1):
+# URL base template
+base_url = "https://etf.dws.com/etfdata/export/GBR/ENG/excel/product/constituent/{isin}/"
+
+# Configura headers per simulare un browser
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/vnd.ms-excel,text/csv,*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+
+def _file_extension(response):
+    """Determina l'estensione del file dal Content-Type o usa xlsx come default"""
+    content_type = response.headers.get('content-type', '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'excel' in content_type or 'spreadsheet' in content_type:
+        return 'xlsx'
+
+    # Fallback: prova a determinare dall'header Content-Disposition
+    content_disposition = response.headers.get('content-disposition', '')
+    if '.csv' in content_disposition.lower():
+        return 'csv'
+    return 'xlsx'  # Default
+
+
+def download_etf_file(isin, download_folder="etf_downloads", client=None):
+    """
+    Scarica il file Excel/CSV di un singolo ETF Xtrackers
+
+    Args:
+        isin (str): Codice ISIN
+        download_folder (str): Cartella di destinazione
+        client: Oggetto con metodo get(url, ...) (es. http_client.HttpClient); default requests
+
+    Returns:
+        str: Percorso del file salvato
+    """
+    url = base_url.format(isin=isin)
+
+    if client is None:
+        response = requests.get(url, headers=headers, timeout=30)
+    else:
+        response = client.get(url, headers=headers, timeout=30)
+    response.raise_for_status()  # Solleva eccezione per status HTTP di errore
+
+    Path(download_folder).mkdir(parents=True, exist_ok=True)
+    filepath = os.path.join(download_folder, f"{isin}.{_file_extension(response)}")
+
+    with open(filepath, 'wb') as f:
+        f.write(response.content)
+
+    return filepath
+
+
+def download_etf_files(isin_list, download_folder="etf_downloads", delay=1, client=None):
     """
     Scarica i file Excel/CSV degli ETF Xtrackers per una lista di ISIN
 
@@ -12,24 +70,12 @@ def download_etf_files(isin_list, download_folder="etf_downloads", delay=1):
         isin_list (list): Lista di codici ISIN
         download_folder (str): Cartella di destinazione per i download
         delay (float): Pausa tra i download in secondi (per evitare rate limiting)
+        client: Client HTTP opzionale (es. http_client.HttpClient)
     """
 
-    # URL base template
-    base_url = "https://etf.dws.com/etfdata/export/GBR/ENG/excel/product/constituent/{isin}/"
-
     # Crea la cartella di download se non esiste
     Path(download_folder).mkdir(exist_ok=True)
 
-    # Configura headers per simulare un browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet,application/vnd.ms-excel,text/csv,*/*',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
-
     successful_downloads = []
     failed_downloads = []
 
@@ -45,33 +91,10 @@ def download_etf_files(isin_list, download_folder="etf_downloads", delay=1):
         print(f"URL: {url}")
 
         try:
-            # Effettua la richiesta
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()  # Solleva eccezione per status HTTP di errore
-
-            # Determina l'estensione del file dal Content-Type o usa xlsx come default
-            content_type = response.headers.get('content-type', '').lower()
-            if 'csv' in content_type:
-                extension = 'csv'
-            elif 'excel' in content_type or 'spreadsheet' in content_type:
-                extension = 'xlsx'
-            else:
-                # Fallback: prova a determinare dall'header Content-Disposition
-                content_disposition = response.headers.get('content-disposition', '')
-                if '.csv' in content_disposition.lower():
-                    extension = 'csv'
-                else:
-                    extension = 'xlsx'  # Default
-
-            # Nome del file
-            filename = f"{isin}.{extension}"
-            filepath = os.path.join(download_folder, filename)
-
-            # Salva il file
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-
-            file_size = len(response.content)
+            filepath = download_etf_file(isin, download_folder, client)
+            filename = os.path.basename(filepath)
+
+            file_size = os.path.getsize(filepath)
             print(f"✓ Salvato: {filename} ({file_size:,} bytes)")
             successful_downloads.append(isin)
 
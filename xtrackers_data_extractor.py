@@ -2,52 +2,108 @@ import os
 import sys
 import traceback
 import json
-from datetime import datetime
+from datetime import date, datetime
+from typing import Dict, Optional
 
 import pandas as pd
 
 from file_utils import create_output_folder
-
-if len(sys.argv) < 2:
-    raise ValueError("❌ You have to specify the name of the XLSX file as argument")
-
-etf_isin_prefix = sys.argv[1]
-
-print("Reading the xlsx...")
+from holdings_db import HoldingsDB
+from holdings_schema import normalize_holdings
+from numeric_parser import parse_numeric
+from xlsx_reader import read_xlsx
 
 date_and_time_format = "%Y-%m-%d %H:%M:%S"
 xlsx_extension = ".xlsx"
 json_extension = ".json"
 
-input_folder = create_output_folder("input/xtrackers", "")
-print(f"Input folder: {input_folder}")
-input_xlsx_file_name = os.path.join(input_folder, etf_isin_prefix + xlsx_extension)
-print(f"Input xlsx file name: {input_xlsx_file_name}")
-
-output_folder = create_output_folder("output/xtrackers", etf_isin_prefix)
-print(f"Output folder: {output_folder}")
-output_clean_csv_file_name = os.path.join(output_folder, etf_isin_prefix + "_clean.csv")
-print(f"Output clean CSV file: {output_clean_csv_file_name}")
-output_json_file_sectors = os.path.join(output_folder, "sectors" + json_extension)
-print(f"Output json file sectors: {output_json_file_sectors}")
-output_json_file_countries = os.path.join(output_folder, "countries" + json_extension)
-print(f"Output json file countries: {output_json_file_countries}")
-output_json_file_summary = os.path.join(output_folder, "summary" + json_extension)
-print(f"Output json file summary: {output_json_file_summary}")
-
-try:
-    # Lettura del file XLSX
-    df = pd.read_excel(input_xlsx_file_name, skiprows=3)
-
-    print(f"✅ Successfully read {input_xlsx_file_name}!")
-    print(f"Dimensions: {df.shape}")
-    print(f"Columns: {list(df.columns)}")
-
-    # Rimozione di spazi superflui nei nomi delle colonne
-    df.columns = df.columns.str.strip()
-
-    print("\nFirst 3 rows:")
-    print(df.head(3).to_string())
+# Colonne usate dall'estrattore e dal plugin Xtrackers: le altre non vengono lette
+XTRACKERS_COLUMNS = ["Name", "ISIN", "Country", "Currency", "Type of Security", "Industry Classification",
+                     "Weighting"]
+# Colonne normalizzate (holdings_schema) -> colonne dell'XLSX
+XTRACKERS_COLUMN_MAP = {"name": "Name", "isin": "ISIN", "sector": "Industry Classification",
+                        "country": "Country", "currency": "Currency", "asset_class": "Type of Security",
+                        "weight": "Weighting"}
+# Cache colonnare dei file già letti, nella cartella di input (chiave: hash del contenuto)
+XLSX_CACHE_FOLDER = ".cache"
+
+
+def _log(verbose: bool, *args) -> None:
+    if verbose:
+        print(*args)
+
+
+def file_as_of_date(path: str) -> date:
+    """Data di riferimento di un XLSX Xtrackers: il file non la contiene, si usa quella del download."""
+    return date.fromtimestamp(os.path.getmtime(path))
+
+
+def normalize_xtrackers_holdings(holdings: pd.DataFrame, etf_isin: str,
+                                 as_of_date: Optional[date] = None) -> pd.DataFrame:
+    """Porta le holdings di un XLSX Xtrackers nello schema di holdings_schema."""
+    # I pesi Xtrackers sono frazioni (0.0767 = 7.67%)
+    return normalize_holdings(holdings, XTRACKERS_COLUMN_MAP, etf_isin=etf_isin, issuer="xtrackers",
+                              as_of_date=as_of_date.isoformat() if as_of_date else None, weight_scale=100.0)
+
+
+def extract_xtrackers(etf_isin_prefix: str, input_base: str = "input/xtrackers",
+                      output_base: str = "output/xtrackers", verbose: bool = True, use_cache: bool = True,
+                      write_files: bool = True, db_path: Optional[str] = None) -> Dict:
+    """
+    Pulisce l'XLSX Xtrackers di un ETF ed esporta settori, nazioni e riepilogo.
+
+    Args:
+        etf_isin_prefix: ISIN dell'ETF (nome del file XLSX in input_base)
+        input_base: Cartella dei file XLSX scaricati
+        output_base: Cartella di output (una sottocartella per ISIN)
+        verbose: Stampa l'analisi a video
+        use_cache: Riusa la copia Arrow del file se il contenuto non è cambiato
+        write_files: Scrive CSV pulito e JSON per ETF in output_base (False se le holdings
+            vanno nel dataset colonnare, vedi holdings_dataset.py)
+        db_path: Database normalizzato (holdings_db.py) in cui sostituire la fotografia del fondo
+
+    Returns:
+        Dict con isin, as_of_date (data del file, vedi file_as_of_date), clean_csv (percorso o None),
+        summary, holdings (DataFrame delle righe valide) e snapshot_id (None se db_path non è indicato)
+
+    Raises:
+        ValueError: Se mancano le colonne necessarie
+    """
+    _log(verbose, "Reading the xlsx...")
+
+    input_folder = create_output_folder(input_base, "") if verbose else input_base
+    _log(verbose, f"Input folder: {input_folder}")
+    input_xlsx_file_name = os.path.join(input_folder, etf_isin_prefix + xlsx_extension)
+    _log(verbose, f"Input xlsx file name: {input_xlsx_file_name}")
+
+    if verbose and write_files:
+        output_folder = create_output_folder(output_base, etf_isin_prefix)
+    else:
+        output_folder = os.path.join(output_base, etf_isin_prefix)
+        if write_files:
+            os.makedirs(output_folder, exist_ok=True)
+    _log(verbose, f"Output folder: {output_folder}")
+    output_clean_csv_file_name = os.path.join(output_folder, etf_isin_prefix + "_clean.csv")
+    _log(verbose, f"Output clean CSV file: {output_clean_csv_file_name}")
+    output_json_file_sectors = os.path.join(output_folder, "sectors" + json_extension)
+    _log(verbose, f"Output json file sectors: {output_json_file_sectors}")
+    output_json_file_countries = os.path.join(output_folder, "countries" + json_extension)
+    _log(verbose, f"Output json file countries: {output_json_file_countries}")
+    output_json_file_summary = os.path.join(output_folder, "summary" + json_extension)
+    _log(verbose, f"Output json file summary: {output_json_file_summary}")
+
+    # Lettura in streaming delle sole colonne necessarie (o dalla cache se il file non è cambiato)
+    cache_dir = os.path.join(input_folder, XLSX_CACHE_FOLDER) if use_cache else None
+    df = read_xlsx(input_xlsx_file_name, skiprows=3, usecols=XTRACKERS_COLUMNS, cache_dir=cache_dir)
+    as_of_date = file_as_of_date(input_xlsx_file_name)
+
+    _log(verbose, f"✅ Successfully read {input_xlsx_file_name}!")
+    _log(verbose, f"Dimensions: {df.shape}")
+    _log(verbose, f"Columns: {list(df.columns)}")
+
+    if verbose:
+        print("\nFirst 3 rows:")
+        print(df.head(3).to_string())
 
     # Identificazione delle colonne necessarie
     weight_col = "Weighting"
@@ -55,52 +111,51 @@ try:
     country_col = "Country"
 
     if not all([weight_col in df.columns, sector_col in df.columns, country_col in df.columns]):
-        print("❌ Not all key columns are present in the dataset")
-        print("Available columns:")
+        _log(verbose, "❌ Not all key columns are present in the dataset")
+        _log(verbose, "Available columns:")
         for i, col in enumerate(df.columns):
-            print(f"  {i}: '{col}'")
-        exit()
+            _log(verbose, f"  {i}: '{col}'")
+        raise ValueError(f"❌ Not all key columns are present in {input_xlsx_file_name}")
 
     # Pulizia della colonna dei pesi
-    print(f"\nCleaning the '{weight_col}' column...")
-    df[weight_col] = df[weight_col].astype(str)
-    df[weight_col] = df[weight_col].str.replace(',', '.')  # Decimal point adjustment
-    df[weight_col] = df[weight_col].str.replace('%', '')  # Remove percentage symbol
-    df[weight_col] = pd.to_numeric(df[weight_col], errors='coerce')
+    _log(verbose, f"\nCleaning the '{weight_col}' column...")
+    # Excel restituisce già numeri: solo le eventuali celle di testo (es. "0,0767") vengono convertite
+    df[weight_col] = parse_numeric(df[weight_col], locale=None)
 
     # Filtrare solo le righe valide
     df_valid = df.dropna(subset=[weight_col])
 
-    print(f"\n{'=' * 60}")
-    print("📊 DATA ANALYSIS")
-    print(f"Valid rows: {len(df_valid)}")
-    print(f"Weight sum: {df_valid[weight_col].sum():.2f}%")
+    _log(verbose, f"\n{'=' * 60}")
+    _log(verbose, "📊 DATA ANALYSIS")
+    _log(verbose, f"Valid rows: {len(df_valid)}")
+    _log(verbose, f"Weight sum: {df_valid[weight_col].sum():.2f}%")
 
     # Analisi per settore
-    print("\n🏢 TOP 15 SECTORS:")
+    _log(verbose, "\n🏢 TOP 15 SECTORS:")
     sectors = df_valid.groupby(sector_col)[weight_col].sum().sort_values(ascending=False)
     sectors = sectors[sectors > 0]
 
     for i, (sector, perc) in enumerate(sectors.head(15).items(), 1):
-        print(f"{i:2d}. {sector:30s}: {perc:6.2f}%")
+        _log(verbose, f"{i:2d}. {sector:30s}: {perc:6.2f}%")
 
     # Analisi per nazione
-    print("\n🌍 TOP 15 COUNTRIES:")
+    _log(verbose, "\n🌍 TOP 15 COUNTRIES:")
     countries = df_valid.groupby(country_col)[weight_col].sum().sort_values(ascending=False)
     countries = countries[countries > 0]
 
     for i, (country, perc) in enumerate(countries.head(15).items(), 1):
-        print(f"{i:2d}. {country:30s}: {perc:6.2f}%")
+        _log(verbose, f"{i:2d}. {country:30s}: {perc:6.2f}%")
 
     # Esportazione dei dati
-    print("\n💾 EXPORTING FILES...")
-    sectors.to_json(output_json_file_sectors, orient="index", indent=2)
-    countries.to_json(output_json_file_countries, orient="index", indent=2)
-    df_valid.to_csv(output_clean_csv_file_name, index=False)
+    if write_files:
+        _log(verbose, "\n💾 EXPORTING FILES...")
+        sectors.to_json(output_json_file_sectors, orient="index", indent=2)
+        countries.to_json(output_json_file_countries, orient="index", indent=2)
+        df_valid.to_csv(output_clean_csv_file_name, index=False)
 
-    print(f"✅ {output_json_file_sectors}        - {len(sectors)} sectors")
-    print(f"✅ {output_json_file_countries}         - {len(countries)} countries ")
-    print(f"✅ {output_clean_csv_file_name}     - {len(df_valid)} clean rows")
+        _log(verbose, f"✅ {output_json_file_sectors}        - {len(sectors)} sectors")
+        _log(verbose, f"✅ {output_json_file_countries}         - {len(countries)} countries ")
+        _log(verbose, f"✅ {output_clean_csv_file_name}     - {len(df_valid)} clean rows")
 
     # Creazione di un file di riepilogo
     current_date = datetime.now().strftime(date_and_time_format)
@@ -117,12 +172,31 @@ try:
         "top_10_countries": dict(countries.head(10))
     }
 
-    with open(output_json_file_summary, "w") as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    if write_files:
+        with open(output_json_file_summary, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        _log(verbose, f"✅ {output_json_file_summary}      - Analysis summary")
+
+    snapshot_id = None
+    if db_path is not None:
+        normalized = normalize_xtrackers_holdings(df_valid, etf_isin_prefix, as_of_date)
+        snapshot_id = HoldingsDB(db_path).replace_snapshot(etf_isin_prefix, "xtrackers", normalized,
+                                                           as_of_date=as_of_date, fund={"issuer": "xtrackers"})
+        _log(verbose, f"✅ {db_path}      - snapshot {snapshot_id} ({len(normalized)} holdings)")
+
+    return {"isin": etf_isin_prefix, "as_of_date": as_of_date,
+            "clean_csv": output_clean_csv_file_name if write_files else None,
+            "summary": summary, "holdings": df_valid, "snapshot_id": snapshot_id}
+
 
-    print(f"✅ {output_json_file_summary}      - Analysis summary")
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("❌ You have to specify the name of the XLSX file as argument")
 
-except Exception as e:
-    print(f"❌ Error: {e}")
+    try:
+        extract_xtrackers(sys.argv[1])
+    except Exception as e:
+        print(f"❌ Error: {e}")
 
-    traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()